@@ -0,0 +1,406 @@
+"""Post-synthesis DSP: tempo, pitch, loudness and silence trimming
+
+XTTS has no control over speaking rate or pitch, so ``speed`` and ``pitch``
+are applied to its output here, along with loudness normalization (ITU-R
+BS.1770 integrated loudness) and trimming of leading and trailing silence.
+
+Every stage takes float32 chunks and keeps only the state it needs between
+calls, so one EffectChain processes a whole waveform in a single call or a
+stitched stream segment by segment. Tempo changes use WSOLA, which keeps
+speech free of the phasiness of a phase vocoder and, unlike librosa's
+whole-buffer time_stretch, has no edge artifacts at chunk boundaries. Pitch
+shifts stretch the tempo and then resample with soxr's streaming resampler,
+so changing speed and pitch together costs one stretch and one resample.
+"""
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import soxr
+from scipy.signal import lfilter
+
+import metrics
+
+SPEED_RANGE = (0.5, 2.0)
+PITCH_RANGE = (0.5, 2.0)
+LOUDNESS_RANGE = (-40.0, -5.0)
+
+# Ratios this close to 1 are left alone
+IDENTITY_TOLERANCE = 1e-3
+
+
+def _empty() -> np.ndarray:
+    return np.zeros(0, dtype=np.float32)
+
+
+@dataclass
+class AudioEffects:
+    """Post-processing requested for a job's output"""
+    # Tempo factor: 1.5 speaks 50% faster at the same pitch
+    speed: float = 1.0
+    # Frequency ratio: 2.0 is an octave up at the same tempo
+    pitch: float = 1.0
+    # Integrated loudness target in LUFS; None keeps the model's level
+    loudness_lufs: Optional[float] = None
+    # Drop silence before the first and after the last word
+    trim_silence: bool = False
+
+    @classmethod
+    def from_input(cls, input_data: Dict[str, Any]) -> "AudioEffects":
+        """Read ``speed``, ``pitch``, ``loudness_lufs`` and ``trim_silence`` from job input
+
+        Loudness and trimming default to AUDIO_TARGET_LUFS and AUDIO_TRIM_SILENCE.
+        """
+        loudness = input_data.get("loudness_lufs", os.getenv("AUDIO_TARGET_LUFS") or None)
+        trim = input_data.get("trim_silence")
+        if trim is None:
+            trim = os.getenv("AUDIO_TRIM_SILENCE", "false").lower() == "true"
+
+        effects = cls(
+            speed=float(input_data.get("speed") or 1.0),
+            pitch=float(input_data.get("pitch") or 1.0),
+            loudness_lufs=float(loudness) if loudness is not None else None,
+            trim_silence=bool(trim)
+        )
+        effects.validate()
+        return effects
+
+    def validate(self):
+        for name, value, (low, high) in (
+            ("speed", self.speed, SPEED_RANGE),
+            ("pitch", self.pitch, PITCH_RANGE),
+            ("loudness_lufs", self.loudness_lufs, LOUDNESS_RANGE)
+        ):
+            if value is not None and not low <= value <= high:
+                raise ValueError(f"{name} must be between {low} and {high}, got {value}")
+
+    @property
+    def is_identity(self) -> bool:
+        return (
+            abs(self.speed - 1.0) < IDENTITY_TOLERANCE
+            and abs(self.pitch - 1.0) < IDENTITY_TOLERANCE
+            and self.loudness_lufs is None
+            and not self.trim_silence
+        )
+
+    def chain(self, sample_rate: int) -> Optional["EffectChain"]:
+        """A chain for one output stream, None when there is nothing to do"""
+        return None if self.is_identity else EffectChain(self, sample_rate)
+
+    def apply(self, wav: np.ndarray, sample_rate: int) -> np.ndarray:
+        """Process a whole waveform (blocking)"""
+        chain = self.chain(sample_rate)
+        return wav if chain is None else chain.finish(wav)
+
+
+class EffectChain:
+    """The stages of an AudioEffects for one output, fed chunk by chunk
+
+    Chunks must arrive in order from one caller at a time. Some stages hold
+    samples back, so the output of ``process`` lags its input slightly;
+    ``finish`` returns the rest.
+    """
+
+    def __init__(self, effects: AudioEffects, sample_rate: int):
+        self.stages = []
+        if effects.trim_silence:
+            self.stages.append(SilenceTrimmer(sample_rate))
+
+        # A pitch shift resamples, which also changes the tempo by the same ratio
+        tempo = effects.speed / effects.pitch
+        if abs(tempo - 1.0) >= IDENTITY_TOLERANCE:
+            self.stages.append(TimeStretcher(tempo, sample_rate))
+        if abs(effects.pitch - 1.0) >= IDENTITY_TOLERANCE:
+            self.stages.append(PitchResampler(effects.pitch, sample_rate))
+
+        if effects.loudness_lufs is not None:
+            self.stages.append(LoudnessNormalizer(effects.loudness_lufs, sample_rate))
+
+    @metrics.timed("effects")
+    def process(self, wav: np.ndarray) -> np.ndarray:
+        """Process the next chunk, returning the samples that are now final"""
+        wav = np.asarray(wav, dtype=np.float32)
+        for stage in self.stages:
+            wav = stage.process(wav)
+        return wav
+
+    @metrics.timed("effects")
+    def finish(self, wav: Optional[np.ndarray] = None) -> np.ndarray:
+        """Process a last chunk, if any, and flush every stage"""
+        wav = _empty() if wav is None else np.asarray(wav, dtype=np.float32)
+        for stage in self.stages:
+            wav = np.concatenate([stage.process(wav), stage.finish()])
+        return wav
+
+
+class SilenceTrimmer:
+    """Drops leading and trailing silence
+
+    Quiet stretches after speech are held back until more speech arrives, so
+    pauses between words pass through and only the final one is dropped.
+    """
+
+    def __init__(self, sample_rate: int, threshold_db: float = -45.0, margin_ms: float = 20.0):
+        self.threshold = 10 ** (threshold_db / 20)
+        self.margin = max(1, int(sample_rate * margin_ms / 1000))
+        self._started = False
+        self._held = _empty()
+
+    def process(self, wav: np.ndarray) -> np.ndarray:
+        voiced = np.flatnonzero(np.abs(wav) > self.threshold)
+        if voiced.size == 0:
+            self._held = np.concatenate([self._held, wav])
+            if not self._started:
+                self._held = self._held[-self.margin:]
+            return _empty()
+
+        if self._started:
+            head = self._held
+        else:
+            head = np.concatenate([self._held, wav[:voiced[0]]])[-self.margin:]
+            wav = wav[voiced[0]:]
+            voiced = voiced - voiced[0]
+            self._started = True
+
+        self._held = wav[voiced[-1] + 1:]
+        return np.concatenate([head, wav[:voiced[-1] + 1]])
+
+    def finish(self) -> np.ndarray:
+        tail = self._held[:self.margin] if self._started else _empty()
+        self._held = _empty()
+        return tail
+
+
+class TimeStretcher:
+    """WSOLA tempo change: output ``1 / rate`` times as long at the same pitch
+
+    Hann-windowed frames are overlap-added at a fixed output hop. Each frame
+    is taken from within ``tolerance_ms`` of its nominal input position, at
+    the offset whose waveform best continues the previous frame, so periods
+    line up instead of cancelling. Only about a frame of input is kept
+    between calls.
+    """
+
+    def __init__(self, rate: float, sample_rate: int, frame_ms: float = 40.0, tolerance_ms: float = 10.0):
+        self.rate = rate
+        self.hop = max(1, int(sample_rate * frame_ms / 2000))
+        self.frame = 2 * self.hop
+        self.tolerance = max(1, int(sample_rate * tolerance_ms / 1000))
+        # Periodic Hann: frames at 50% overlap sum to exactly one
+        self.window = np.hanning(self.frame + 1)[:-1].astype(np.float32)
+
+        # Input starts with a hop of zeros whose output is skipped, so the first frame is not faded in
+        self._input = np.zeros(self.hop, dtype=np.float32)
+        self._offset = 0
+        self._received = 0
+        self._frames = 0
+        self._previous: Optional[int] = None
+        self._overlap = np.zeros(self.hop, dtype=np.float32)
+        self._skip = self.hop
+        self._emitted = 0
+
+    def process(self, wav: np.ndarray) -> np.ndarray:
+        if len(wav):
+            self._input = np.concatenate([self._input, wav])
+            self._received += len(wav)
+        return self._run()
+
+    def finish(self) -> np.ndarray:
+        target = round(self._received / self.rate)
+        return self._run(target)
+
+    def _run(self, target: Optional[int] = None) -> np.ndarray:
+        blocks = []
+        # Output completed so far, not counting the skipped padding
+        produced = (self._frames - 1) * self.hop
+        while target is None or produced < target:
+            nominal = round(self._frames * self.hop * self.rate)
+            needed = nominal + self.tolerance + self.frame
+            if self._previous is not None:
+                needed = max(needed, self._previous + self.hop + self.frame)
+
+            available = self._offset + len(self._input)
+            if needed > available:
+                if target is None:
+                    break
+                # Past the end of the input: frames are taken from silence
+                self._input = np.concatenate([self._input, np.zeros(needed - available, dtype=np.float32)])
+
+            start = self._align(nominal)
+            segment = self._input[start - self._offset:start - self._offset + self.frame] * self.window
+            blocks.append(self._overlap + segment[:self.hop])
+            self._overlap = segment[self.hop:]
+            self._previous = start
+            self._frames += 1
+            produced += self.hop
+
+        self._discard()
+        return self._emit(blocks, target)
+
+    def _align(self, nominal: int) -> int:
+        """Start of the input frame near ``nominal`` that best continues the previous frame"""
+        if self._previous is None:
+            return nominal
+
+        low = max(nominal - self.tolerance, self._offset)
+        high = nominal + self.tolerance
+        natural = self._previous + self.hop - self._offset
+        template = self._input[natural:natural + self.frame]
+        region = self._input[low - self._offset:high - self._offset + self.frame]
+        return low + int(np.argmax(np.correlate(region, template, mode="valid")))
+
+    def _discard(self):
+        """Drop input no later frame can reach"""
+        nominal = round(self._frames * self.hop * self.rate)
+        keep_from = nominal - self.tolerance
+        if self._previous is not None:
+            keep_from = min(keep_from, self._previous + self.hop)
+
+        drop = min(keep_from - self._offset, len(self._input))
+        if drop > 0:
+            self._input = self._input[drop:]
+            self._offset += drop
+
+    def _emit(self, blocks: List[np.ndarray], target: Optional[int]) -> np.ndarray:
+        output = np.concatenate(blocks) if blocks else _empty()
+        if self._skip:
+            skipped = min(self._skip, len(output))
+            output = output[skipped:]
+            self._skip -= skipped
+        if target is not None:
+            output = output[:max(0, target - self._emitted)]
+        self._emitted += len(output)
+        return output
+
+
+class PitchResampler:
+    """Resamples so the output is ``1 / ratio`` as long, raising pitch by ``ratio``"""
+
+    def __init__(self, ratio: float, sample_rate: int):
+        self._stream = soxr.ResampleStream(sample_rate * ratio, sample_rate, 1, dtype="float32")
+
+    def process(self, wav: np.ndarray) -> np.ndarray:
+        return self._stream.resample_chunk(wav) if len(wav) else _empty()
+
+    def finish(self) -> np.ndarray:
+        return self._stream.resample_chunk(_empty(), last=True)
+
+
+def k_weighting(sample_rate: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """BS.1770 K-weighting (high shelf, then high pass) as biquads for a sample rate"""
+    # High shelf: +4 dB above about 1.5 kHz
+    gain = 10 ** (4.0 / 40)
+    w0 = 2 * np.pi * 1500.0 / sample_rate
+    alpha = np.sin(w0) / (2 * (1 / np.sqrt(2)))
+    cos, root = np.cos(w0), 2 * np.sqrt(gain) * alpha
+    shelf = (
+        np.array([
+            gain * ((gain + 1) + (gain - 1) * cos + root),
+            -2 * gain * ((gain - 1) + (gain + 1) * cos),
+            gain * ((gain + 1) + (gain - 1) * cos - root)
+        ]),
+        np.array([
+            (gain + 1) - (gain - 1) * cos + root,
+            2 * ((gain - 1) - (gain + 1) * cos),
+            (gain + 1) - (gain - 1) * cos - root
+        ])
+    )
+
+    # High pass at 38 Hz
+    w0 = 2 * np.pi * 38.0 / sample_rate
+    alpha = np.sin(w0) / (2 * 0.5)
+    cos = np.cos(w0)
+    high_pass = (
+        np.array([(1 + cos) / 2, -(1 + cos), (1 + cos) / 2]),
+        np.array([1 + alpha, -2 * cos, 1 - alpha])
+    )
+
+    return [(b / a[0], a / a[0]) for b, a in (shelf, high_pass)]
+
+
+class LoudnessNormalizer:
+    """Gain towards a target integrated loudness (BS.1770, gated), peaks held under a ceiling
+
+    The loudness of everything seen so far sets the gain, so a waveform
+    passed in one call is normalized exactly and a stream converges within
+    its first seconds. Gain changes are ramped across a chunk so they never
+    click.
+    """
+
+    # Gating blocks of 400 ms, measured in 100 ms steps
+    STEPS_PER_BLOCK = 4
+    ABSOLUTE_GATE_LUFS = -70.0
+    RELATIVE_GATE_LU = -10.0
+
+    def __init__(self, target_lufs: float, sample_rate: int, ceiling_db: float = -1.0):
+        self.target_lufs = target_lufs
+        self.ceiling = 10 ** (ceiling_db / 20)
+        self._filters = k_weighting(sample_rate)
+        self._states = [np.zeros(2) for _ in self._filters]
+        self._step = max(1, sample_rate // 10)
+        # Mean square of every complete step, then the running sum of the incomplete one
+        self._steps: List[float] = []
+        self._partial = 0.0
+        self._partial_count = 0
+        self._gain: Optional[float] = None
+
+    def process(self, wav: np.ndarray) -> np.ndarray:
+        if not len(wav):
+            return wav
+
+        self._measure(wav)
+        loudness = self.loudness()
+        gain = 10 ** ((self.target_lufs - loudness) / 20) if loudness is not None else (self._gain or 1.0)
+
+        peak = float(np.max(np.abs(wav)))
+        if peak * gain > self.ceiling:
+            gain = self.ceiling / peak
+
+        start = gain if self._gain is None else self._gain
+        self._gain = gain
+        gains = np.linspace(start, gain, len(wav), dtype=np.float32) if start != gain else np.float32(gain)
+        return np.clip(wav * gains, -self.ceiling, self.ceiling)
+
+    def finish(self) -> np.ndarray:
+        return _empty()
+
+    def _measure(self, wav: np.ndarray):
+        weighted = wav.astype(np.float64)
+        for index, (b, a) in enumerate(self._filters):
+            weighted, self._states[index] = lfilter(b, a, weighted, zi=self._states[index])
+        squares = weighted * weighted
+
+        # Complete the step left over from the last chunk, then whole steps at once
+        fill = min(self._step - self._partial_count, len(squares))
+        self._partial += float(squares[:fill].sum())
+        self._partial_count += fill
+        squares = squares[fill:]
+        if self._partial_count < self._step:
+            return
+        self._steps.append(self._partial / self._step)
+
+        whole = len(squares) // self._step * self._step
+        self._steps.extend(squares[:whole].reshape(-1, self._step).mean(axis=1).tolist())
+        self._partial = float(squares[whole:].sum())
+        self._partial_count = len(squares) - whole
+
+    def loudness(self) -> Optional[float]:
+        """Gated integrated loudness of the input so far, None while silent"""
+        steps = np.asarray(self._steps)
+        if len(steps) < self.STEPS_PER_BLOCK:
+            # Shorter than one gating block: ungated over what there is
+            count = len(steps) * self._step + self._partial_count
+            power = (steps.sum() * self._step + self._partial) / count if count else 0.0
+            loudness = -0.691 + 10 * np.log10(power) if power > 0 else None
+            return loudness if loudness is not None and loudness > self.ABSOLUTE_GATE_LUFS else None
+
+        kernel = np.ones(self.STEPS_PER_BLOCK) / self.STEPS_PER_BLOCK
+        blocks = np.convolve(steps, kernel, mode="valid")
+        blocks = blocks[blocks > 10 ** ((self.ABSOLUTE_GATE_LUFS + 0.691) / 10)]
+        if not blocks.size:
+            return None
+
+        relative_gate = -0.691 + 10 * np.log10(blocks.mean()) + self.RELATIVE_GATE_LU
+        blocks = blocks[blocks > 10 ** ((relative_gate + 0.691) / 10)]
+        return float(-0.691 + 10 * np.log10(blocks.mean()))
@@ -0,0 +1,341 @@
+import io
+import os
+import struct
+import numpy as np
+import librosa
+import soxr
+import soundfile as sf
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import metrics
+
+# Placeholder size used in streamed WAV headers when the length is unknown
+STREAMING_DATA_SIZE = 0xFFFFFFFF - 36
+
+
+def wav_header(sample_rate: int, num_samples: Optional[int] = None, channels: int = 1) -> bytes:
+    """Build a 16-bit PCM WAV header, open-ended when num_samples is None"""
+    bits_per_sample = 16
+    block_align = channels * bits_per_sample // 8
+    byte_rate = sample_rate * block_align
+    data_size = STREAMING_DATA_SIZE if num_samples is None else num_samples * block_align
+
+    return b"".join([
+        b"RIFF",
+        struct.pack("<I", data_size + 36),
+        b"WAVE",
+        b"fmt ",
+        struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate, block_align, bits_per_sample),
+        b"data",
+        struct.pack("<I", data_size)
+    ])
+
+
+def float_to_pcm16(wav) -> bytes:
+    """Convert a float waveform in [-1, 1] to little-endian 16-bit PCM"""
+    samples = np.clip(np.asarray(wav, dtype=np.float32), -1.0, 1.0)
+    return (samples * 32767.0).astype("<i2").tobytes()
+
+
+def encode_wav(wav, sample_rate: int) -> bytes:
+    """Encode a float waveform as a 16-bit PCM WAV entirely in memory"""
+    pcm = float_to_pcm16(wav)
+    return wav_header(sample_rate, num_samples=len(pcm) // 2) + pcm
+
+
+def decode_audio(data: bytes, target_sample_rate: Optional[int] = None) -> np.ndarray:
+    """Decode an in-memory audio file to a mono float32 waveform"""
+    wav, sample_rate = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+    wav = wav.mean(axis=1)
+
+    if target_sample_rate and sample_rate != target_sample_rate:
+        wav = librosa.resample(wav, orig_sr=sample_rate, target_sr=target_sample_rate)
+
+    return np.ascontiguousarray(wav, dtype=np.float32)
+
+
+# Output codecs: libsndfile container/subtype, MIME type, file extension and,
+# for lossy codecs, the bitrate range (kbps) libsndfile maps compression
+# level 0..1 onto
+CODECS = {
+    "wav": {"format": "WAV", "subtype": "PCM_16", "content_type": "audio/wav", "extension": "wav"},
+    "flac": {"format": "FLAC", "subtype": "PCM_16", "content_type": "audio/flac", "extension": "flac"},
+    "opus": {
+        "format": "OGG", "subtype": "OPUS", "content_type": "audio/ogg", "extension": "ogg",
+        "bitrates": (6, 256), "sample_rates": {8000, 12000, 16000, 24000, 48000}
+    },
+    "mp3": {
+        "format": "MP3", "subtype": "MPEG_LAYER_III", "content_type": "audio/mpeg", "extension": "mp3",
+        "bitrate_mode": "CONSTANT",
+        "sample_rates": {8000, 11025, 12000, 16000, 22050, 24000, 32000, 44100, 48000}
+    },
+}
+
+DEFAULT_BITRATES_KBPS = {"opus": 32, "mp3": 64}
+
+# Codecs whose files libsndfile writes strictly front to back, so encoded
+# bytes can leave as soon as they are produced (WAV and FLAC headers are
+# rewritten when the file is closed)
+STREAMABLE_CODECS = {"opus", "mp3"}
+
+
+def _mp3_bitrates(sample_rate: int):
+    # MPEG-1 above 24 kHz, MPEG-2 from 16 kHz, MPEG-2.5 below
+    if sample_rate >= 32000:
+        return (32, 320)
+    if sample_rate >= 16000:
+        return (8, 160)
+    return (8, 64)
+
+
+@dataclass
+class AudioFormat:
+    """Requested output encoding of a job"""
+    codec: str = "wav"
+    bitrate_kbps: Optional[int] = None
+    sample_rate: Optional[int] = None
+
+    @classmethod
+    def from_input(cls, input_data: Dict[str, Any]) -> "AudioFormat":
+        """Read ``output_format``, ``bitrate_kbps`` and ``sample_rate`` from job input"""
+        audio_format = cls(
+            codec=str(input_data.get("output_format") or os.getenv("OUTPUT_FORMAT", "wav")).lower(),
+            bitrate_kbps=input_data.get("bitrate_kbps"),
+            sample_rate=input_data.get("sample_rate")
+        )
+        audio_format.validate()
+        return audio_format
+
+    def validate(self):
+        if self.codec not in CODECS:
+            raise ValueError(f"Unsupported output format: {self.codec} (choose from {', '.join(CODECS)})")
+
+        allowed = CODECS[self.codec].get("sample_rates")
+        if self.sample_rate is not None and allowed and int(self.sample_rate) not in allowed:
+            raise ValueError(f"{self.codec} does not support {self.sample_rate} Hz (choose from {sorted(allowed)})")
+
+        if self.bitrate_kbps is not None and self.codec not in DEFAULT_BITRATES_KBPS:
+            raise ValueError(f"{self.codec} is lossless and takes no bitrate")
+
+    def compression_level(self, sample_rate: int) -> Optional[float]:
+        """libsndfile compression level giving roughly the requested bitrate"""
+        if self.codec not in DEFAULT_BITRATES_KBPS:
+            return None
+
+        low, high = _mp3_bitrates(sample_rate) if self.codec == "mp3" else CODECS[self.codec]["bitrates"]
+        kbps = min(max(self.bitrate_kbps or DEFAULT_BITRATES_KBPS[self.codec], low), high)
+        # Level 1.0 is rejected by the MP3 encoder
+        return min((high - kbps) / (high - low), 0.99)
+
+
+@dataclass
+class EncodedAudio:
+    data: bytes
+    content_type: str
+    extension: str
+    sample_rate: int
+    num_samples: int
+
+    @property
+    def duration_ms(self) -> int:
+        return round(self.num_samples * 1000 / self.sample_rate)
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.data)
+
+
+@metrics.timed("encode")
+def encode_audio(wav: np.ndarray, sample_rate: int, audio_format: Optional[AudioFormat] = None) -> EncodedAudio:
+    """Encode a float or 16-bit PCM waveform in the requested format, in memory"""
+    audio_format = audio_format or AudioFormat()
+    codec = CODECS[audio_format.codec]
+    target_rate = int(audio_format.sample_rate or sample_rate)
+
+    if target_rate != sample_rate:
+        if wav.dtype == np.int16:
+            wav = wav.astype(np.float32) / 32767.0
+        wav = librosa.resample(np.asarray(wav, dtype=np.float32), orig_sr=sample_rate, target_sr=target_rate)
+
+    if audio_format.codec == "wav":
+        # Plain PCM needs no encoder pass
+        pcm = wav.astype("<i2").tobytes() if wav.dtype == np.int16 else float_to_pcm16(wav)
+        data = wav_header(target_rate, num_samples=len(pcm) // 2) + pcm
+    else:
+        if wav.dtype != np.int16:
+            wav = np.clip(np.asarray(wav, dtype=np.float32), -1.0, 1.0)
+        buffer = io.BytesIO()
+        sf.write(
+            buffer,
+            wav,
+            target_rate,
+            format=codec["format"],
+            subtype=codec["subtype"],
+            compression_level=audio_format.compression_level(target_rate),
+            bitrate_mode=codec.get("bitrate_mode")
+        )
+        data = buffer.getvalue()
+
+    return EncodedAudio(
+        data=data,
+        content_type=codec["content_type"],
+        extension=codec["extension"],
+        sample_rate=target_rate,
+        num_samples=len(wav)
+    )
+
+
+class _AppendSink(io.RawIOBase):
+    """Write-only file that hands out what was written since the last drain"""
+
+    def __init__(self):
+        self._pending = bytearray()
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._pending += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        # Streamable encoders only probe their position; nothing is rewritten
+        return self._position
+
+    def drain(self) -> bytes:
+        data = bytes(self._pending)
+        self._pending.clear()
+        return data
+
+
+class StreamingEncoder:
+    """Encodes a waveform piece by piece for append-only containers
+
+    ``write`` and ``finish`` return the encoded bytes produced so far, so a
+    long narration can be uploaded while it is still being synthesized.
+    Exposes the same metadata as EncodedAudio once finished.
+    """
+
+    def __init__(self, sample_rate: int, audio_format: AudioFormat):
+        if audio_format.codec not in STREAMABLE_CODECS:
+            raise ValueError(f"{audio_format.codec} cannot be encoded as a stream")
+
+        codec = CODECS[audio_format.codec]
+        self.content_type = codec["content_type"]
+        self.extension = codec["extension"]
+        self.sample_rate = int(audio_format.sample_rate or sample_rate)
+        self.num_samples = 0
+        self.size_bytes = 0
+
+        self._resampler = None
+        if self.sample_rate != sample_rate:
+            self._resampler = soxr.ResampleStream(sample_rate, self.sample_rate, 1, dtype="float32")
+
+        self._sink = _AppendSink()
+        self._file = sf.SoundFile(
+            self._sink,
+            "w",
+            self.sample_rate,
+            1,
+            format=codec["format"],
+            subtype=codec["subtype"],
+            compression_level=audio_format.compression_level(self.sample_rate),
+            bitrate_mode=codec.get("bitrate_mode")
+        )
+
+    @property
+    def duration_ms(self) -> int:
+        return round(self.num_samples * 1000 / self.sample_rate)
+
+    def _encode(self, wav: np.ndarray, last: bool = False) -> bytes:
+        wav = np.clip(np.asarray(wav, dtype=np.float32), -1.0, 1.0)
+        if self._resampler is not None:
+            wav = self._resampler.resample_chunk(wav, last=last)
+        if len(wav):
+            self._file.write(wav)
+            self.num_samples += len(wav)
+
+        data = self._sink.drain()
+        self.size_bytes += len(data)
+        return data
+
+    @metrics.timed("encode")
+    def write(self, wav: np.ndarray) -> bytes:
+        """Encode the next samples, returning any complete encoded bytes"""
+        return self._encode(wav)
+
+    @metrics.timed("encode")
+    def finish(self) -> bytes:
+        """Flush the encoder and return the remaining bytes"""
+        data = self._encode(np.zeros(0, dtype=np.float32), last=True)
+        self._file.close()
+        tail = self._sink.drain()
+        self.size_bytes += len(tail)
+        return data + tail
+
+
+class AudioStitcher:
+    """Joins synthesized segments into one continuous waveform
+
+    Leading and trailing silence of each segment is trimmed and replaced by a
+    fixed pause for the boundary type, with short fades so joins do not click.
+    Segments split mid-sentence are overlapped with a crossfade instead. Only
+    the fade tail of the previous segment is held back between calls.
+    """
+
+    PAUSES_MS = {"sentence": 250, "clause": 120, "word": 0}
+
+    def __init__(self, sample_rate: int, crossfade_ms: float = 15.0, silence_threshold_db: float = -45.0):
+        self.sample_rate = sample_rate
+        self.fade = max(1, int(sample_rate * crossfade_ms / 1000))
+        self.threshold = 10 ** (silence_threshold_db / 20)
+        self._tail: Optional[np.ndarray] = None
+        self._tail_boundary = "sentence"
+        self._first = True
+
+    def _trim(self, wav: np.ndarray) -> np.ndarray:
+        voiced = np.flatnonzero(np.abs(wav) > self.threshold)
+        if voiced.size == 0:
+            return wav[:0]
+        margin = self.fade
+        return wav[max(0, voiced[0] - margin): voiced[-1] + 1 + margin]
+
+    def add(self, wav, boundary: str = "sentence") -> np.ndarray:
+        """Add the next segment and return the samples that are now final"""
+        wav = self._trim(np.asarray(wav, dtype=np.float32))
+        if wav.size < 2 * self.fade:
+            return np.zeros(0, dtype=np.float32)
+
+        ramp = np.linspace(0.0, 1.0, self.fade, dtype=np.float32)
+        head, body, tail = wav[:self.fade], wav[self.fade:-self.fade], wav[-self.fade:]
+
+        if self._first:
+            output = [head * ramp, body]
+            self._first = False
+        elif self.PAUSES_MS.get(self._tail_boundary, 0) == 0:
+            # Mid-sentence split: overlap the previous tail with this head
+            output = [self._tail * ramp[::-1] + head * ramp, body]
+        else:
+            pause = np.zeros(int(self.sample_rate * self.PAUSES_MS[self._tail_boundary] / 1000), dtype=np.float32)
+            output = [self._tail * ramp[::-1], pause, head * ramp, body]
+
+        self._tail = tail.copy()
+        self._tail_boundary = boundary
+        return np.concatenate(output)
+
+    def finish(self) -> np.ndarray:
+        """Flush the held-back tail with a fade-out"""
+        if self._tail is None:
+            return np.zeros(0, dtype=np.float32)
+        ramp = np.linspace(1.0, 0.0, self.fade, dtype=np.float32)
+        tail, self._tail = self._tail * ramp, None
+        return tail
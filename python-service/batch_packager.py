@@ -0,0 +1,216 @@
+import io
+import os
+import json
+import time
+import asyncio
+import logging
+import zipfile
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+from job_store import JobStore, FINISHED_STATES
+from status_cache import JobStatusCache
+from supabase_client import SupabaseClient
+
+logger = logging.getLogger(__name__)
+
+# "zip": every output plus a manifest in one archive; "m3u": a playlist of the output URLs
+PACKAGE_FORMATS = ("zip", "m3u")
+
+# Longest job text kept as a playlist entry title
+TITLE_LENGTH = 80
+
+
+class BatchPackager:
+    """Tracks jobs submitted together and packages their outputs when all finished
+
+    Batches live in the job store next to their jobs, so a batch whose last
+    job finished while the service was down is still packaged after a
+    restart. Outputs are listed in submission order; failed jobs appear in
+    the manifest with their error and are left out of the playlist.
+    """
+
+    def __init__(self, store: JobStore, supabase_client: SupabaseClient, status_cache: JobStatusCache):
+        self.store = store
+        self.supabase_client = supabase_client
+        self.status_cache = status_cache
+        self.download_concurrency = int(os.getenv("BATCH_DOWNLOAD_CONCURRENCY", "8"))
+        self._tasks = set()
+        self._counters = {
+            "batches": 0,
+            "packaged": 0,
+            "package_failures": 0
+        }
+
+    def register(self, batch_id: str, user_id: str, job_ids: List[str], package: Optional[str] = None) -> bool:
+        """Start tracking a batch; False if a batch with this ID is already known"""
+        if not self.store.add_batch(batch_id, user_id, job_ids, package, time.time()):
+            return False
+        self._counters["batches"] += 1
+        return True
+
+    def forget(self, batch_id: str):
+        """Stop tracking a batch whose jobs were never queued"""
+        self.store.remove_batch(batch_id)
+
+    def job_finished(self, job_id: str):
+        """Scheduler callback: package the batches this job completed"""
+        for batch_id in self.store.open_batches_of(job_id):
+            self._check(batch_id)
+
+    def resume(self):
+        """Package batches that finished, or were being packaged, while the service was down"""
+        for batch_id in self.store.open_batches():
+            self._check(batch_id, resume=True)
+
+    async def stop(self):
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def summary(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Progress of a batch by job state, and its package once built"""
+        batch = self.store.batch(batch_id)
+        if batch is None:
+            return None
+
+        states = self.store.job_states(batch["job_ids"])
+        jobs_by_state: Dict[str, int] = {}
+        for job_id in batch["job_ids"]:
+            state = states.get(job_id, "unknown")
+            jobs_by_state[state] = jobs_by_state.get(state, 0) + 1
+
+        return {
+            "batch_id": batch_id,
+            "status": batch["status"],
+            "total_jobs": len(batch["job_ids"]),
+            "finished_jobs": sum(count for state, count in jobs_by_state.items() if state in FINISHED_STATES),
+            "jobs_by_state": jobs_by_state,
+            "package": batch["package"],
+            "package_url": batch["package_url"],
+            "error": batch["error"]
+        }
+
+    def _check(self, batch_id: str, resume: bool = False):
+        batch = self.store.batch(batch_id)
+        if batch is None:
+            return
+
+        # Jobs pruned from the store finished long ago
+        states = self.store.job_states(batch["job_ids"])
+        if any(states.get(job_id, "done") not in FINISHED_STATES for job_id in batch["job_ids"]):
+            return
+
+        now = time.time()
+        if not self.store.start_packaging(batch_id, now, resume):
+            return
+
+        if not batch["package"]:
+            self.store.finish_batch(batch_id, now, "completed")
+            return
+
+        task = asyncio.create_task(self._package(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _package(self, batch: Dict[str, Any]):
+        batch_id = batch["batch_id"]
+        started = time.perf_counter()
+        try:
+            entries = await asyncio.gather(*(self._entry(job_id) for job_id in batch["job_ids"]))
+            if batch["package"] == "m3u":
+                data, extension, content_type = self._playlist(entries), "m3u8", "audio/x-mpegurl"
+            else:
+                data, extension, content_type = await self._archive(entries), "zip", "application/zip"
+
+            package_url = await self.supabase_client.upload_audio(
+                data,
+                f"{batch['user_id']}/batches/{batch_id}.{extension}",
+                content_type
+            )
+            self.store.finish_batch(batch_id, time.time(), "completed", package_url=package_url)
+            self._counters["packaged"] += 1
+            logger.info(
+                f"Packaged batch {batch_id} ({len(entries)} jobs, {len(data)} bytes) "
+                f"in {(time.perf_counter() - started) * 1000:.0f}ms"
+            )
+
+        except asyncio.CancelledError:
+            # Left in packaging, so resume() picks it up after the restart
+            raise
+        except Exception as e:
+            self.store.finish_batch(batch_id, time.time(), "failed", error=str(e))
+            self._counters["package_failures"] += 1
+            logger.error(f"Failed to package batch {batch_id}: {str(e)}")
+
+    async def _entry(self, job_id: str) -> Dict[str, Any]:
+        """Manifest entry of a job from its latest status row"""
+        try:
+            row = await self.status_cache.fetch(job_id, self.supabase_client.get_job_status)
+        except Exception as e:
+            logger.warning(f"No status for job {job_id} of a batch: {str(e)}")
+            row = {}
+
+        result = row.get("result_data") or {}
+        if isinstance(result, str):
+            result = json.loads(result)
+
+        return {
+            "job_id": job_id,
+            "status": row.get("status", "unknown"),
+            "text": result.get("text") or result.get("translated_text"),
+            "audio_url": result.get("audio_url"),
+            "duration_ms": result.get("duration_ms"),
+            "error": row.get("error_message")
+        }
+
+    @staticmethod
+    def _playlist(entries: List[Dict[str, Any]]) -> bytes:
+        """Extended M3U playlist of the completed outputs"""
+        lines = ["#EXTM3U"]
+        for entry in entries:
+            if not entry["audio_url"]:
+                continue
+            seconds = round(entry["duration_ms"] / 1000) if entry["duration_ms"] else -1
+            title = " ".join((entry["text"] or entry["job_id"]).split())[:TITLE_LENGTH]
+            lines.append(f"#EXTINF:{seconds},{title}")
+            lines.append(entry["audio_url"])
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    async def _archive(self, entries: List[Dict[str, Any]]) -> bytes:
+        """ZIP of every output plus manifest.json, built off the event loop"""
+        semaphore = asyncio.Semaphore(self.download_concurrency)
+
+        async def download(index: int, entry: Dict[str, Any]) -> Optional[tuple]:
+            if not entry["audio_url"]:
+                return None
+            async with semaphore:
+                data = await self.supabase_client.download_object(entry["audio_url"])
+            extension = os.path.splitext(urlparse(entry["audio_url"]).path)[1]
+            entry["file"] = f"{index + 1:04d}-{entry['job_id']}{extension}"
+            return entry["file"], data
+
+        files = [
+            file for file in await asyncio.gather(*(download(i, entry) for i, entry in enumerate(entries)))
+            if file is not None
+        ]
+        manifest = json.dumps({"jobs": entries}, indent=2).encode("utf-8")
+        return await asyncio.get_running_loop().run_in_executor(None, self._zip, files, manifest)
+
+    @staticmethod
+    def _zip(files: List[tuple], manifest: bytes) -> bytes:
+        buffer = io.BytesIO()
+        # Encoded audio does not compress further; storing skips the CPU cost
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+            for name, data in files:
+                archive.writestr(name, data)
+            archive.writestr("manifest.json", manifest, compress_type=zipfile.ZIP_DEFLATED)
+        return buffer.getvalue()
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch counters and packaging in progress"""
+        return {
+            "packaging": len(self._tasks),
+            **self._counters
+        }
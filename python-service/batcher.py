@@ -0,0 +1,154 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BatchRunner = Callable[[Hashable, List[Any]], Awaitable[List[Any]]]
+
+
+@dataclass
+class _PendingItem:
+    key: Hashable
+    item: Any
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class InferenceBatcher:
+    """Collects concurrent requests into micro-batches of compatible items
+
+    Requests are gathered for up to ``max_wait_ms`` or until ``max_batch_size``
+    items are waiting, grouped by key, and each group is handed to ``run_batch``
+    as one call. Results are returned to each caller in submission order.
+    """
+
+    def __init__(
+        self,
+        run_batch: BatchRunner,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size or int(os.getenv("TTS_BATCH_MAX_SIZE", "8"))
+        self.max_wait_ms = max_wait_ms if max_wait_ms is not None else float(os.getenv("TTS_BATCH_MAX_WAIT_MS", "20"))
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._tasks = set()
+
+        # Report
+        self._batch_sizes = deque(maxlen=1000)
+        self._waits = deque(maxlen=1000)
+        self._latencies = deque(maxlen=1000)
+        self._items = 0
+        self._batches = 0
+        self._started_at = time.monotonic()
+
+    async def submit(self, key: Hashable, item: Any) -> Any:
+        """Queue an item and wait for its result"""
+        if self._collector is None:
+            self._queue = asyncio.Queue()
+            self._collector = asyncio.create_task(self._collect_loop())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_PendingItem(key, item, future))
+        return await future
+
+    async def stop(self):
+        """Stop collecting and fail anything still queued"""
+        if self._collector:
+            self._collector.cancel()
+            self._collector = None
+        while self._queue and not self._queue.empty():
+            pending = self._queue.get_nowait()
+            if not pending.future.done():
+                pending.future.set_exception(RuntimeError("Batcher stopped"))
+
+    async def _collect_loop(self):
+        # The getter is never cancelled on timeout, so no queued item can be lost
+        getter: Optional[asyncio.Future] = None
+        while True:
+            if getter is None:
+                getter = asyncio.ensure_future(self._queue.get())
+            batch = [await getter]
+            getter = None
+            deadline = time.monotonic() + self.max_wait_ms / 1000
+
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                getter = asyncio.ensure_future(self._queue.get())
+                done, _ = await asyncio.wait({getter}, timeout=remaining)
+                if not done:
+                    break
+                batch.append(getter.result())
+                getter = None
+
+            groups: Dict[Hashable, List[_PendingItem]] = {}
+            for pending in batch:
+                # Callers that gave up no longer need a slot in the batch
+                if not pending.future.done():
+                    groups.setdefault(pending.key, []).append(pending)
+
+            for key, group in groups.items():
+                task = asyncio.create_task(self._execute(key, group))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, key: Hashable, group: List[_PendingItem]):
+        started = time.monotonic()
+        for pending in group:
+            self._waits.append(started - pending.enqueued_at)
+
+        try:
+            results = await self.run_batch(key, [pending.item for pending in group])
+            for pending, result in zip(group, results):
+                if not pending.future.done():
+                    pending.future.set_result(result)
+
+        except Exception as e:
+            logger.error(f"Batch of {len(group)} items failed: {str(e)}")
+            for pending in group:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+
+        finished = time.monotonic()
+        self._batches += 1
+        self._items += len(group)
+        self._batch_sizes.append(len(group))
+        for pending in group:
+            self._latencies.append(finished - pending.enqueued_at)
+
+    def stats(self) -> Dict[str, Any]:
+        """Throughput vs latency report for the recent batches"""
+        def summary(values) -> Dict[str, float]:
+            ordered = sorted(values)
+            if not ordered:
+                return {"avg": 0.0, "p50": 0.0, "p95": 0.0}
+            return {
+                "avg": round(sum(ordered) / len(ordered) * 1000, 2),
+                "p50": round(ordered[len(ordered) // 2] * 1000, 2),
+                "p95": round(ordered[int(len(ordered) * 0.95)] * 1000, 2)
+            }
+
+        elapsed = time.monotonic() - self._started_at
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": self._batches,
+            "items": self._items,
+            "avg_batch_size": round(sum(self._batch_sizes) / len(self._batch_sizes), 2) if self._batch_sizes else 0.0,
+            "throughput_per_second": round(self._items / elapsed, 3) if elapsed > 0 else 0.0,
+            "batch_wait_ms": summary(self._waits),
+            "latency_ms": summary(self._latencies)
+        }
@@ -0,0 +1,105 @@
+"""Compare the legacy temp-file audio round trip with the in-memory path.
+
+Both paths start from the same synthetic waveform (standing in for the model's
+``tts()`` output) and a WAV reference sample, so the benchmark runs without the
+XTTS model. File operations are counted with a Python audit hook.
+
+    cd python-service
+    python benchmarks/bench_audio_io.py --seconds 10 --iterations 50
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from collections import Counter
+
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_utils import encode_wav, decode_audio
+
+SAMPLE_RATE = 24000
+REFERENCE_SAMPLE_RATE = 22050
+
+file_events = Counter()
+counting = False
+
+
+def audit(event, args):
+    if counting and event in ("open", "os.remove", "os.rename", "tempfile.mkstemp"):
+        file_events[event] += 1
+
+
+def legacy_job(wav: np.ndarray, reference: bytes) -> bytes:
+    """Old flow: reference sample and output both go through temp files"""
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as sample_file:
+        sample_file.write(reference)
+        sample_path = sample_file.name
+    sf.read(sample_path)
+
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as output_file:
+        sf.write(output_file.name, wav, SAMPLE_RATE)
+        with open(output_file.name, "rb") as f:
+            audio_data = f.read()
+
+    os.unlink(sample_path)
+    os.unlink(output_file.name)
+    return audio_data
+
+
+def memory_job(wav: np.ndarray, reference: bytes) -> bytes:
+    """New flow: reference decoded and output encoded from in-memory buffers"""
+    decode_audio(reference)
+    return encode_wav(wav, SAMPLE_RATE)
+
+
+def run(name, job, wav, reference, iterations):
+    global counting
+    file_events.clear()
+    timings = []
+
+    counting = True
+    for _ in range(iterations):
+        started = time.perf_counter()
+        job(wav, reference)
+        timings.append(time.perf_counter() - started)
+    counting = False
+
+    timings.sort()
+    return {
+        "path": name,
+        "p50_ms": round(timings[len(timings) // 2] * 1000, 3),
+        "mean_ms": round(sum(timings) / len(timings) * 1000, 3),
+        "file_ops_per_job": round(sum(file_events.values()) / iterations, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10.0, help="synthetic output length")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    wav = (rng.standard_normal(int(SAMPLE_RATE * args.seconds)) * 0.1).astype(np.float32)
+    reference = encode_wav(
+        (rng.standard_normal(REFERENCE_SAMPLE_RATE * 6) * 0.1).astype(np.float32),
+        REFERENCE_SAMPLE_RATE
+    )
+
+    sys.addaudithook(audit)
+    for result in (
+        run("tempfile", legacy_job, wav, reference, args.iterations),
+        run("in-memory", memory_job, wav, reference, args.iterations)
+    ):
+        print(
+            f"{result['path']:>10}: p50 {result['p50_ms']:8.3f} ms  "
+            f"mean {result['mean_ms']:8.3f} ms  file ops/job {result['file_ops_per_job']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Real-time factor, memory and parity of the XTTS inference backends on CPU.
+
+Each backend (TTS_BACKEND) is loaded in a fresh process so memory numbers
+do not leak between runs. The process synthesizes the same texts with
+speaker latents and reports load time, resident memory after loading, peak
+memory, real-time factor and the parity metrics of the startup check.
+Needs the XTTS weights in TTS_MODEL_DIR (see model_loader.py).
+
+    cd python-service
+    python benchmarks/bench_backends.py --backends reference,int8,compile,onnx --output backends.json
+"""
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TEXTS = [
+    "Hello, and welcome to the service.",
+    "The quick brown fox jumps over the lazy dog while the band plays on.",
+    "Speech synthesis on a CPU is mostly spent in the autoregressive decoder, "
+    "one token at a time, before the waveform is generated in a single pass."
+]
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+def child(args):
+    import torch
+    from tts_engine import TTSEngine
+
+    torch.set_num_threads(args.threads)
+    engine = TTSEngine()
+
+    started = time.perf_counter()
+    engine.model = engine._load_model()
+    load_ms = (time.perf_counter() - started) * 1000
+    loaded_rss = rss_mb()
+
+    latents = engine._parity_latents(engine.xtts)
+    engine._synthesize_with_latents(TEXTS[0], "en", *latents)
+
+    audio_seconds = compute_seconds = 0.0
+    for _ in range(args.repeats):
+        for text in TEXTS:
+            started = time.perf_counter()
+            wav = engine._synthesize_with_latents(text, "en", *latents)
+            compute_seconds += time.perf_counter() - started
+            audio_seconds += len(wav) / engine.sample_rate
+
+    print(json.dumps({
+        "backend": engine.backend_info["active"],
+        "requested": args.child,
+        "load_ms": round(load_ms, 1),
+        "rss_after_load_mb": round(loaded_rss, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "rtf": round(audio_seconds / compute_seconds, 3),
+        "parity": engine.backend_info.get("parity"),
+        "error": engine.backend_info.get("error")
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", default="reference,int8,compile,onnx")
+    parser.add_argument("--repeats", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", default="bench_backends.json")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    results = []
+    for backend in args.backends.split(","):
+        completed = subprocess.run(
+            [sys.executable, __file__, "--child", backend, "--repeats", str(args.repeats), "--threads", str(args.threads)],
+            env={**os.environ, "TTS_BACKEND": backend},
+            capture_output=True,
+            text=True
+        )
+        if completed.returncode != 0:
+            print(f"{backend:<10} failed:\n{completed.stderr[-2000:]}")
+            continue
+
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        results.append(result)
+        parity = result["parity"] or {}
+        print(
+            f"{backend:<10} active {result['backend']:<10} load {result['load_ms']:9.0f} ms  "
+            f"rss {result['rss_after_load_mb']:7.0f} MB  peak {result['peak_rss_mb']:7.0f} MB  "
+            f"rtf {result['rtf']:6.3f}  similarity {parity.get('spectral_similarity', '-')}"
+        )
+
+    with open(args.output, "w") as f:
+        json.dump({"threads": args.threads, "results": results}, f, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Throughput vs latency of the micro-batching layer under concurrent load.
+
+A fake model stands in for XTTS: every pool call pays a fixed overhead (speaker
+latent lookup, dispatch) plus a per-item cost, so grouping requests trades a
+little queueing delay for fewer calls. Tune the cost model to match numbers
+measured on real hardware.
+
+    cd python-service
+    python benchmarks/bench_batching.py --requests 64 --concurrency 16 \
+        --batch-sizes 1,4,8 --wait-ms 0,10,25
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batcher import InferenceBatcher
+from inference_pool import InferencePool
+
+
+def fake_model_call(items, call_overhead_ms: float, item_ms: float):
+    time.sleep((call_overhead_ms + item_ms * len(items)) / 1000)
+    return [f"wav:{item}" for item in items]
+
+
+async def run_unbatched(args, pool: InferencePool):
+    async def request(i):
+        started = time.perf_counter()
+        await pool.run(fake_model_call, [i], args.call_overhead_ms, args.item_ms)
+        return time.perf_counter() - started
+
+    return await drive(args, request)
+
+
+async def run_batched(args, pool: InferencePool, batch_size: int, wait_ms: float):
+    async def run_batch(key, items):
+        return await pool.run(fake_model_call, items, args.call_overhead_ms, args.item_ms)
+
+    batcher = InferenceBatcher(run_batch, max_batch_size=batch_size, max_wait_ms=wait_ms)
+
+    async def request(i):
+        started = time.perf_counter()
+        # Two languages so groups are split by compatibility key
+        await batcher.submit(("en" if i % 4 else "es", None), i)
+        return time.perf_counter() - started
+
+    try:
+        return await drive(args, request)
+    finally:
+        await batcher.stop()
+
+
+async def drive(args, request):
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(i):
+        async with semaphore:
+            return await request(i)
+
+    started = time.perf_counter()
+    latencies = sorted(await asyncio.gather(*(limited(i) for i in range(args.requests))))
+    elapsed = time.perf_counter() - started
+    return {
+        "throughput": args.requests / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000
+    }
+
+
+def report(label, result):
+    print(
+        f"{label:<22} {result['throughput']:8.1f} req/s  "
+        f"p50 {result['p50_ms']:8.1f} ms  p95 {result['p95_ms']:8.1f} ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=1, help="inference pool threads")
+    parser.add_argument("--call-overhead-ms", type=float, default=15.0)
+    parser.add_argument("--item-ms", type=float, default=10.0)
+    parser.add_argument("--batch-sizes", default="1,4,8")
+    parser.add_argument("--wait-ms", default="0,10,25")
+    args = parser.parse_args()
+
+    pool = InferencePool(args.workers)
+    try:
+        report("unbatched", await run_unbatched(args, pool))
+        for batch_size in [int(v) for v in args.batch_sizes.split(",")]:
+            for wait_ms in [float(v) for v in args.wait_ms.split(",")]:
+                result = await run_batched(args, pool, batch_size, wait_ms)
+                report(f"batch={batch_size} wait={wait_ms:g}ms", result)
+    finally:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
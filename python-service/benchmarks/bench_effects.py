@@ -0,0 +1,86 @@
+"""Throughput of each post-synthesis effect, whole-buffer and chunked.
+
+Runs every AudioEffects stage on the same synthetic voiced waveform
+(a harmonic tone with a syllable-rate envelope and pauses, standing in for
+the model's output) and reports how many seconds of audio each processes per
+second of CPU time. The chunked column feeds the waveform in pieces the size
+of stitched segments, as streaming synthesis does.
+
+    cd python-service
+    python benchmarks/bench_effects.py --seconds 30 --iterations 5
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_effects import AudioEffects
+
+SAMPLE_RATE = 24000
+
+OPERATIONS = {
+    "trim": AudioEffects(trim_silence=True),
+    "stretch x1.25": AudioEffects(speed=1.25),
+    "stretch x0.8": AudioEffects(speed=0.8),
+    "pitch x1.2": AudioEffects(pitch=1.2),
+    "speed+pitch": AudioEffects(speed=1.2, pitch=0.9),
+    "loudness": AudioEffects(loudness_lufs=-16.0),
+    "all": AudioEffects(speed=1.2, pitch=0.9, loudness_lufs=-16.0, trim_silence=True)
+}
+
+
+def speech_like(seconds: float) -> np.ndarray:
+    """Harmonic tone at a speaking pitch, modulated into syllables with pauses"""
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    f0 = 140 + 20 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    voice = sum(np.sin(k * phase) / k for k in range(1, 10))
+    syllables = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+    pauses = (np.sin(2 * np.pi * 0.3 * t) > -0.8).astype(float)
+    return (0.1 * voice * syllables * pauses).astype(np.float32)
+
+
+def whole(effects: AudioEffects, wav: np.ndarray) -> np.ndarray:
+    return effects.apply(wav, SAMPLE_RATE)
+
+
+def chunked(effects: AudioEffects, wav: np.ndarray, chunk: int) -> np.ndarray:
+    chain = effects.chain(SAMPLE_RATE)
+    parts = [chain.process(wav[start:start + chunk]) for start in range(0, len(wav), chunk)]
+    parts.append(chain.finish())
+    return np.concatenate(parts)
+
+
+def realtime(run, wav: np.ndarray, iterations: int) -> float:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        run(wav)
+        timings.append(time.perf_counter() - started)
+    return len(wav) / SAMPLE_RATE / min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=30.0, help="synthetic waveform length")
+    parser.add_argument("--chunk-seconds", type=float, default=2.0, help="chunk size of the streaming run")
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    wav = speech_like(args.seconds)
+    chunk = int(SAMPLE_RATE * args.chunk_seconds)
+
+    print(f"{'operation':>14}  {'whole':>10}  {'chunked':>10}  {'out/in':>7}")
+    for name, effects in OPERATIONS.items():
+        whole_rate = realtime(lambda w: whole(effects, w), wav, args.iterations)
+        chunked_rate = realtime(lambda w: chunked(effects, w, chunk), wav, args.iterations)
+        ratio = len(whole(effects, wav)) / len(wav)
+        print(f"{name:>14}  {whole_rate:9.0f}x  {chunked_rate:9.0f}x  {ratio:7.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Throughput of thread-pool vs multi-process model serving under concurrent load.
+
+A fake engine stands in for XTTS. Each call does pure-Python work that holds
+the GIL, which is the part of inference that threads cannot run in parallel.
+The benchmark compares the in-process inference pool against ModelWorkerPool
+at several worker counts. Each worker returns one second of 24 kHz audio
+through shared memory.
+
+Before that it checks that a voice cloned on one worker synthesizes on
+another, with real TTSEngines around the fake XTTS model.
+
+    cd python-service
+    python benchmarks/bench_model_workers.py --requests 48 --concurrency 8 --workers 1,2,4
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_utils import encode_wav
+from inference_pool import InferencePool
+from model_workers import ModelWorkerPool, cpu_sets
+
+SAMPLE_RATE = 24000
+
+
+class FakeEngine:
+    def __init__(self, work: int):
+        self.work = work
+
+    def _get_voice_settings(self, voice_id, emotion, speed, pitch):
+        return {"voice_id": voice_id, "speaker_wav": None, "speaker_key": None}
+
+    def _synthesize_waveform(self, text, language, voice_settings):
+        total = 0
+        for i in range(self.work):
+            total += i * i
+        return np.full(SAMPLE_RATE, (total % 7) / 10, dtype=np.float32)
+
+
+class FakeEngineFactory:
+    def __init__(self, work: int):
+        self.work = work
+
+    def __call__(self, num_threads: int, speaker_cache_dir: str):
+        return FakeEngine(self.work)
+
+
+class FakeXttsEngineFactory:
+    """TTSEngine with the fake XTTS model, built inside each worker"""
+
+    def __call__(self, num_threads: int, speaker_cache_dir: str):
+        from benchmarks.fake_model import use_fake_model
+        from speaker_cache import SpeakerLatentCache
+        from tts_engine import TTSEngine
+
+        engine = TTSEngine(speaker_cache=SpeakerLatentCache(cache_dir=speaker_cache_dir))
+        use_fake_model(engine, rtf=50.0, conditioning_seconds=0.05)
+        engine.model = engine._load_model()
+        return engine
+
+
+async def check_cloned_voice_across_workers():
+    """Clone a voice on worker 0, then synthesize it on worker 1 while worker 0 is busy"""
+    from speaker_cache import SpeakerLatentCache
+    from tts_engine import TTSEngine
+
+    # A temporary cache directory, shared by the two workers and removed with them
+    workers = ModelWorkerPool(2, threads_per_worker=1, engine_factory=FakeXttsEngineFactory(), speaker_cache_dir="")
+    engine = TTSEngine(speaker_cache=SpeakerLatentCache(cache_dir=""), model_workers=workers)
+    await engine.initialize()
+    try:
+        t = np.arange(3 * 22050, dtype=np.float32) / 22050
+        sample = encode_wav(0.3 * np.sin(2 * np.pi * 130 * t), 22050)
+        await engine.clone_voice(sample, "Cloned on the first worker.")
+        voice_id = engine.voice_id_for(sample)
+
+        # Idle workers are picked in order, so the blocker lands on worker 0 and the voice on worker 1
+        blocker = asyncio.ensure_future(engine.synthesize_speech("Keeping the first worker busy for a while."))
+        await asyncio.sleep(0)
+        cloned = asyncio.ensure_future(engine.synthesize_speech("Spoken on the second worker.", voice_id=voice_id))
+        await asyncio.sleep(0)
+        assert [worker["in_flight"] for worker in workers.stats()["workers"]] == [1, 1]
+
+        audio = await cloned
+        await blocker
+        assert audio.duration_ms > 0
+        print(f"cloned voice synthesized on another worker ({audio.duration_ms} ms)")
+    finally:
+        await engine.cleanup()
+
+
+async def drive(args, call):
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def request(i):
+        async with semaphore:
+            started = time.perf_counter()
+            wav = await call(f"Sentence {i}.")
+            assert wav.shape == (SAMPLE_RATE,)
+            return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = sorted(await asyncio.gather(*(request(i) for i in range(args.requests))))
+    elapsed = time.perf_counter() - started
+    return {
+        "throughput": args.requests / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000
+    }
+
+
+def report(label, result):
+    print(
+        f"{label:<22} {result['throughput']:8.1f} req/s  "
+        f"p50 {result['p50_ms']:8.1f} ms  p95 {result['p95_ms']:8.1f} ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=48)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--work", type=int, default=2_000_000, help="loop iterations per fake inference call")
+    args = parser.parse_args()
+
+    await check_cloned_voice_across_workers()
+    print(f"{len(cpu_sets(1)[0])} CPUs available")
+
+    for num_workers in [int(v) for v in args.workers.split(",")]:
+        engine = FakeEngine(args.work)
+        pool = InferencePool(num_workers)
+        try:
+            result = await drive(args, lambda text: pool.run(engine._synthesize_waveform, text, "en", None))
+            report(f"threads={num_workers}", result)
+        finally:
+            pool.shutdown()
+
+        workers = ModelWorkerPool(num_workers, threads_per_worker=1, engine_factory=FakeEngineFactory(args.work))
+        await workers.start()
+        try:
+            result = await drive(args, lambda text: workers.synthesize(text, "en", {}))
+            report(f"processes={num_workers}", result)
+        finally:
+            await workers.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,356 @@
+"""Latency, real-time factor and throughput of the synthesis and job pipeline.
+
+Runs three suites against the service as deployed (main.py), with Supabase
+replaced by the in-process ``fake_supabase`` server:
+
+- synthesis: ``TTSEngine.synthesize_speech`` across text lengths and languages
+- clone: ``clone_voice`` with a new reference sample (cold) and a repeated one (warm)
+- e2e: ``POST /process-job`` under concurrent load until every job is completed
+- translation: speech translation of a synthetic recording, with the busy
+  time of each stage against the wall time of the overlapped pipeline
+
+``--model fake`` (the default) loads ``benchmarks.fake_model`` instead of
+XTTS, Whisper and MarianMT, so the suite runs on a CPU-only box without
+network. Results are
+written as JSON; ``--compare`` prints the change against an earlier file.
+
+    cd python-service
+    python benchmarks/bench_pipeline.py --output results.json
+    python benchmarks/bench_pipeline.py --model xtts --compare results.json
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+from typing import Any, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fake_supabase
+from benchmarks.bench_supabase_io import free_port, start_fake_server
+
+SAMPLES = {
+    "en": "The quick brown fox jumps over the lazy dog near the river bank.",
+    "es": "El veloz murciélago hindú comía feliz cardillo y kiwi en la orilla.",
+    "de": "Zwölf Boxkämpfer jagen Viktor quer über den großen Sylter Deich.",
+    "fr": "Portez ce vieux whisky au juge blond qui fume près de la rivière.",
+    "zh-cn": "我们明天早上在公园门口见面，然后一起去图书馆看书。"
+}
+
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+
+def text_of_length(language: str, chars: int) -> str:
+    sample = SAMPLES[language]
+    sentences = []
+    while sum(len(s) + 1 for s in sentences) < chars:
+        sentences.append(sample)
+    return " ".join(sentences)
+
+
+def reference_sample(seed: int, seconds: float = 6.0) -> bytes:
+    """WAV reference for cloning; a different seed gives a different cache key"""
+    from audio_utils import encode_audio
+
+    rate = 22050
+    t = np.arange(int(seconds * rate), dtype=np.float32) / rate
+    wav = 0.3 * np.sin(2 * np.pi * (150 + seed) * t) + 0.01 * np.random.default_rng(seed).standard_normal(len(t))
+    return encode_audio(wav.astype(np.float32), rate).data
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    latencies = sorted(latencies)
+    return {
+        "samples": len(latencies),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 1)
+    }
+
+
+async def bench_synthesis(engine, args) -> List[Dict[str, Any]]:
+    results = []
+    for language in args.languages.split(","):
+        for chars in [int(v) for v in args.lengths.split(",")]:
+            text = text_of_length(language, chars)
+            latencies, audio_ms = [], 0
+            for _ in range(args.repeats):
+                started = time.perf_counter()
+                audio = await engine.synthesize_speech(text, language=language)
+                latencies.append(time.perf_counter() - started)
+                audio_ms += audio.duration_ms
+
+            result = {
+                "language": language,
+                "chars": len(text),
+                **summarize(latencies),
+                "rtf": round(audio_ms / 1000 / sum(latencies), 2)
+            }
+            results.append(result)
+            print(
+                f"synthesis {language:<6} {len(text):>5} chars  p50 {result['p50_ms']:8.1f} ms  "
+                f"p95 {result['p95_ms']:8.1f} ms  rtf {result['rtf']:6.2f}"
+            )
+    return results
+
+
+async def bench_clone(engine, args) -> Dict[str, Any]:
+    text = text_of_length("en", 120)
+    base = int(time.time()) % 1000
+
+    async def clone(reference: bytes) -> float:
+        started = time.perf_counter()
+        await engine.clone_voice(reference, text)
+        return time.perf_counter() - started
+
+    # Every cold call uses a sample the latent cache has never seen
+    cold = [await clone(reference_sample(base + i)) for i in range(args.repeats)]
+    warm_reference = reference_sample(base + args.repeats)
+    await clone(warm_reference)
+    warm = [await clone(warm_reference) for _ in range(args.repeats)]
+
+    result = {"cold": summarize(cold), "warm": summarize(warm)}
+    result["warm_speedup"] = round(result["cold"]["p50_ms"] / result["warm"]["p50_ms"], 2)
+    print(
+        f"clone     cold p50 {result['cold']['p50_ms']:8.1f} ms  warm p50 {result['warm']['p50_ms']:8.1f} ms  "
+        f"speedup {result['warm_speedup']:.2f}x"
+    )
+    return result
+
+
+async def bench_e2e(app, args) -> Dict[str, Any]:
+    import httpx
+
+    text = text_of_length("en", args.e2e_chars)
+    run = uuid.uuid4().hex[:8]
+    job_ids = [f"bench-{run}-{i}" for i in range(args.jobs)]
+    submitted: Dict[str, float] = {}
+    finished: Dict[str, float] = {}
+    semaphore = asyncio.Semaphore(args.concurrency)
+    rejected = 0
+
+    async def submit(client: httpx.AsyncClient, job_id: str):
+        nonlocal rejected
+        async with semaphore:
+            while True:
+                submitted[job_id] = time.perf_counter()
+                response = await client.post("/process-job", json={
+                    "job_id": job_id,
+                    "job_type": "text_to_speech",
+                    "input_data": {"text": text, "language": "en"},
+                    "user_id": "bench"
+                })
+                if response.status_code != 429:
+                    response.raise_for_status()
+                    return
+                rejected += 1
+                await asyncio.sleep(0.1)
+
+    async def watch():
+        rows = fake_supabase.tables["jobs"]
+        while len(finished) < len(job_ids):
+            now = time.perf_counter()
+            for job_id in job_ids:
+                if job_id not in finished and rows.get(job_id, {}).get("status") in TERMINAL_STATUSES:
+                    finished[job_id] = now
+            await asyncio.sleep(0.01)
+
+    started = time.perf_counter()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        watcher = asyncio.ensure_future(watch())
+        await asyncio.gather(*(submit(client, job_id) for job_id in job_ids))
+        await asyncio.wait_for(watcher, args.e2e_timeout)
+    elapsed = time.perf_counter() - started
+
+    statuses = [fake_supabase.tables["jobs"][job_id]["status"] for job_id in job_ids]
+    result = {
+        "jobs": len(job_ids),
+        "concurrency": args.concurrency,
+        "chars": len(text),
+        "throughput_jobs_per_s": round(len(job_ids) / elapsed, 2),
+        "latency": summarize([finished[job_id] - submitted[job_id] for job_id in job_ids]),
+        "failed": sum(status != "completed" for status in statuses),
+        "rejected_429": rejected
+    }
+    print(
+        f"e2e       {result['jobs']} jobs x{args.concurrency}  {result['throughput_jobs_per_s']:6.2f} jobs/s  "
+        f"p50 {result['latency']['p50_ms']:8.1f} ms  p95 {result['latency']['p95_ms']:8.1f} ms  "
+        f"failed {result['failed']}"
+    )
+    return result
+
+
+def speech_recording(seconds: float, seed: int = 0, rate: int = 16000) -> bytes:
+    """WAV of voiced bursts of 1.5 to 6 seconds separated by pauses"""
+    from audio_utils import encode_audio
+
+    rng = np.random.default_rng(seed)
+    parts = []
+    while sum(len(part) for part in parts) < seconds * rate:
+        t = np.arange(int(rng.uniform(1.5, 6.0) * rate), dtype=np.float32) / rate
+        burst = np.sin(2 * np.pi * rng.uniform(110, 220) * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 4 * t))
+        parts.append((0.3 * burst).astype(np.float32))
+        parts.append(0.002 * rng.standard_normal(int(rng.uniform(0.6, 1.2) * rate)).astype(np.float32))
+    return encode_audio(np.concatenate(parts), rate).data
+
+
+async def bench_translation(service, args) -> Dict[str, Any]:
+    engine = service.tts_engine
+    recording = speech_recording(args.translation_seconds)
+
+    started = time.perf_counter()
+    translation = await service.services.speech_translator.translate(
+        recording,
+        "de",
+        lambda text: engine.synthesize_waveform(text, "de"),
+        engine.sample_rate
+    )
+    elapsed = time.perf_counter() - started
+
+    busy = {name: value for name, value in translation.timings.items() if name != "total_ms"}
+    result = {
+        "input_seconds": args.translation_seconds,
+        "segments": len(translation.segments),
+        "total_ms": round(elapsed * 1000, 1),
+        **busy,
+        # 1.0 means the stages ran one after another; 3.0 is perfect overlap
+        "overlap": round(sum(busy.values()) / (elapsed * 1000), 2),
+        "rtf": round(args.translation_seconds / elapsed, 2)
+    }
+    print(
+        f"translate {args.translation_seconds:.0f}s audio, {result['segments']} segments  "
+        f"total {result['total_ms']:8.1f} ms  stages {', '.join(f'{k} {v:.0f}' for k, v in busy.items())}  "
+        f"overlap {result['overlap']:.2f}x"
+    )
+    return result
+
+
+def flatten(value: Any, prefix: str = "") -> Dict[str, float]:
+    """Numeric leaves keyed by path, with list entries named by language and length"""
+    if isinstance(value, dict):
+        items = {}
+        for key, item in value.items():
+            items.update(flatten(item, f"{prefix}.{key}" if prefix else key))
+        return items
+    if isinstance(value, list):
+        items = {}
+        for entry in value:
+            name = f"{prefix}[{entry.get('language')}/{entry.get('chars')}]"
+            items.update(flatten({k: v for k, v in entry.items() if k not in ("language", "chars")}, name))
+        return items
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: value}
+    return {}
+
+
+def compare(results: Dict[str, Any], baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = flatten(json.load(f)["results"])
+    current = flatten(results)
+
+    print(f"\nchange against {baseline_path}:")
+    for key, value in current.items():
+        before = baseline.get(key)
+        if before:
+            print(f"  {key:<48} {before:>10} -> {value:>10}  {(value - before) / before * 100:+7.1f}%")
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", choices=["fake", "xtts"], default="fake")
+    parser.add_argument("--fake-rtf", type=float, default=4.0, help="real-time factor of the fake model")
+    parser.add_argument("--suites", default="synthesis,clone,e2e,translation")
+    parser.add_argument("--languages", default="en,es,de,zh-cn")
+    parser.add_argument("--lengths", default="60,250,1000", help="text lengths in characters")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--jobs", type=int, default=24)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--e2e-chars", type=int, default=200)
+    parser.add_argument("--e2e-timeout", type=float, default=600.0)
+    parser.add_argument("--translation-seconds", type=float, default=60.0)
+    parser.add_argument("--output", default="bench_pipeline.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    port = free_port()
+    server = start_fake_server(port)
+
+    # The service reads its configuration when main is imported
+    store_dir = tempfile.mkdtemp(prefix="bench-pipeline-")
+    os.environ.update({
+        "SUPABASE_URL": f"http://127.0.0.1:{port}",
+        "SUPABASE_SERVICE_ROLE_KEY": "benchmark",
+        "JOB_STORE_PATH": os.path.join(store_dir, "jobs.db"),
+        "RESULT_CACHE_ENABLED": "false",
+        "MAX_QUEUE_SIZE": str(max(args.jobs, 100))
+    })
+    import main as service
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.model == "fake":
+        from benchmarks.fake_model import use_fake_model, use_fake_translation
+        use_fake_model(service.tts_engine, rtf=args.fake_rtf)
+        use_fake_translation(service.services.speech_translator)
+
+    started = time.perf_counter()
+    await service.services.initialize()
+    startup_ms = round((time.perf_counter() - started) * 1000, 1)
+    print(f"service ready in {startup_ms} ms ({args.model} model)")
+
+    suites = args.suites.split(",")
+    results: Dict[str, Any] = {"startup_ms": startup_ms}
+    try:
+        if "synthesis" in suites:
+            results["synthesis"] = await bench_synthesis(service.tts_engine, args)
+        if "clone" in suites:
+            results["clone"] = await bench_clone(service.tts_engine, args)
+        if "e2e" in suites:
+            results["e2e"] = await bench_e2e(service.app, args)
+        if "translation" in suites:
+            results["translation"] = await bench_translation(service, args)
+    finally:
+        await service.services.shutdown()
+        server.should_exit = True
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "revision": git_revision(),
+            "model": args.model,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args)
+        },
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
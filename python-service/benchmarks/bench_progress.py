@@ -0,0 +1,92 @@
+"""DB writes and job latency with direct vs coalesced progress updates.
+
+Simulated jobs report the same five states as JobProcessor (10%, 30%, 70%,
+90%, done) around a fixed amount of "synthesis" time. The direct mode awaits
+update_job_status for each state; the reporter mode queues them with
+ProgressReporter. Both run against the in-process fake Supabase server.
+
+    cd python-service
+    python benchmarks/bench_progress.py --jobs 100 --latency-ms 20 --work-ms 200
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from supabase_client import SupabaseClient
+from progress_reporter import ProgressReporter
+from benchmarks import fake_supabase
+from benchmarks.bench_supabase_io import start_fake_server, free_port
+
+STEPS = [
+    ("processing", 10, "Starting processing..."),
+    ("processing", 30, "Generating speech..."),
+    ("processing", 70, "Uploading audio..."),
+    ("processing", 90, "Finalizing...")
+]
+
+
+async def direct_job(client: SupabaseClient, job_id: str, work_ms: float):
+    for status, progress, message in STEPS:
+        await client.update_job_status(job_id, status, progress=progress, progress_message=message)
+        await asyncio.sleep(work_ms / len(STEPS) / 1000)
+    await client.update_job_status(job_id, "completed", progress=100, result_data={"audio_url": f"bench/{job_id}.wav"})
+
+
+async def reported_job(reporter: ProgressReporter, job_id: str, work_ms: float):
+    for status, progress, message in STEPS:
+        reporter.report(job_id, status, progress=progress, progress_message=message)
+        await asyncio.sleep(work_ms / len(STEPS) / 1000)
+    reporter.report(job_id, "completed", progress=100, result_data={"audio_url": f"bench/{job_id}.wav"})
+
+
+async def measure(label: str, jobs: int, run_job):
+    fake_supabase.stats["requests"] = 0
+    latencies = []
+
+    async def timed(i: int):
+        started = time.perf_counter()
+        await run_job(f"{label}-{i}")
+        latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(timed(i) for i in range(jobs)))
+    return latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="simulated DB latency")
+    parser.add_argument("--work-ms", type=float, default=200.0, help="simulated synthesis time per job")
+    parser.add_argument("--flush-interval", type=float, default=0.5)
+    args = parser.parse_args()
+
+    os.environ["FAKE_SUPABASE_LATENCY_MS"] = str(args.latency_ms)
+    logging.basicConfig(level=logging.WARNING)
+
+    port = free_port()
+    server = start_fake_server(port)
+    client = SupabaseClient(url=f"http://127.0.0.1:{port}", service_key="benchmark")
+    await client.initialize()
+    reporter = ProgressReporter(client, flush_interval=args.flush_interval)
+
+    try:
+        latencies = await measure("direct", args.jobs, lambda job_id: direct_job(client, job_id, args.work_ms))
+        writes = fake_supabase.stats["requests"]
+        print(f"{'direct':>9}: {writes / args.jobs:5.2f} DB writes/job  mean job latency {sum(latencies) / len(latencies) * 1000:7.1f} ms")
+
+        latencies = await measure("reported", args.jobs, lambda job_id: reported_job(reporter, job_id, args.work_ms))
+        await reporter.stop()
+        writes = fake_supabase.stats["requests"]
+        print(f"{'reporter':>9}: {writes / args.jobs:5.2f} DB writes/job  mean job latency {sum(latencies) / len(latencies) * 1000:7.1f} ms")
+    finally:
+        await client.close()
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+"""Streaming resumable upload vs encode-then-upload for a long Opus result.
+
+Starts ``fake_supabase`` in-process, generates minutes of audio one segment
+at a time and uploads it both ways: encoded in full and sent with one POST,
+and streamed through ``upload_audio_stream`` as it is encoded. A share of
+the resumable parts fails halfway through, so the streamed object only
+matches byte for byte if every part resumed from the right offset. Peak
+Python memory is reported for each path.
+
+    cd python-service
+    python benchmarks/bench_resumable_upload.py --minutes 10 --part-kb 256 --failure-rate 0.2
+"""
+import os
+import sys
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_utils import AudioFormat, StreamingEncoder, encode_audio
+from supabase_client import SupabaseClient
+from benchmarks import fake_supabase
+from benchmarks.bench_supabase_io import free_port, start_fake_server
+
+SAMPLE_RATE = 24000
+SEGMENT_SECONDS = 10
+
+
+def segment(i: int) -> np.ndarray:
+    t = np.arange(SEGMENT_SECONDS * SAMPLE_RATE, dtype=np.float32) / SAMPLE_RATE
+    return (0.3 * np.sin(2 * np.pi * (220 + 20 * (i % 12)) * t)).astype(np.float32)
+
+
+async def encoded_chunks(encoder: StreamingEncoder, segments: int, produced):
+    for i in range(segments):
+        data = encoder.write(segment(i))
+        produced.update(data)
+        yield data
+        await asyncio.sleep(0)
+    data = encoder.finish()
+    produced.update(data)
+    yield data
+
+
+async def measure(label: str, upload):
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = await upload()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:<18} {size / 1024:9.1f} KiB  {elapsed * 1000:8.1f} ms  peak memory {peak / 1024:9.1f} KiB")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=10.0)
+    parser.add_argument("--bitrate", type=int, default=32, help="Opus bitrate in kbps")
+    parser.add_argument("--part-kb", type=int, default=256)
+    parser.add_argument("--failure-rate", type=float, default=0.2, help="share of parts that fail halfway")
+    args = parser.parse_args()
+
+    os.environ["FAKE_SUPABASE_PART_FAILURE_RATE"] = str(args.failure_rate)
+    logging.basicConfig(level=logging.ERROR)
+
+    port = free_port()
+    server = start_fake_server(port)
+    client = SupabaseClient(url=f"http://127.0.0.1:{port}", service_key="benchmark")
+    await client.initialize()
+    client.upload_part_size = args.part_kb * 1024
+
+    audio_format = AudioFormat("opus", bitrate_kbps=args.bitrate)
+    segments = max(1, int(args.minutes * 60 / SEGMENT_SECONDS))
+
+    async def whole():
+        wav = np.concatenate([segment(i) for i in range(segments)])
+        audio = encode_audio(wav, SAMPLE_RATE, audio_format)
+        await client.upload_audio(audio.data, "bench/whole.opus", content_type=audio.content_type)
+        return audio.size_bytes
+
+    # Only a digest of the output is kept, so the check does not count against peak memory
+    produced = hashlib.sha256()
+
+    async def streamed():
+        encoder = StreamingEncoder(SAMPLE_RATE, audio_format)
+        await client.upload_audio_stream(
+            encoded_chunks(encoder, segments, produced), "bench/streamed.opus", encoder.content_type
+        )
+        return encoder.size_bytes
+
+    try:
+        await measure("encode + upload", whole)
+        await measure("streamed upload", streamed)
+
+        stored = fake_supabase.objects["audio-outputs/bench/streamed.opus"]
+        assert hashlib.sha256(stored).digest() == produced.digest(), "streamed object does not match the encoded output"
+        stats = fake_supabase.stats
+        print(f"{stats['parts']} parts sent, {stats['failed_parts']} failed and resumed; stored object matches")
+    finally:
+        await client.close()
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""Concurrent throughput of SupabaseClient against the local stand-in server.
+
+Starts ``fake_supabase`` in-process on a free port, then runs job status
+updates and audio uploads at increasing concurrency through one pooled
+client. With a simulated round-trip latency, throughput should scale with
+concurrency up to the connection pool size.
+
+    cd python-service
+    python benchmarks/bench_supabase_io.py --latency-ms 20 --operations 200
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import threading
+
+import uvicorn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from supabase_client import SupabaseClient
+
+
+def start_fake_server(port: int) -> uvicorn.Server:
+    from benchmarks.fake_supabase import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run(client: SupabaseClient, operations: int, concurrency: int, audio: bytes) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def operation(i: int):
+        async with semaphore:
+            if i % 4 == 0:
+                await client.upload_audio(audio, f"bench/{i}.wav")
+            else:
+                await client.update_job_status(f"job-{i}", "processing", progress=i % 100)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(operation(i) for i in range(operations)))
+    return operations / (time.perf_counter() - started)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="simulated server latency")
+    parser.add_argument("--operations", type=int, default=200)
+    parser.add_argument("--concurrency", default="1,4,16,32")
+    parser.add_argument("--audio-kb", type=int, default=256)
+    args = parser.parse_args()
+
+    os.environ["FAKE_SUPABASE_LATENCY_MS"] = str(args.latency_ms)
+    logging.basicConfig(level=logging.WARNING)
+
+    port = free_port()
+    server = start_fake_server(port)
+    client = SupabaseClient(url=f"http://127.0.0.1:{port}", service_key="benchmark")
+    await client.initialize()
+
+    audio = os.urandom(args.audio_kb * 1024)
+    try:
+        for concurrency in [int(v) for v in args.concurrency.split(",")]:
+            throughput = await run(client, args.operations, concurrency, audio)
+            print(f"concurrency {concurrency:>3}: {throughput:8.1f} ops/s")
+    finally:
+        await client.close()
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+"""Stand-in for the XTTS model, so benchmarks run on a CPU-only box offline.
+
+FakeXtts answers the calls TTSEngine makes on the real model: ``tts`` for
+the default voice, conditioning latents for cloning and ``inference`` with
+precomputed latents. Each call sleeps for the length of the audio divided
+by ``rtf``. Like torch kernels, the sleep releases the GIL. The call returns
+a tone about as long as XTTS would speak the text.
+
+    from benchmarks.fake_model import use_fake_model
+    use_fake_model(engine, rtf=4.0)
+    await engine.initialize()
+
+FakeTranscriber and FakeTranslator do the same for the Whisper and MarianMT
+models of speech translation (``use_fake_translation``).
+"""
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+
+SAMPLE_RATE = 24000
+
+# Roughly the speaking rate of XTTS voices
+SECONDS_PER_CHAR = 0.06
+
+
+class FakeXtts:
+    def __init__(self, rtf: float = 4.0, conditioning_seconds: float = 0.3):
+        self.rtf = rtf
+        self.conditioning_seconds = conditioning_seconds
+        self.config = SimpleNamespace(max_ref_len=30, gpt_cond_len=30, gpt_cond_chunk_len=4)
+
+    def _speak(self, text: str) -> np.ndarray:
+        duration = max(0.2, len(text) * SECONDS_PER_CHAR)
+        time.sleep(duration / self.rtf)
+        t = np.arange(int(duration * SAMPLE_RATE), dtype=np.float32) / SAMPLE_RATE
+        return (0.2 * np.sin(2 * np.pi * 180 * t)).astype(np.float32)
+
+    def tts(self, text: str, language: str = None, **kwargs) -> np.ndarray:
+        return self._speak(text)
+
+    def get_gpt_cond_latents(self, audio, sample_rate: int, length: int = 30, chunk_length: int = 4):
+        time.sleep(self.conditioning_seconds)
+        return torch.zeros(1, 32, 1024)
+
+    def get_speaker_embedding(self, audio, sample_rate: int):
+        return torch.zeros(1, 512, 1)
+
+    def inference(self, text: str, language: str, gpt_cond_latent, speaker_embedding, **kwargs):
+        return {"wav": self._speak(text)}
+
+
+class FakeTranscriber:
+    """Whisper stand-in: one word per half second of audio, batches cost their longest segment"""
+
+    model_name = "fake"
+
+    def __init__(self, rtf: float = 10.0, sample_rate: int = 16000):
+        self.rtf = rtf
+        self.sample_rate = sample_rate
+
+    def transcribe(self, audios, language=None):
+        longest = max(len(audio) for audio in audios) / self.sample_rate
+        time.sleep(longest / self.rtf)
+        texts = [
+            " ".join(["speech"] * max(1, int(len(audio) / self.sample_rate * 2))) + "."
+            for audio in audios
+        ]
+        return texts, language or "en"
+
+
+class FakeTranslator:
+    """MarianMT stand-in: tags the text with the target language"""
+
+    def __init__(self, seconds_per_text: float = 0.05):
+        self.seconds_per_text = seconds_per_text
+
+    def translate(self, texts, source: str, target: str):
+        time.sleep(self.seconds_per_text * len(texts))
+        return [f"[{target}] {text}" for text in texts]
+
+
+def use_fake_model(engine, rtf: float = 4.0, conditioning_seconds: float = 0.3):
+    """Make a TTSEngine load FakeXtts instead of downloading XTTS"""
+    engine._load_model = lambda spec=None: FakeXtts(rtf, conditioning_seconds)
+
+
+def use_fake_translation(speech_translator, asr_rtf: float = 10.0):
+    """Make a SpeechTranslator use FakeTranscriber and FakeTranslator"""
+    speech_translator.transcriber = FakeTranscriber(asr_rtf)
+    speech_translator.translator = FakeTranslator()
@@ -0,0 +1,161 @@
+"""Local stand-in for the parts of Supabase the service talks to.
+
+Implements the PostgREST calls on ``jobs`` and ``profiles``, object upload
+to Storage and resumable (TUS) uploads, keeping everything in memory. An
+optional per-request latency simulates a remote database, and
+FAKE_SUPABASE_PART_FAILURE_RATE makes that share of resumable parts fail
+halfway through, as a dropped connection would.
+
+    cd python-service
+    FAKE_SUPABASE_LATENCY_MS=20 uvicorn benchmarks.fake_supabase:app --port 54321
+    SUPABASE_URL=http://localhost:54321 SUPABASE_SERVICE_ROLE_KEY=test python main.py
+"""
+import os
+import uuid
+import base64
+import random
+import asyncio
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, HTTPException, Request, Response
+
+app = FastAPI(title="Fake Supabase")
+
+tables: Dict[str, Dict[str, Dict[str, Any]]] = {"jobs": {}, "profiles": {}}
+objects: Dict[str, bytes] = {}
+resumable: Dict[str, Dict[str, Any]] = {}
+stats = {"requests": 0, "writes": 0, "uploads": 0, "parts": 0, "failed_parts": 0}
+
+
+async def simulate_latency():
+    stats["requests"] += 1
+    latency_ms = float(os.getenv("FAKE_SUPABASE_LATENCY_MS", "0"))
+    if latency_ms:
+        await asyncio.sleep(latency_ms / 1000)
+
+
+def row_ids(request: Request) -> List[str]:
+    value = request.query_params.get("id", "")
+    if value.startswith("eq."):
+        return [value[3:]]
+    if value.startswith("in.(") and value.endswith(")"):
+        return value[4:-1].split(",")
+    raise HTTPException(status_code=400, detail="Only id=eq.<value> and id=in.(...) filters are supported")
+
+
+@app.get("/rest/v1/{table}")
+async def select_row(table: str, request: Request):
+    await simulate_latency()
+    row = tables.setdefault(table, {}).get(row_ids(request)[0])
+    if row is None:
+        raise HTTPException(status_code=406, detail="JSON object requested, multiple (or no) rows returned")
+    return row
+
+
+@app.patch("/rest/v1/{table}")
+async def update_rows(table: str, request: Request):
+    await simulate_latency()
+    values = await request.json()
+    for key in row_ids(request):
+        tables.setdefault(table, {}).setdefault(key, {"id": key}).update(values)
+    stats["writes"] += 1
+    return Response(status_code=204)
+
+
+@app.post("/storage/v1/object/{bucket}/{path:path}")
+async def upload_object(bucket: str, path: str, request: Request):
+    await simulate_latency()
+    objects[f"{bucket}/{path}"] = await request.body()
+    stats["uploads"] += 1
+    return {"Key": f"{bucket}/{path}"}
+
+
+def tus_metadata(value: str) -> Dict[str, str]:
+    metadata = {}
+    for item in filter(None, value.split(",")):
+        key, _, encoded = item.strip().partition(" ")
+        metadata[key] = base64.b64decode(encoded).decode("utf-8")
+    return metadata
+
+
+def tus_headers(upload: Dict[str, Any]) -> Dict[str, str]:
+    headers = {"Tus-Resumable": "1.0.0", "Upload-Offset": str(len(upload["data"]))}
+    if upload["length"] is not None:
+        headers["Upload-Length"] = str(upload["length"])
+    return headers
+
+
+def complete_if_done(upload: Dict[str, Any]):
+    if upload["length"] is not None and len(upload["data"]) == upload["length"]:
+        objects[upload["key"]] = bytes(upload["data"])
+        stats["uploads"] += 1
+
+
+@app.post("/storage/v1/upload/resumable")
+async def create_upload(request: Request):
+    await simulate_latency()
+    metadata = tus_metadata(request.headers.get("Upload-Metadata", ""))
+    length = request.headers.get("Upload-Length")
+    if length is None and request.headers.get("Upload-Defer-Length") != "1":
+        raise HTTPException(status_code=400, detail="Upload-Length or Upload-Defer-Length required")
+
+    upload_id = uuid.uuid4().hex
+    resumable[upload_id] = {
+        "key": f"{metadata['bucketName']}/{metadata['objectName']}",
+        "length": int(length) if length is not None else None,
+        "data": bytearray()
+    }
+    location = f"{str(request.base_url).rstrip('/')}/storage/v1/upload/resumable/{upload_id}"
+    return Response(status_code=201, headers={"Location": location, "Tus-Resumable": "1.0.0"})
+
+
+@app.head("/storage/v1/upload/resumable/{upload_id}")
+async def upload_offset(upload_id: str):
+    await simulate_latency()
+    upload = resumable.get(upload_id)
+    if upload is None:
+        raise HTTPException(status_code=404)
+    return Response(status_code=200, headers=tus_headers(upload))
+
+
+@app.patch("/storage/v1/upload/resumable/{upload_id}")
+async def upload_part(upload_id: str, request: Request):
+    await simulate_latency()
+    upload = resumable.get(upload_id)
+    if upload is None:
+        raise HTTPException(status_code=404)
+    if int(request.headers["Upload-Offset"]) != len(upload["data"]):
+        return Response(status_code=409, headers=tus_headers(upload))
+
+    body = await request.body()
+    stats["parts"] += 1
+    if body and random.random() < float(os.getenv("FAKE_SUPABASE_PART_FAILURE_RATE", "0")):
+        # Keep half the part, then fail as if the connection dropped
+        upload["data"] += body[:len(body) // 2]
+        stats["failed_parts"] += 1
+        return Response(status_code=503)
+
+    upload["data"] += body
+    if "Upload-Length" in request.headers:
+        upload["length"] = int(request.headers["Upload-Length"])
+    complete_if_done(upload)
+    return Response(status_code=204, headers=tus_headers(upload))
+
+
+@app.delete("/storage/v1/upload/resumable/{upload_id}")
+async def terminate_upload(upload_id: str):
+    resumable.pop(upload_id, None)
+    return Response(status_code=204)
+
+
+@app.get("/storage/v1/object/{bucket}/{path:path}")
+async def download_object(bucket: str, path: str):
+    data = objects.get(f"{bucket}/{path}")
+    if data is None:
+        raise HTTPException(status_code=404)
+    return Response(content=data)
+
+
+@app.get("/stats")
+async def get_stats():
+    return {**stats, "rows": {name: len(rows) for name, rows in tables.items()}, "objects": len(objects)}
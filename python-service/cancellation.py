@@ -0,0 +1,73 @@
+import time
+import asyncio
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class JobCancelled(Exception):
+    """A job was cancelled or ran past its deadline"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        # "cancelled" or "deadline"
+        self.reason = reason
+
+
+class CancelToken:
+    """Cancellation flag and optional deadline carried through one job
+
+    Long-running code calls ``check()`` between units of work (segments,
+    uploads) and wraps awaits in ``run()`` so a cancel or an expired deadline
+    stops waiting immediately.
+    """
+
+    def __init__(self, deadline: Optional[float] = None):
+        # Wall-clock (time.time) instant after which the job is abandoned
+        self.deadline = deadline
+        self.reason: Optional[str] = None
+        self._event = asyncio.Event()
+
+    def cancel(self, reason: str = "cancelled"):
+        if self.reason is None:
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if self.reason is None and self.deadline is not None and time.time() >= self.deadline:
+            self.cancel("deadline")
+        return self.reason is not None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds until the deadline, None without one"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.time())
+
+    def check(self):
+        """Raise JobCancelled if the job should stop"""
+        if self.cancelled:
+            raise JobCancelled(self.reason)
+
+    async def run(self, awaitable: Awaitable[T]) -> T:
+        """Await something, giving up as soon as the job is cancelled or expires"""
+        task = asyncio.ensure_future(awaitable)
+        if self.cancelled:
+            task.cancel()
+            raise JobCancelled(self.reason)
+
+        waiter = asyncio.ensure_future(self._event.wait())
+        try:
+            await asyncio.wait({task, waiter}, timeout=self.remaining(), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+            if not task.done():
+                # Abandoned or interrupted: stop the work instead of leaving it running
+                task.cancel()
+
+        if task.done() and not task.cancelled():
+            return task.result()
+
+        self.check()
+        raise JobCancelled(self.reason or "cancelled")
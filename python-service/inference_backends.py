@@ -0,0 +1,305 @@
+"""Selectable CPU inference backends for XTTS
+
+TTS_BACKEND picks how the loaded model is run:
+
+- ``reference``: the model as released, full precision
+- ``int8``: dynamic int8 quantization of every linear layer. GPT-2 stores
+  its projections as transformers' Conv1D, so those are first turned into
+  equivalent nn.Linear layers; otherwise most of the GPT would stay float.
+- ``compile``: the HiFi-GAN waveform decoder compiled with torch.compile
+- ``onnx``: the waveform decoder exported once to ONNX and run with ONNX
+  Runtime (optional dependency ``onnxruntime``)
+
+The autoregressive GPT keeps a growing key/value cache inside Hugging Face
+``generate``. That loop cannot be traced or exported as one graph, so
+``compile`` and ``onnx`` only cover the decoder.
+
+Unless TTS_BACKEND_PARITY=false, the backend is checked against the
+reference path on a fixed sentence with greedy decoding before it is used,
+and the engine falls back to the reference model when the outputs disagree.
+"""
+import os
+import copy
+import time
+import inspect
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("reference", "int8", "compile", "onnx")
+
+PARITY_TEXT = "The quick brown fox jumps over the lazy dog."
+
+# Submodules of the XTTS model each backend rewrites
+QUANTIZE_TARGETS = ("gpt", "hifigan_decoder")
+DECODER = "hifigan_decoder"
+
+
+def parity_metrics(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, float]:
+    """How closely a backend's waveform matches the reference one
+
+    ``snr_db`` compares samples over the common length and is only high when
+    both paths produced the same tokens. ``spectral_similarity`` is the cosine
+    similarity of the average log spectra, which tolerates small timing
+    differences but drops for noise, silence or a wrong voice.
+    """
+    common = min(len(reference), len(candidate))
+    if common == 0:
+        return {"duration_ratio": 0.0, "snr_db": 0.0, "spectral_similarity": 0.0}
+
+    error = np.sum((reference[:common] - candidate[:common]) ** 2)
+    signal = np.sum(reference[:common] ** 2)
+    snr_db = 100.0 if error == 0 else float(10 * np.log10(max(signal, 1e-12) / error))
+
+    def log_spectrum(wav: np.ndarray, frame: int = 1024, hop: int = 256) -> np.ndarray:
+        frames = max(1, 1 + (len(wav) - frame) // hop)
+        windows = np.stack([np.resize(wav[i * hop:i * hop + frame], frame) for i in range(frames)])
+        magnitude = np.abs(np.fft.rfft(windows * np.hanning(frame), axis=1))
+        return np.log(magnitude + 1e-5).mean(axis=0)
+
+    a, b = log_spectrum(reference), log_spectrum(candidate)
+    a, b = a - a.mean(), b - b.mean()
+    similarity = float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-12))
+
+    return {
+        "duration_ratio": round(len(candidate) / len(reference), 3),
+        "snr_db": round(min(snr_db, 100.0), 1),
+        "spectral_similarity": round(similarity, 4)
+    }
+
+
+def _linearize_conv1d(module) -> int:
+    """Replace transformers' Conv1D (a transposed linear layer) with nn.Linear in place"""
+    import torch
+
+    replaced = 0
+    for parent in list(module.modules()):
+        for name, child in list(parent.named_children()):
+            if type(child).__name__ != "Conv1D" or not hasattr(child, "nf"):
+                continue
+            in_features, out_features = child.weight.shape
+            linear = torch.nn.Linear(in_features, out_features, bias=child.bias is not None)
+            linear.weight.data = child.weight.data.t().contiguous()
+            if child.bias is not None:
+                linear.bias.data = child.bias.data
+            setattr(parent, name, linear)
+            replaced += 1
+    return replaced
+
+
+def _apply_int8(xtts, device: str, **kwargs) -> Tuple[Callable[[], None], Dict[str, Any]]:
+    import torch
+
+    if device != "cpu":
+        raise ValueError("int8 dynamic quantization only runs on cpu")
+
+    originals = {}
+    info = {"linearized": 0, "quantized_layers": 0}
+    for name in QUANTIZE_TARGETS:
+        module = getattr(xtts, name, None)
+        if module is None:
+            continue
+        # Quantize a copy so the reference stays intact until parity passes
+        quantized = copy.deepcopy(module)
+        info["linearized"] += _linearize_conv1d(quantized)
+        info["quantized_layers"] += sum(isinstance(m, torch.nn.Linear) for m in quantized.modules())
+        torch.ao.quantization.quantize_dynamic(quantized, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        originals[name] = module
+        setattr(xtts, name, quantized)
+
+    def restore():
+        for name, module in originals.items():
+            setattr(xtts, name, module)
+
+    return restore, info
+
+
+def _apply_compile(xtts, device: str, **kwargs) -> Tuple[Callable[[], None], Dict[str, Any]]:
+    import torch
+
+    original = getattr(xtts, DECODER)
+    setattr(xtts, DECODER, torch.compile(original, dynamic=True))
+    return lambda: setattr(xtts, DECODER, original), {"compiled": DECODER}
+
+
+def _onnx_decoder(path: Path, with_speaker: bool):
+    """Module running an exported waveform decoder with ONNX Runtime, called like the original"""
+    import torch
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = torch.get_num_threads()
+    session = onnxruntime.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+
+    # A Module, because XTTS only accepts modules as its decoder attribute
+    class OnnxDecoder(torch.nn.Module):
+        def forward(self, latents, g=None):
+            feeds = {"latents": latents.detach().cpu().float().numpy()}
+            if with_speaker:
+                feeds["g"] = g.detach().cpu().float().numpy()
+            return torch.from_numpy(session.run(None, feeds)[0])
+
+    return OnnxDecoder()
+
+
+def _export_decoder(decoder, example: Dict[str, Any], path: Path):
+    """Export the waveform decoder with the frame axis left dynamic"""
+    import torch
+
+    # Clone outside inference mode: the captured tensors are inference tensors
+    latents = example["latents"].clone()
+    g = example["g"].clone() if example["g"] is not None else None
+
+    class Export(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.decoder = decoder
+
+        def forward(self, latents, g=None):
+            return self.decoder(latents, g=g)
+
+    inputs = (latents,) if g is None else (latents, g)
+    names = ["latents"] if g is None else ["latents", "g"]
+    output_axes = {axis: f"wav_{axis}" for axis in range(example["output_dims"])}
+
+    # Newer torch defaults to the dynamo exporter; the TorchScript one handles this model as is
+    options = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+
+    tmp_path = path.with_suffix(".tmp")
+    with torch.no_grad():
+        torch.onnx.export(
+            Export().eval(),
+            inputs,
+            str(tmp_path),
+            input_names=names,
+            output_names=["wav"],
+            dynamic_axes={"latents": {1: "frames"}, "wav": output_axes},
+            opset_version=17,
+            **options
+        )
+    os.replace(tmp_path, path)
+
+
+def _apply_onnx(xtts, device: str, example: Optional[Dict[str, Any]] = None,
+                cache_dir: Optional[Path] = None, **kwargs) -> Tuple[Callable[[], None], Dict[str, Any]]:
+    if device != "cpu":
+        raise ValueError("the onnx backend runs the decoder on cpu only")
+
+    original = getattr(xtts, DECODER)
+    cache_dir = Path(cache_dir or ".")
+    checkpoint = cache_dir / "model.pth"
+    # Keyed by the checkpoint so replaced weights never reuse a stale export
+    stamp = f"{checkpoint.stat().st_size}-{int(checkpoint.stat().st_mtime)}" if checkpoint.exists() else "local"
+    path = cache_dir / f"{DECODER}-{stamp}.onnx"
+
+    info = {"path": str(path), "exported": False}
+    if not path.exists():
+        if example is None:
+            raise ValueError("exporting the decoder needs an example input from a reference run")
+        started = time.perf_counter()
+        _export_decoder(original, example, path)
+        info["exported"] = True
+        info["export_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    with_speaker = example["g"] is not None if example else True
+    setattr(xtts, DECODER, _onnx_decoder(path, with_speaker))
+    return lambda: setattr(xtts, DECODER, original), info
+
+
+APPLY = {
+    "int8": _apply_int8,
+    "compile": _apply_compile,
+    "onnx": _apply_onnx
+}
+
+
+def _render(xtts, latents, language: str = "en", capture: Optional[Dict[str, Any]] = None) -> np.ndarray:
+    """Deterministic synthesis of PARITY_TEXT, optionally recording the decoder input"""
+    import torch
+
+    handles = []
+    decoder = getattr(xtts, DECODER, None)
+    if capture is not None and isinstance(decoder, torch.nn.Module):
+        def before(module, args, kwargs):
+            capture["latents"] = args[0].detach().clone()
+            g = kwargs.get("g", args[1] if len(args) > 1 else None)
+            capture["g"] = g.detach().clone() if g is not None else None
+
+        def after(module, args, output):
+            capture["output_dims"] = output.dim()
+
+        handles.append(decoder.register_forward_pre_hook(before, with_kwargs=True))
+        handles.append(decoder.register_forward_hook(after))
+
+    try:
+        torch.manual_seed(0)
+        with torch.inference_mode():
+            output = xtts.inference(PARITY_TEXT, language, *latents, do_sample=False)
+    finally:
+        for handle in handles:
+            handle.remove()
+
+    wav = output["wav"]
+    if isinstance(wav, torch.Tensor):
+        wav = wav.cpu().numpy()
+    return np.asarray(wav, dtype=np.float32).reshape(-1)
+
+
+def apply_backend(xtts, backend: str, device: str, latents, cache_dir: Optional[Path] = None) -> Dict[str, Any]:
+    """Switch a loaded XTTS model to ``backend``, checking parity first (blocking)
+
+    ``latents`` are speaker latents for the parity sentence. Returns what was
+    done, including the parity metrics and the backend finally in use.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown TTS_BACKEND {backend}; choose one of {', '.join(BACKENDS)}")
+
+    info: Dict[str, Any] = {"requested": backend, "active": "reference"}
+    if backend == "reference":
+        return info
+
+    check = os.getenv("TTS_BACKEND_PARITY", "true").lower() == "true"
+    min_similarity = float(os.getenv("TTS_BACKEND_MIN_SIMILARITY", "0.95"))
+
+    try:
+        example: Dict[str, Any] = {}
+        reference = None
+        if check or backend == "onnx":
+            started = time.perf_counter()
+            reference = _render(xtts, latents, capture=example)
+            info["reference_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+        restore, details = APPLY[backend](xtts, device, example=example or None, cache_dir=cache_dir)
+        info.update(details)
+    except Exception as e:
+        logger.error(f"Could not enable the {backend} backend, using the reference model: {str(e)}")
+        info["error"] = str(e)
+        return info
+
+    if check:
+        try:
+            started = time.perf_counter()
+            candidate = _render(xtts, latents)
+            info["backend_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            info["parity"] = parity_metrics(reference, candidate)
+        except Exception as e:
+            info["parity"] = {"error": str(e)}
+
+        parity = info["parity"]
+        passed = (
+            "error" not in parity
+            and 0.85 <= parity["duration_ratio"] <= 1.15
+            and parity["spectral_similarity"] >= min_similarity
+        )
+        if not passed:
+            restore()
+            logger.error(f"The {backend} backend failed the parity check, using the reference model: {parity}")
+            return info
+
+    info["active"] = backend
+    logger.info(f"Inference backend {backend} enabled: {info}")
+    return info
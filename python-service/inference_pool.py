@@ -0,0 +1,43 @@
+import os
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+class InferencePool:
+    """Runs blocking model calls on dedicated worker threads, off the event loop"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or int(os.getenv("INFERENCE_WORKERS", "1"))
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="inference"
+        )
+        self.active = 0
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a blocking callable in the pool and await its result"""
+        loop = asyncio.get_running_loop()
+        self.active += 1
+        try:
+            return await loop.run_in_executor(
+                self.executor,
+                functools.partial(func, *args, **kwargs)
+            )
+        finally:
+            self.active -= 1
+
+    def stats(self) -> dict:
+        """Current pool utilisation"""
+        return {
+            "workers": self.max_workers,
+            "active": self.active
+        }
+
+    def shutdown(self):
+        """Stop the worker threads"""
+        logger.info("Shutting down inference pool")
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -1,27 +1,76 @@
+import os
+import time
 import asyncio
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Union
 from datetime import datetime
+from dataclasses import asdict
 import uuid
 import base64
 
 from tts_engine import TTSEngine
-from supabase_client import SupabaseClient
+from supabase_client import SupabaseClient, TransientSupabaseError
+from job_scheduler import JobFailedError, RetryableJobError
+from cancellation import CancelToken, JobCancelled
+from audio_utils import AudioFormat, EncodedAudio, StreamingEncoder, STREAMABLE_CODECS
+from audio_effects import AudioEffects
+from result_cache import SynthesisResultCache
+from model_registry import DEFAULT_MODEL
+from speech_translation import SpeechTranslator
+from progress_reporter import ProgressReporter
+import metrics
 
 logger = logging.getLogger(__name__)
 
 class JobProcessor:
-    def __init__(self):
-        self.tts_engine = TTSEngine()
-        self.supabase_client = SupabaseClient()
+    def __init__(
+        self,
+        tts_engine: TTSEngine,
+        supabase_client: SupabaseClient,
+        result_cache: Optional[SynthesisResultCache] = None,
+        progress_reporter: Optional[ProgressReporter] = None,
+        speech_translator: Optional[SpeechTranslator] = None
+    ):
+        # Shared instances owned by the service container
+        self.tts_engine = tts_engine
+        self.supabase_client = supabase_client
+        self.result_cache = result_cache
+        # Status updates are queued and written in batches off the hot path
+        self.progress_reporter = progress_reporter or ProgressReporter(supabase_client)
+        # ASR and translation models load on the first translation job
+        self.speech_translator = speech_translator or SpeechTranslator()
+        # Long texts in an append-only codec are uploaded while they are synthesized
+        self.streaming_upload_min_chars = int(os.getenv("STREAMING_UPLOAD_MIN_CHARS", "2000"))
         
-    async def process_job(self, job_id: str, job_type: str, input_data: Dict[str, Any], user_id: str):
-        """Process a job based on its type"""
+    async def process_job(
+        self,
+        job_id: str,
+        job_type: str,
+        input_data: Dict[str, Any],
+        user_id: str,
+        final_attempt: bool = True,
+        cancel_token: Optional[CancelToken] = None
+    ):
+        """Process a job based on its type
+
+        Transient Supabase failures raise RetryableJobError so the scheduler
+        runs the job again, unless this is its final attempt. A cancelled or
+        expired ``cancel_token`` stops the job between steps and raises
+        JobCancelled once the final status is reported. Any other failure is
+        reported as failed and raises JobFailedError, so the scheduler marks
+        the job dead instead of done.
+        """
+        cancel_token = cancel_token or CancelToken()
+        started = time.perf_counter()
+        # Left as is only when shutdown interrupts the job
+        outcome = "interrupted"
+        audio_ms = None
+        failure = None
         try:
             logger.info(f"Starting job processing: {job_id} ({job_type})")
             
             # Update job status to processing
-            await self.supabase_client.update_job_status(
+            self.progress_reporter.report(
                 job_id, 
                 "processing", 
                 progress=10,
@@ -30,16 +79,16 @@ class JobProcessor:
             
             # Route to appropriate processor
             if job_type == "text_to_speech":
-                result = await self._process_tts_job(job_id, input_data, user_id)
+                result = await self._process_tts_job(job_id, input_data, user_id, cancel_token)
             elif job_type == "voice_clone":
-                result = await self._process_voice_clone_job(job_id, input_data, user_id)
+                result = await self._process_voice_clone_job(job_id, input_data, user_id, cancel_token)
             elif job_type == "speech_translation":
-                result = await self._process_translation_job(job_id, input_data, user_id)
+                result = await self._process_translation_job(job_id, input_data, user_id, cancel_token)
             else:
                 raise ValueError(f"Unknown job type: {job_type}")
             
             # Update job as completed
-            await self.supabase_client.update_job_status(
+            self.progress_reporter.report(
                 job_id,
                 "completed",
                 progress=100,
@@ -48,12 +97,63 @@ class JobProcessor:
             )
             
             logger.info(f"Job {job_id} completed successfully")
+            outcome = "completed"
+            if not result.get("cached"):
+                audio_ms = result.get("duration_ms")
             
+        except JobCancelled as e:
+            outcome = "expired" if e.reason == "deadline" else "cancelled"
+            if e.reason == "deadline":
+                self.progress_reporter.report(
+                    job_id,
+                    "failed",
+                    progress=0,
+                    progress_message="Processing stopped: deadline exceeded",
+                    error_code="DEADLINE_EXCEEDED",
+                    error_message="Job did not finish before its deadline"
+                )
+            else:
+                self.progress_reporter.report(
+                    job_id,
+                    "cancelled",
+                    progress_message="Processing cancelled"
+                )
+            await self.progress_reporter.flush()
+            raise
+
+        except TransientSupabaseError as e:
+            if not final_attempt:
+                outcome = "retried"
+                logger.warning(f"Job {job_id} hit a temporary error: {str(e)}")
+                self.progress_reporter.report(
+                    job_id,
+                    "pending",
+                    progress=0,
+                    progress_message="Temporary error, retrying...",
+                    error_code="TEMPORARY_ERROR",
+                    error_message=str(e)
+                )
+                raise RetryableJobError(str(e)) from e
+
+            outcome = "failed"
+            failure = str(e)
+            logger.error(f"Job {job_id} failed after retries: {str(e)}")
+            self.progress_reporter.report(
+                job_id,
+                "failed",
+                progress=0,
+                progress_message=f"Processing failed: {str(e)}",
+                error_code="MAX_RETRIES_EXCEEDED",
+                error_message=str(e)
+            )
+
         except Exception as e:
+            outcome = "failed"
+            failure = str(e)
             logger.error(f"Job {job_id} failed: {str(e)}")
             
             # Update job as failed
-            await self.supabase_client.update_job_status(
+            self.progress_reporter.report(
                 job_id,
                 "failed",
                 progress=0,
@@ -61,8 +161,46 @@ class JobProcessor:
                 error_code="PROCESSING_ERROR",
                 error_message=str(e)
             )
+
+        finally:
+            metrics.record_job(job_type, outcome, time.perf_counter() - started, audio_ms)
+
+        # The job leaves the durable queue when this returns, so deliver its final state first
+        await self.progress_reporter.flush()
+        if failure is not None:
+            raise JobFailedError(failure)
+
+    def drop_job(self, job_id: str, status: str, error_code: str, reason: str):
+        """Report the final state of a job the scheduler removed without running it to the end"""
+        self.progress_reporter.report(
+            job_id,
+            status,
+            progress=0,
+            progress_message=reason,
+            error_code=error_code,
+            error_message=reason
+        )
     
-    async def _process_tts_job(self, job_id: str, input_data: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+    @staticmethod
+    def _audio_info(audio: Union[EncodedAudio, StreamingEncoder], audio_format: AudioFormat) -> Dict[str, Any]:
+        """Result fields describing an encoded output file (or a finished streaming encoder)"""
+        return {
+            "duration_ms": audio.duration_ms,
+            "size_bytes": audio.size_bytes,
+            "format": audio_format.codec,
+            "content_type": audio.content_type,
+            "sample_rate": audio.sample_rate,
+            # Average over the whole file, container overhead included
+            "bitrate_kbps": round(audio.size_bytes * 8 / audio.duration_ms, 1) if audio.duration_ms else None
+        }
+
+    async def _process_tts_job(
+        self,
+        job_id: str,
+        input_data: Dict[str, Any],
+        user_id: str,
+        cancel_token: CancelToken
+    ) -> Dict[str, Any]:
         """Process text-to-speech job"""
         try:
             text = input_data.get("text", "")
@@ -74,50 +212,115 @@ class JobProcessor:
             
             if not text:
                 raise ValueError("No text provided for TTS")
+
+            # Fails fast on an unknown model name
+            model = self.tts_engine.models.resolve(input_data.get("model"), language)
+
+            audio_format = AudioFormat.from_input(input_data)
+            effects = AudioEffects.from_input(input_data)
+            
+            # Reuse the stored output of an identical earlier request
+            cache_key = None
+            if self.result_cache:
+                cache_key = self.result_cache.key_for(
+                    self.tts_engine._prepare_text(text),
+                    voice_id,
+                    language,
+                    emotion,
+                    speed,
+                    pitch,
+                    user_id=user_id,
+                    output=asdict(audio_format),
+                    model=model if model != DEFAULT_MODEL else None,
+                    effects=None if effects.is_identity else asdict(effects)
+                )
+                cached = self.result_cache.get(cache_key)
+                if cached:
+                    logger.info(f"Job {job_id} served from result cache")
+                    return {
+                        **cached,
+                        "text": text,
+                        "voice_id": voice_id,
+                        "language": language,
+                        "cached": True
+                    }
             
             # Update progress
-            await self.supabase_client.update_job_status(
+            self.progress_reporter.report(
                 job_id, 
                 "processing", 
                 progress=30,
                 progress_message="Generating speech..."
             )
             
-            # Generate speech
-            audio_data = await self.tts_engine.synthesize_speech(
-                text=text,
-                voice_id=voice_id,
-                language=language,
-                emotion=emotion,
-                speed=speed,
-                pitch=pitch
-            )
-            
-            # Update progress
-            await self.supabase_client.update_job_status(
-                job_id, 
-                "processing", 
-                progress=70,
-                progress_message="Uploading audio..."
-            )
-            
-            # Upload to storage
-            audio_url = await self.supabase_client.upload_audio(
-                audio_data, 
-                f"{user_id}/{job_id}.wav"
-            )
+            if audio_format.codec in STREAMABLE_CODECS and len(text) >= self.streaming_upload_min_chars:
+                # Parts go up while later segments are still being synthesized
+                audio = StreamingEncoder(self.tts_engine.sample_rate, audio_format)
+                audio_url = await self.supabase_client.upload_audio_stream(
+                    self.tts_engine.synthesize_encoded_stream(
+                        text,
+                        audio,
+                        voice_id=voice_id,
+                        language=language,
+                        emotion=emotion,
+                        speed=speed,
+                        pitch=pitch,
+                        cancel_token=cancel_token,
+                        model=model,
+                        effects=effects
+                    ),
+                    f"{user_id}/{job_id}.{audio.extension}",
+                    content_type=audio.content_type
+                )
+            else:
+                # Generate speech
+                audio = await self.tts_engine.synthesize_speech(
+                    text=text,
+                    voice_id=voice_id,
+                    language=language,
+                    emotion=emotion,
+                    speed=speed,
+                    pitch=pitch,
+                    cancel_token=cancel_token,
+                    audio_format=audio_format,
+                    model=model,
+                    effects=effects
+                )
+
+                # Update progress
+                self.progress_reporter.report(
+                    job_id,
+                    "processing",
+                    progress=70,
+                    progress_message="Uploading audio..."
+                )
+
+                # Upload to storage
+                cancel_token.check()
+                audio_url = await self.supabase_client.upload_audio(
+                    audio.data,
+                    f"{user_id}/{job_id}.{audio.extension}",
+                    content_type=audio.content_type
+                )
             
             # Update progress
-            await self.supabase_client.update_job_status(
+            self.progress_reporter.report(
                 job_id, 
                 "processing", 
                 progress=90,
                 progress_message="Finalizing..."
             )
             
+            audio_info = self._audio_info(audio, audio_format)
+            if cache_key:
+                self.result_cache.put(cache_key, {
+                    "audio_url": audio_url,
+                    **audio_info
+                })
+            
             return {
                 "audio_url": audio_url,
-                "duration_ms": len(audio_data) // 48,  # Rough estimate
+                **audio_info,
                 "text": text,
                 "voice_id": voice_id,
                 "language": language
@@ -127,7 +330,13 @@ class JobProcessor:
             logger.error(f"TTS job processing failed: {str(e)}")
             raise
     
-    async def _process_voice_clone_job(self, job_id: str, input_data: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+    async def _process_voice_clone_job(
+        self,
+        job_id: str,
+        input_data: Dict[str, Any],
+        user_id: str,
+        cancel_token: CancelToken
+    ) -> Dict[str, Any]:
         """Process voice cloning job"""
         try:
             text = input_data.get("text", "")
@@ -136,11 +345,14 @@ class JobProcessor:
             if not text or not audio_sample:
                 raise ValueError("Text and audio sample required for voice cloning")
             
+            audio_format = AudioFormat.from_input(input_data)
+            effects = AudioEffects.from_input(input_data)
+
             # Decode audio sample
             audio_bytes = base64.b64decode(audio_sample)
             
             # Update progress
-            await self.supabase_client.update_job_status(
+            self.progress_reporter.report(
                 job_id, 
                 "processing", 
                 progress=40,
@@ -148,10 +360,18 @@ class JobProcessor:
             )
             
             # Clone voice
-            cloned_audio = await self.tts_engine.clone_voice(audio_bytes, text)
+            cloned_audio = await self.tts_engine.clone_voice(
+                audio_bytes,
+                text,
+                language=input_data.get("language", "en"),
+                cancel_token=cancel_token,
+                audio_format=audio_format,
+                model=input_data.get("model"),
+                effects=effects
+            )
             
             # Update progress
-            await self.supabase_client.update_job_status(
+            self.progress_reporter.report(
                 job_id, 
                 "processing", 
                 progress=80,
@@ -159,57 +379,110 @@ class JobProcessor:
             )
             
             # Upload result
+            cancel_token.check()
             audio_url = await self.supabase_client.upload_audio(
-                cloned_audio, 
-                f"{user_id}/cloned/{job_id}.wav"
+                cloned_audio.data, 
+                f"{user_id}/cloned/{job_id}.{cloned_audio.extension}",
+                content_type=cloned_audio.content_type
             )
             
             return {
                 "audio_url": audio_url,
-                "duration_ms": len(cloned_audio) // 48,
+                **self._audio_info(cloned_audio, audio_format),
                 "text": text,
-                "voice_type": "cloned"
+                "voice_type": "cloned",
+                "voice_id": self.tts_engine.voice_id_for(audio_bytes),
+                # False when SPEAKER_CACHE_DIR is disabled: the voice ID lasts until eviction or restart
+                "voice_persistent": self.tts_engine.speaker_cache.cache_dir is not None
             }
             
         except Exception as e:
             logger.error(f"Voice clone job processing failed: {str(e)}")
             raise
     
-    async def _process_translation_job(self, job_id: str, input_data: Dict[str, Any], user_id: str) -> Dict[str, Any]:
-        """Process speech translation job"""
+    async def _process_translation_job(
+        self,
+        job_id: str,
+        input_data: Dict[str, Any],
+        user_id: str,
+        cancel_token: CancelToken
+    ) -> Dict[str, Any]:
+        """Process speech translation job
+
+        ``audio_sample`` (base64) is transcribed, translated into
+        ``target_language`` and spoken with ``voice_id``. ``source_language``
+        is detected when not given.
+        """
         try:
-            # Placeholder for speech translation
-            # This would integrate with Whisper for transcription and translation
-            
-            await self.supabase_client.update_job_status(
+            audio_sample = input_data.get("audio_sample")  # Base64 encoded
+            target_language = input_data.get("target_language", "en")
+            voice_id = input_data.get("voice_id", "default")
+
+            if not audio_sample:
+                raise ValueError("Audio sample required for speech translation")
+
+            audio_format = AudioFormat.from_input(input_data)
+            effects = AudioEffects.from_input(input_data)
+            audio_bytes = base64.b64decode(audio_sample)
+
+            self.progress_reporter.report(
                 job_id, 
                 "processing", 
-                progress=50,
+                progress=20,
                 progress_message="Transcribing audio..."
             )
-            
-            # TODO: Implement Whisper integration
-            original_text = "Placeholder transcription"
-            translated_text = "Placeholder translation"
-            
-            # Generate TTS for translated text
-            audio_data = await self.tts_engine.synthesize_speech(
-                text=translated_text,
-                language=input_data.get("target_language", "en")
+
+            def report(done: int, total: int):
+                self.progress_reporter.report(
+                    job_id,
+                    "processing",
+                    progress=20 + int(60 * done / total),
+                    progress_message=f"Translated {done} of {total} segments..."
+                )
+
+            translation = await self.speech_translator.translate(
+                audio_bytes,
+                target_language,
+                lambda text: self.tts_engine.synthesize_waveform(
+                    text, target_language, voice_id=voice_id, cancel_token=cancel_token
+                ),
+                self.tts_engine.sample_rate,
+                source_language=input_data.get("source_language"),
+                cancel_token=cancel_token,
+                on_progress=report
+            )
+            if not translation.translated_text:
+                raise ValueError("No speech found in the audio sample")
+
+            audio = await self.tts_engine.inference_pool.run(
+                self.tts_engine.encode_output, translation.waveform, effects, audio_format
             )
             
             # Upload result
+            cancel_token.check()
             audio_url = await self.supabase_client.upload_audio(
-                audio_data, 
-                f"{user_id}/translated/{job_id}.wav"
+                audio.data, 
+                f"{user_id}/translated/{job_id}.{audio.extension}",
+                content_type=audio.content_type
             )
             
             return {
-                "original_text": original_text,
-                "translated_text": translated_text,
+                "original_text": translation.original_text,
+                "translated_text": translation.translated_text,
                 "audio_url": audio_url,
-                "source_language": "auto",
-                "target_language": input_data.get("target_language", "en")
+                **self._audio_info(audio, audio_format),
+                "source_language": translation.source_language or "auto",
+                "target_language": target_language,
+                "segments": [
+                    {
+                        "start": round(segment.start, 2),
+                        "end": round(segment.end, 2),
+                        "text": segment.text,
+                        "translation": segment.translation
+                    }
+                    for segment in translation.segments
+                ],
+                "timings": translation.timings
             }
             
         except Exception as e:
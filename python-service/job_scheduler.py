@@ -0,0 +1,450 @@
+import os
+import time
+import asyncio
+import logging
+import random
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from job_store import JobStore
+from cancellation import CancelToken, JobCancelled
+import metrics
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[..., Awaitable[None]]
+
+# How often the dispatcher wakes up to renew leases and requeue expired ones
+MAINTENANCE_INTERVAL_SECONDS = 1.0
+
+# Heartbeats a live process gets to renew its leases after another process starts
+STARTUP_LEASE_HEARTBEATS = 3
+
+
+class QueueFullError(Exception):
+    """Raised when the scheduler cannot admit another job"""
+
+
+class RetryableJobError(Exception):
+    """Raised by a job handler when the job failed transiently and should run again"""
+
+
+class JobFailedError(Exception):
+    """Raised by a job handler when the job failed for good and its status was reported"""
+
+
+@dataclass
+class ScheduledJob:
+    job_id: str
+    job_type: str
+    input_data: Dict[str, Any]
+    user_id: str
+    priority: int = 0
+    attempts: int = 0
+    # Wall-clock time the job became runnable (submission or retry)
+    available_at: float = field(default_factory=time.time)
+    # Wall-clock time after which the job is dropped, None for no deadline
+    deadline_at: Optional[float] = None
+
+
+def parse_type_limits(value: Optional[str]) -> Dict[str, int]:
+    """Parse "voice_clone=1,speech_translation=1" into a limits dict"""
+    limits = {}
+    if not value:
+        return limits
+
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        job_type, limit = item.split("=", 1)
+        limits[job_type.strip()] = int(limit)
+
+    return limits
+
+
+class JobScheduler:
+    """Durable priority queue feeding a fixed number of concurrent job slots
+
+    Jobs live in a JobStore, so queued jobs survive a restart and jobs that
+    were running when the process died are picked up again once their lease
+    expires (at-least-once delivery). Starting cuts running jobs' leases to a
+    few heartbeats, so a restart recovers them within seconds rather than a
+    full visibility timeout. The handler is called with
+    ``final_attempt`` and a ``cancel_token``; raising RetryableJobError requeues
+    the job with exponential backoff until ``max_attempts`` is reached, raising
+    JobFailedError marks it dead, raising JobCancelled marks it cancelled, or dead when its deadline passed.
+    """
+
+    def __init__(
+        self,
+        handler: JobHandler,
+        max_queue_size: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        type_limits: Optional[Dict[str, int]] = None,
+        store: Optional[JobStore] = None,
+        max_attempts: Optional[int] = None,
+        retry_base_delay: Optional[float] = None,
+        visibility_timeout: Optional[float] = None,
+        on_dropped: Optional[Callable[[str, str, str, str], None]] = None,
+        on_finished: Optional[Callable[[str], None]] = None
+    ):
+        self.handler = handler
+        self.max_queue_size = max_queue_size or int(os.getenv("MAX_QUEUE_SIZE", "100"))
+        self.max_concurrency = max_concurrency or int(os.getenv("JOB_CONCURRENCY", "2"))
+        self.type_limits = type_limits if type_limits is not None else parse_type_limits(os.getenv("JOB_TYPE_LIMITS"))
+        self.store = store or JobStore()
+        self.max_attempts = max_attempts or int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+        self.retry_base_delay = retry_base_delay if retry_base_delay is not None else float(os.getenv("JOB_RETRY_BASE_DELAY", "5"))
+        self.visibility_timeout = visibility_timeout or float(os.getenv("JOB_VISIBILITY_TIMEOUT", "60"))
+        self.heartbeat_interval = min(MAINTENANCE_INTERVAL_SECONDS, self.visibility_timeout / 3)
+        self.retention_seconds = float(os.getenv("JOB_STORE_RETENTION_HOURS", "24")) * 3600
+        # Applied to jobs submitted without a deadline; 0 means none
+        self.default_timeout = float(os.getenv("JOB_DEFAULT_TIMEOUT_SECONDS", "0"))
+        # Called with (job_id, status, error_code, reason) for jobs removed without their handler reporting them
+        self.on_dropped = on_dropped
+        # Called with the job_id once a job reached a final state in the store
+        self.on_finished = on_finished
+
+        self._running: Dict[str, int] = {}
+        self._leased: Dict[str, ScheduledJob] = {}
+        self._tokens: Dict[str, CancelToken] = {}
+        self._active = 0
+        self._condition: Optional[asyncio.Condition] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._tasks = set()
+        self._next_heartbeat = 0.0
+        self._next_prune = 0.0
+
+        # Metrics
+        self._wait_times = deque(maxlen=1000)
+        self._counters = {
+            "submitted": 0,
+            "rejected": 0,
+            "completed": 0,
+            "failed": 0,
+            "retried": 0,
+            "recovered": 0,
+            "abandoned": 0,
+            "cancelled": 0,
+            "expired": 0
+        }
+
+    async def start(self):
+        """Open the store, recover orphaned jobs and start dispatching"""
+        if self._dispatcher is None:
+            self._stopping = False
+            self.store.open()
+            # Running rows belong to a crashed predecessor or to a live process sharing
+            # the store; only the live one renews them before the short lease runs out
+            shortened = self.store.shorten_leases(
+                time.time() + STARTUP_LEASE_HEARTBEATS * self.heartbeat_interval
+            )
+            if shortened:
+                logger.info(f"{shortened} jobs left running by an earlier process will be recovered shortly")
+            self._condition = asyncio.Condition()
+            self._dispatcher = asyncio.create_task(self._dispatch_loop())
+            logger.info(
+                f"Job scheduler started: queue={self.max_queue_size}, "
+                f"concurrency={self.max_concurrency}, limits={self.type_limits}, "
+                f"{self.store.count()} jobs queued"
+            )
+
+    async def stop(self):
+        """Stop dispatching and hand running jobs back to the queue"""
+        if self._dispatcher:
+            # A flag rather than cancel(): wait_for can swallow a cancellation that races a notify
+            self._stopping = True
+            async with self._condition:
+                self._condition.notify_all()
+            await self._dispatcher
+            self._dispatcher = None
+
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Interrupted jobs run again after the restart without losing an attempt
+        self.store.release(list(self._leased), time.time())
+        self._leased.clear()
+        logger.info(f"Job scheduler stopped with {self.store.count()} jobs still queued")
+        self.store.close()
+
+    async def submit(
+        self,
+        job_id: str,
+        job_type: str,
+        input_data: Dict[str, Any],
+        user_id: str,
+        priority: int = 0,
+        timeout_seconds: Optional[float] = None
+    ) -> Tuple[Optional[int], bool]:
+        """Queue a job, returning its position and whether this call queued it
+
+        Raises QueueFullError when full. Submitting a job that is already
+        queued or running is a no-op. A job not finished within
+        ``timeout_seconds`` of submission is dropped.
+        """
+        if self.store.count() >= self.max_queue_size:
+            self._counters["rejected"] += 1
+            raise QueueFullError(f"Job queue is full ({self.max_queue_size} pending)")
+
+        now = time.time()
+        timeout_seconds = timeout_seconds or self.default_timeout
+        deadline_at = now + timeout_seconds if timeout_seconds else None
+
+        async with self._condition:
+            added = self.store.add(job_id, job_type, input_data, user_id, priority, now, deadline_at)
+            if added:
+                self._counters["submitted"] += 1
+                self._condition.notify()
+            else:
+                logger.info(f"Job {job_id} is already queued or running")
+
+        return self.position(job_id), added
+
+    async def submit_many(
+        self,
+        jobs: List[Dict[str, Any]]
+    ) -> Tuple[Dict[str, Optional[int]], List[str]]:
+        """Queue jobs all or none, returning each job's position and the IDs this call queued
+
+        Each job holds the arguments of ``submit``. They are written in one
+        transaction and keep their order among jobs of the same priority, so
+        the caller decides which jobs run back to back. Jobs already queued or
+        running are left alone and missing from the returned IDs.
+        """
+        if self.store.count() + len(jobs) > self.max_queue_size:
+            self._counters["rejected"] += len(jobs)
+            raise QueueFullError(
+                f"Job queue cannot take {len(jobs)} more jobs ({self.store.count()} of {self.max_queue_size} pending)"
+            )
+
+        now = time.time()
+        rows = []
+        for job in jobs:
+            timeout_seconds = job.get("timeout_seconds") or self.default_timeout
+            rows.append({
+                **job,
+                "deadline_at": now + timeout_seconds if timeout_seconds else None
+            })
+
+        async with self._condition:
+            added = self.store.add_many(rows, now)
+            self._counters["submitted"] += len(added)
+            self._condition.notify_all()
+
+        if len(added) < len(jobs):
+            logger.info(f"{len(jobs) - len(added)} of {len(jobs)} jobs were already queued or running")
+
+        positions = self.store.positions([job["job_id"] for job in jobs])
+        return {job["job_id"]: positions.get(job["job_id"]) for job in jobs}, added
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based queue position of a pending job, None if not queued"""
+        return self.store.position(job_id)
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """Cancel a job, returning "cancelled", "cancelling", its finished status or None if unknown
+
+        Queued jobs are removed at once. Running jobs are signalled through
+        their cancel token, or through the store when another process runs them.
+        """
+        prior = self.store.request_cancel(job_id, time.time())
+        if prior == "queued":
+            self._drop(job_id, "cancelled", "CANCELLED", "Cancelled before processing", "cancelled")
+            return "cancelled"
+
+        if prior == "running":
+            token = self._tokens.get(job_id)
+            if token:
+                token.cancel()
+            return "cancelling"
+
+        return prior
+
+    def _drop(self, job_id: str, status: str, error_code: str, reason: str, counter: str):
+        self._counters[counter] += 1
+        logger.warning(f"Dropped job {job_id}: {reason}")
+        if self.on_dropped:
+            self.on_dropped(job_id, status, error_code, reason)
+        self._finished(job_id)
+
+    def _finished(self, job_id: str):
+        if self.on_finished:
+            try:
+                self.on_finished(job_id)
+            except Exception as e:
+                logger.error(f"Finished-job callback failed for {job_id}: {str(e)}")
+
+    def _claim_runnable(self) -> Optional[ScheduledJob]:
+        """Claim the best ready job whose type still has a free slot"""
+        if self._active >= self.max_concurrency:
+            return None
+
+        now = time.time()
+        for row in self.store.ready(now, self.max_queue_size):
+            limit = self.type_limits.get(row["job_type"])
+            if limit is not None and self._running.get(row["job_type"], 0) >= limit:
+                continue
+
+            if row["deadline_at"] is not None and row["deadline_at"] <= now:
+                # Expired while queued: never reaches inference
+                self.store.bury(row["job_id"], now, "deadline")
+                self._drop(row["job_id"], "failed", "DEADLINE_EXCEEDED", "Deadline passed while queued", "expired")
+                continue
+
+            attempts = self.store.claim(row["job_id"], now, now + self.visibility_timeout)
+            if attempts is None:
+                # Claimed by another process sharing the store
+                continue
+
+            row["attempts"] = attempts
+            return ScheduledJob(**row)
+
+        return None
+
+    def _maintain(self):
+        """Renew our leases, requeue jobs whose owner died and prune old rows"""
+        now = time.time()
+        if now < self._next_heartbeat:
+            return
+        self._next_heartbeat = now + self.heartbeat_interval
+
+        self.store.extend(list(self._leased), now + self.visibility_timeout)
+
+        # Cancellations requested through another process sharing the store
+        for job_id in self.store.cancel_requested(list(self._tokens)):
+            self._tokens[job_id].cancel()
+
+        for job_id in self.store.expire(now):
+            self._drop(job_id, "failed", "DEADLINE_EXCEEDED", "Deadline passed while queued", "expired")
+
+        for row in self.store.expired(now):
+            if row["attempts"] >= self.max_attempts:
+                reason = f"Job was interrupted {row['attempts']} times"
+                self.store.bury(row["job_id"], now, reason)
+                self._drop(row["job_id"], "failed", "MAX_RETRIES_EXCEEDED", reason, "abandoned")
+            else:
+                self.store.retry(row["job_id"], now, now, "Lease expired")
+                self._counters["recovered"] += 1
+                logger.warning(f"Recovered orphaned job {row['job_id']} (attempt {row['attempts']})")
+
+        if now >= self._next_prune:
+            self._next_prune = now + 3600
+            pruned = self.store.prune(now - self.retention_seconds)
+            if pruned:
+                logger.info(f"Pruned {pruned} finished jobs from the job store")
+
+    async def _dispatch_loop(self):
+        while not self._stopping:
+            async with self._condition:
+                self._maintain()
+                job = self._claim_runnable()
+                if job is None:
+                    try:
+                        # Time out to pick up retries, expired leases and other processes' jobs
+                        await asyncio.wait_for(self._condition.wait(), MAINTENANCE_INTERVAL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                self._active += 1
+                self._running[job.job_type] = self._running.get(job.job_type, 0) + 1
+                self._leased[job.job_id] = job
+
+            wait = max(0.0, time.time() - job.available_at)
+            self._wait_times.append(wait)
+            metrics.observe_stage("queue_wait", wait)
+            task = asyncio.create_task(self._run(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _retry_delay(self, attempts: int) -> float:
+        # Exponential backoff with jitter over the upper half
+        delay = self.retry_base_delay * (2 ** (attempts - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def _run(self, job: ScheduledJob):
+        final_attempt = job.attempts >= self.max_attempts
+        interrupted = False
+        finished = True
+        token = self._tokens[job.job_id] = CancelToken(job.deadline_at)
+        try:
+            await self.handler(
+                job.job_id,
+                job.job_type,
+                job.input_data,
+                job.user_id,
+                final_attempt=final_attempt,
+                cancel_token=token
+            )
+            self.store.complete(job.job_id, time.time())
+            self._counters["completed"] += 1
+        except JobCancelled as e:
+            # A missed deadline is reported as failed, so it is stored as failed too
+            self.store.complete(job.job_id, time.time(), "dead" if e.reason == "deadline" else "cancelled", e.reason)
+            self._counters["expired" if e.reason == "deadline" else "cancelled"] += 1
+            logger.info(f"Job {job.job_id} stopped: {e.reason}")
+        except asyncio.CancelledError:
+            # Keep the lease so stop() can hand the job back to the queue
+            interrupted = True
+            finished = False
+            raise
+        except RetryableJobError as e:
+            now = time.time()
+            if final_attempt:
+                self.store.bury(job.job_id, now, str(e))
+                self._counters["failed"] += 1
+                logger.error(f"Job {job.job_id} failed after {job.attempts} attempts: {str(e)}")
+            else:
+                delay = self._retry_delay(job.attempts)
+                finished = False
+                self.store.retry(job.job_id, now, now + delay, str(e))
+                self._counters["retried"] += 1
+                logger.warning(f"Retrying job {job.job_id} in {delay:.1f}s (attempt {job.attempts}): {str(e)}")
+        except JobFailedError as e:
+            self.store.bury(job.job_id, time.time(), str(e))
+            self._counters["failed"] += 1
+            logger.error(f"Job {job.job_id} failed: {str(e)}")
+        except Exception as e:
+            self.store.bury(job.job_id, time.time(), str(e))
+            self._counters["failed"] += 1
+            logger.error(f"Scheduled job {job.job_id} raised: {str(e)}")
+        finally:
+            async with self._condition:
+                self._active -= 1
+                self._running[job.job_type] -= 1
+                self._tokens.pop(job.job_id, None)
+                if not interrupted:
+                    self._leased.pop(job.job_id, None)
+                self._condition.notify_all()
+            if finished:
+                self._finished(job.job_id)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth, slot usage and wait-time statistics"""
+        waits = sorted(self._wait_times)
+        oldest = self.store.oldest_queued()
+
+        return {
+            "queue_depth": self.store.count(),
+            "max_queue_size": self.max_queue_size,
+            "running": self._active,
+            "max_concurrency": self.max_concurrency,
+            "running_by_type": dict(self._running),
+            "type_limits": dict(self.type_limits),
+            "oldest_pending_seconds": round(max(0.0, time.time() - oldest), 3) if oldest else 0.0,
+            "stored_by_status": self.store.counts(),
+            "max_attempts": self.max_attempts,
+            "wait_seconds": {
+                "samples": len(waits),
+                "avg": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "p50": round(waits[len(waits) // 2], 3) if waits else 0.0,
+                "p95": round(waits[int(len(waits) * 0.95)], 3) if waits else 0.0,
+                "max": round(waits[-1], 3) if waits else 0.0
+            },
+            **self._counters
+        }
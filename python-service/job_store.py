@@ -0,0 +1,421 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Row states: queued -> running -> done, or back to queued for a retry, or dead/cancelled
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL UNIQUE,
+    job_type TEXT NOT NULL,
+    input_data TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_expires_at REAL,
+    deadline_at REAL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(status, priority DESC, seq);
+CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs(status, lease_expires_at);
+
+-- Jobs submitted together; status: open -> packaging -> completed or failed
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    job_ids TEXT NOT NULL,
+    package TEXT,
+    status TEXT NOT NULL DEFAULT 'open',
+    package_url TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+COLUMNS = "job_id, job_type, input_data, user_id, priority, attempts, available_at, deadline_at"
+
+# Columns added after the first release, created on open for older databases
+MIGRATIONS = {
+    "deadline_at": "ALTER TABLE jobs ADD COLUMN deadline_at REAL",
+    "cancel_requested": "ALTER TABLE jobs ADD COLUMN cancel_requested INTEGER NOT NULL DEFAULT 0"
+}
+
+# Queues a job, or requeues it if it finished before; a queued or running job is left alone
+INSERT_JOB = """
+INSERT INTO jobs (job_id, job_type, input_data, user_id, priority, available_at, deadline_at, created_at, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(job_id) DO UPDATE SET
+    job_type = excluded.job_type,
+    input_data = excluded.input_data,
+    user_id = excluded.user_id,
+    priority = excluded.priority,
+    status = 'queued',
+    attempts = 0,
+    available_at = excluded.available_at,
+    lease_expires_at = NULL,
+    deadline_at = excluded.deadline_at,
+    cancel_requested = 0,
+    last_error = NULL,
+    updated_at = excluded.updated_at
+WHERE jobs.status IN ('done', 'dead', 'cancelled')
+"""
+
+# Job states a job does not leave on its own
+FINISHED_STATES = ("done", "dead", "cancelled")
+
+
+class JobStore:
+    """Durable job queue in a local SQLite database (WAL mode)
+
+    A claimed job holds a lease until ``lease_expires_at``. The owner keeps
+    extending it while the job runs, so a lease only lapses when the process
+    that claimed the job died. Expired leases make the job visible again.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("JOB_STORE_PATH", "./data/jobs.db")
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        if self._connection is not None:
+            return
+
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+
+        # Autocommit: every statement, including a claim, is its own atomic transaction
+        self._connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("PRAGMA busy_timeout=5000")
+        self._connection.executescript(SCHEMA)
+        existing = {row["name"] for row in self._connection.execute("PRAGMA table_info(jobs)")}
+        for column, statement in MIGRATIONS.items():
+            if column not in existing:
+                self._connection.execute(statement)
+        logger.info(f"Job store opened at {self.path}")
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._connection.execute(sql, params)
+
+    @staticmethod
+    def _job(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["input_data"] = json.loads(job["input_data"])
+        return job
+
+    def add(
+        self,
+        job_id: str,
+        job_type: str,
+        input_data: Dict[str, Any],
+        user_id: str,
+        priority: int,
+        now: float,
+        deadline_at: Optional[float] = None
+    ) -> bool:
+        """Queue a job; False if it is already queued or running"""
+        cursor = self._execute(
+            INSERT_JOB,
+            (job_id, job_type, json.dumps(input_data), user_id, priority, now, deadline_at, now, now)
+        )
+        return cursor.rowcount > 0
+
+    def add_many(self, jobs: List[Dict[str, Any]], now: float) -> List[str]:
+        """Queue many jobs in one transaction, returning the IDs that were added
+
+        Each job holds the arguments of ``add``. Jobs already queued or
+        running are skipped, like in ``add``.
+        """
+        added = []
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                for job in jobs:
+                    cursor = self._connection.execute(
+                        INSERT_JOB,
+                        (
+                            job["job_id"], job["job_type"], json.dumps(job["input_data"]), job["user_id"],
+                            job.get("priority", 0), now, job.get("deadline_at"), now, now
+                        )
+                    )
+                    if cursor.rowcount > 0:
+                        added.append(job["job_id"])
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        return added
+
+    def count(self, status: str = "queued") -> int:
+        return self._execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based position among queued jobs, None if the job is not queued"""
+        job = self._execute(
+            "SELECT priority, seq FROM jobs WHERE job_id = ? AND status = 'queued'", (job_id,)
+        ).fetchone()
+        if job is None:
+            return None
+
+        ahead = self._execute(
+            """
+            SELECT COUNT(*) FROM jobs
+            WHERE status = 'queued' AND (priority > ? OR (priority = ? AND seq < ?))
+            """,
+            (job["priority"], job["priority"], job["seq"])
+        ).fetchone()[0]
+        return ahead + 1
+
+    def positions(self, job_ids: List[str]) -> Dict[str, int]:
+        """1-based queue positions of the queued jobs among job_ids, in one query"""
+        if not job_ids:
+            return {}
+        placeholders = ",".join("?" * len(job_ids))
+        rows = self._execute(
+            f"""
+            SELECT job_id, position FROM (
+                SELECT job_id, ROW_NUMBER() OVER (ORDER BY priority DESC, seq) AS position
+                FROM jobs WHERE status = 'queued'
+            ) WHERE job_id IN ({placeholders})
+            """,
+            job_ids
+        ).fetchall()
+        return {row["job_id"]: row["position"] for row in rows}
+
+    def ready(self, now: float, limit: int) -> List[Dict[str, Any]]:
+        """Queued jobs that may run now, best first"""
+        rows = self._execute(
+            f"""
+            SELECT {COLUMNS} FROM jobs
+            WHERE status = 'queued' AND available_at <= ?
+            ORDER BY priority DESC, seq
+            LIMIT ?
+            """,
+            (now, limit)
+        ).fetchall()
+        return [self._job(row) for row in rows]
+
+    def oldest_queued(self) -> Optional[float]:
+        return self._execute("SELECT MIN(available_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def claim(self, job_id: str, now: float, lease_until: float) -> Optional[int]:
+        """Take a queued job, returning its attempt number or None if another worker got it"""
+        cursor = self._execute(
+            """
+            UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_expires_at = ?, updated_at = ?
+            WHERE job_id = ? AND status = 'queued'
+            RETURNING attempts
+            """,
+            (lease_until, now, job_id)
+        )
+        # Drain the cursor so the statement finishes and its transaction commits
+        rows = cursor.fetchall()
+        return rows[0][0] if rows else None
+
+    def extend(self, job_ids: List[str], lease_until: float):
+        """Heartbeat: push the lease of running jobs forward"""
+        if not job_ids:
+            return
+        placeholders = ",".join("?" * len(job_ids))
+        self._execute(
+            f"UPDATE jobs SET lease_expires_at = ? WHERE status = 'running' AND job_id IN ({placeholders})",
+            (lease_until, *job_ids)
+        )
+
+    def complete(self, job_id: str, now: float, status: str = "done", error: Optional[str] = None):
+        """Take a job out of the queue with a finished status"""
+        self._execute(
+            "UPDATE jobs SET status = ?, lease_expires_at = NULL, last_error = ?, updated_at = ? WHERE job_id = ?",
+            (status, error, now, job_id)
+        )
+
+    def request_cancel(self, job_id: str, now: float) -> Optional[str]:
+        """Cancel a queued job outright or flag a running one, returning its prior status"""
+        row = self._execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        if row["status"] == "queued":
+            cursor = self._execute(
+                "UPDATE jobs SET status = 'cancelled', last_error = 'cancelled', updated_at = ? "
+                "WHERE job_id = ? AND status = 'queued'",
+                (now, job_id)
+            )
+            # Lost a race with a claim: fall through to flagging the running job
+            if cursor.rowcount:
+                return "queued"
+
+        self._execute(
+            "UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE job_id = ? AND status = 'running'",
+            (now, job_id)
+        )
+        return self._execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()["status"]
+
+    def cancel_requested(self, job_ids: List[str]) -> List[str]:
+        """Running jobs among job_ids that were asked to stop"""
+        if not job_ids:
+            return []
+        placeholders = ",".join("?" * len(job_ids))
+        rows = self._execute(
+            f"SELECT job_id FROM jobs WHERE cancel_requested = 1 AND status = 'running' AND job_id IN ({placeholders})",
+            job_ids
+        ).fetchall()
+        return [row["job_id"] for row in rows]
+
+    def expire(self, now: float) -> List[str]:
+        """Fail queued jobs whose deadline has passed, returning their IDs"""
+        rows = self._execute(
+            """
+            UPDATE jobs SET status = 'dead', last_error = 'deadline', updated_at = ?
+            WHERE status = 'queued' AND deadline_at IS NOT NULL AND deadline_at <= ?
+            RETURNING job_id
+            """,
+            (now, now)
+        ).fetchall()
+        return [row["job_id"] for row in rows]
+
+    def retry(self, job_id: str, now: float, available_at: float, error: str):
+        self._execute(
+            """
+            UPDATE jobs SET status = 'queued', available_at = ?, lease_expires_at = NULL, last_error = ?, updated_at = ?
+            WHERE job_id = ?
+            """,
+            (available_at, error, now, job_id)
+        )
+
+    def bury(self, job_id: str, now: float, error: str):
+        """Give up on a job for good"""
+        self._execute(
+            "UPDATE jobs SET status = 'dead', lease_expires_at = NULL, last_error = ?, updated_at = ? WHERE job_id = ?",
+            (error, now, job_id)
+        )
+
+    def release(self, job_ids: List[str], now: float):
+        """Put interrupted jobs back without counting the attempt (clean shutdown)"""
+        if not job_ids:
+            return
+        placeholders = ",".join("?" * len(job_ids))
+        self._execute(
+            f"""
+            UPDATE jobs SET status = 'queued', attempts = MAX(attempts - 1, 0), available_at = ?,
+                lease_expires_at = NULL, updated_at = ?
+            WHERE status = 'running' AND job_id IN ({placeholders})
+            """,
+            (now, now, *job_ids)
+        )
+
+    def shorten_leases(self, lease_until: float) -> int:
+        """Pull running jobs' leases in to ``lease_until``, returning how many changed"""
+        cursor = self._execute(
+            "UPDATE jobs SET lease_expires_at = ? WHERE status = 'running' AND lease_expires_at > ?",
+            (lease_until, lease_until)
+        )
+        return cursor.rowcount
+
+    def expired(self, now: float) -> List[Dict[str, Any]]:
+        """Running jobs whose owner stopped renewing the lease"""
+        rows = self._execute(
+            f"SELECT {COLUMNS} FROM jobs WHERE status = 'running' AND lease_expires_at < ?",
+            (now,)
+        ).fetchall()
+        return [self._job(row) for row in rows]
+
+    def prune(self, before: float) -> int:
+        """Delete finished jobs and batches last touched before a timestamp"""
+        cursor = self._execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'dead', 'cancelled') AND updated_at < ?",
+            (before,)
+        )
+        self._execute("DELETE FROM batches WHERE status IN ('completed', 'failed') AND updated_at < ?", (before,))
+        return cursor.rowcount
+
+    def add_batch(self, batch_id: str, user_id: str, job_ids: List[str], package: Optional[str], now: float) -> bool:
+        """Record a batch; False if a batch with this ID exists, open or finished"""
+        cursor = self._execute(
+            """
+            INSERT INTO batches (batch_id, user_id, job_ids, package, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(batch_id) DO NOTHING
+            """,
+            (batch_id, user_id, json.dumps(job_ids), package, now, now)
+        )
+        return cursor.rowcount > 0
+
+    def remove_batch(self, batch_id: str):
+        self._execute("DELETE FROM batches WHERE batch_id = ?", (batch_id,))
+
+    def batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        row = self._execute("SELECT * FROM batches WHERE batch_id = ?", (batch_id,)).fetchone()
+        if row is None:
+            return None
+        batch = dict(row)
+        batch["job_ids"] = json.loads(batch["job_ids"])
+        return batch
+
+    def open_batches_of(self, job_id: str) -> List[str]:
+        """Unpackaged batches a job belongs to"""
+        rows = self._execute(
+            """
+            SELECT batch_id FROM batches, json_each(batches.job_ids)
+            WHERE batches.status = 'open' AND json_each.value = ?
+            """,
+            (job_id,)
+        ).fetchall()
+        return [row["batch_id"] for row in rows]
+
+    def open_batches(self) -> List[str]:
+        """Batches not packaged yet, including ones a restart interrupted mid-packaging"""
+        rows = self._execute("SELECT batch_id FROM batches WHERE status IN ('open', 'packaging')").fetchall()
+        return [row["batch_id"] for row in rows]
+
+    def job_states(self, job_ids: List[str]) -> Dict[str, str]:
+        """Store status of each known job among job_ids"""
+        if not job_ids:
+            return {}
+        placeholders = ",".join("?" * len(job_ids))
+        rows = self._execute(
+            f"SELECT job_id, status FROM jobs WHERE job_id IN ({placeholders})",
+            job_ids
+        ).fetchall()
+        return {row["job_id"]: row["status"] for row in rows}
+
+    def start_packaging(self, batch_id: str, now: float, resume: bool = False) -> bool:
+        """Move a batch to packaging; False if another caller already did"""
+        states = "('open', 'packaging')" if resume else "('open')"
+        cursor = self._execute(
+            f"UPDATE batches SET status = 'packaging', updated_at = ? WHERE batch_id = ? AND status IN {states}",
+            (now, batch_id)
+        )
+        return cursor.rowcount > 0
+
+    def finish_batch(self, batch_id: str, now: float, status: str, package_url: Optional[str] = None,
+                     error: Optional[str] = None):
+        self._execute(
+            "UPDATE batches SET status = ?, package_url = ?, error = ?, updated_at = ? WHERE batch_id = ?",
+            (status, package_url, error, now, batch_id)
+        )
@@ -1,15 +1,21 @@
 import os
+import json
+import uuid
 import asyncio
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, ValidationError
+from typing import Optional, Dict, Any, List
 import logging
 from datetime import datetime
 
-from tts_engine import TTSEngine
-from job_processor import JobProcessor
-from supabase_client import SupabaseClient
+from services import ServiceContainer
+from job_scheduler import QueueFullError
+from batch_packager import PACKAGE_FORMATS
+from audio_effects import AudioEffects
+from audio_utils import wav_header
+import metrics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -26,79 +32,390 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize services
-tts_engine = TTSEngine()
-job_processor = JobProcessor()
-supabase_client = SupabaseClient()
+# Initialize services (one model and one Supabase client per process)
+services = ServiceContainer()
+tts_engine = services.tts_engine
+supabase_client = services.supabase_client
+job_processor = services.job_processor
+job_scheduler = services.job_scheduler
+status_cache = services.status_cache
+batch_packager = services.batch_packager
+
+# Seconds between keep-alives on an idle job status subscription
+STATUS_HEARTBEAT_SECONDS = float(os.getenv("STATUS_HEARTBEAT_SECONDS", "15"))
+
+# Most jobs accepted in one bulk submission
+BATCH_MAX_JOBS = int(os.getenv("BATCH_MAX_JOBS", "500"))
 
 class JobRequest(BaseModel):
     job_id: str
     job_type: str
     input_data: Dict[str, Any]
     user_id: str
+    priority: int = 0
+    # Drop the job if it has not finished this many seconds after submission
+    timeout_seconds: Optional[float] = None
+
+class BatchJobRequest(BaseModel):
+    jobs: List[JobRequest]
+    # Generated when not given; resubmitting a known ID returns that batch without running it again
+    batch_id: Optional[str] = None
+    # "zip" or "m3u" to package the outputs once every job finished
+    package: Optional[str] = None
+
+class StreamRequest(BaseModel):
+    text: str
+    voice_id: str = "default"
+    language: str = "en"
+    emotion: str = "neutral"
+    speed: float = 1.0
+    pitch: float = 1.0
+    # Registered model to use; by default the one serving the language
+    model: Optional[str] = None
 
 class HealthResponse(BaseModel):
     status: str
     timestamp: str
-    services: Dict[str, str]
+    uptime_seconds: float
+    # Milliseconds per startup step: model_load_ms, supabase_ms, warmup_ms, scheduler_ms, total_ms
+    startup: Dict[str, float]
+    services: Dict[str, Dict[str, Any]]
 
 @app.get("/health", response_model=HealthResponse)
-async def health_check():
-    """Health check endpoint"""
+async def health_check(response: Response):
+    """Health check endpoint, 503 until the model is loaded and warmed up"""
+    health = services.health()
+    if not health["ready"]:
+        response.status_code = 503
+
     return HealthResponse(
-        status="healthy",
+        status="healthy" if health["ready"] else "starting",
         timestamp=datetime.utcnow().isoformat(),
-        services={
-            "tts_engine": "ready",
-            "job_processor": "ready",
-            "supabase": "connected"
-        }
+        uptime_seconds=health["uptime_seconds"],
+        startup=health["startup"],
+        services=health["services"]
     )
 
 @app.post("/process-job")
-async def process_job(job_request: JobRequest, background_tasks: BackgroundTasks):
+async def process_job(job_request: JobRequest):
     """Process a TTS job"""
     try:
         logger.info(f"Processing job {job_request.job_id} of type {job_request.job_type}")
         
-        # Add job to background processing
-        background_tasks.add_task(
-            job_processor.process_job,
+        # Queue job for the inference workers
+        position, queued = await job_scheduler.submit(
             job_request.job_id,
             job_request.job_type,
             job_request.input_data,
-            job_request.user_id
+            job_request.user_id,
+            priority=job_request.priority,
+            timeout_seconds=job_request.timeout_seconds
         )
+        # A job that was already queued or running keeps its current status
+        if queued:
+            status_cache.update(
+                job_request.job_id,
+                "pending",
+                job_type=job_request.job_type,
+                user_id=job_request.user_id
+            )
         
-        return {"status": "accepted", "job_id": job_request.job_id}
+        return {
+            "status": "accepted",
+            "job_id": job_request.job_id,
+            "queue_position": position
+        }
         
+    except QueueFullError as e:
+        logger.warning(f"Rejected job {job_request.job_id}: {str(e)}")
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": "5"}
+        )
     except Exception as e:
         logger.error(f"Error processing job {job_request.job_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _batch_order(jobs: List[JobRequest]) -> List[JobRequest]:
+    """Jobs sharing a voice, language and model next to each other, in request order otherwise
+
+    The queue runs jobs of equal priority in submission order, so a group
+    reuses the same loaded model and speaker latents back to back.
+    """
+    groups: Dict[tuple, List[JobRequest]] = {}
+    for job in jobs:
+        key = (
+            job.job_type,
+            job.input_data.get("voice_id"),
+            job.input_data.get("language") or job.input_data.get("target_language"),
+            job.input_data.get("model")
+        )
+        groups.setdefault(key, []).append(job)
+    return [job for group in groups.values() for job in group]
+
+@app.post("/process-jobs")
+async def process_jobs(batch: BatchJobRequest):
+    """Queue many jobs at once, all or none, optionally packaging their outputs"""
+    job_ids = [job.job_id for job in batch.jobs]
+    if not job_ids:
+        raise HTTPException(status_code=400, detail="A batch needs at least one job")
+    if len(job_ids) > BATCH_MAX_JOBS:
+        raise HTTPException(status_code=400, detail=f"A batch holds at most {BATCH_MAX_JOBS} jobs")
+    if len(set(job_ids)) != len(job_ids):
+        raise HTTPException(status_code=400, detail="Job IDs in a batch must be unique")
+    if batch.package and batch.package not in PACKAGE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown package format {batch.package}; use one of {', '.join(PACKAGE_FORMATS)}")
+    user_ids = {job.user_id for job in batch.jobs}
+    if batch.package and len(user_ids) > 1:
+        raise HTTPException(status_code=400, detail="A packaged batch must belong to one user")
+
+    batch_id = batch.batch_id or uuid.uuid4().hex
+    try:
+        logger.info(f"Processing batch {batch_id} of {len(job_ids)} jobs")
+
+        # Tracked before queueing, so a job finishing right away still completes the batch
+        if not batch_packager.register(batch_id, batch.jobs[0].user_id, job_ids, batch.package):
+            # A retried submission: report the batch as it stands, open or finished
+            logger.info(f"Batch {batch_id} was already submitted")
+            return {"status": "duplicate", "batch_id": batch_id, "batch": batch_packager.summary(batch_id)}
+
+        try:
+            positions, queued = await job_scheduler.submit_many([
+                {
+                    "job_id": job.job_id,
+                    "job_type": job.job_type,
+                    "input_data": job.input_data,
+                    "user_id": job.user_id,
+                    "priority": job.priority,
+                    "timeout_seconds": job.timeout_seconds
+                }
+                for job in _batch_order(batch.jobs)
+            ])
+        except QueueFullError:
+            batch_packager.forget(batch_id)
+            raise
+
+        # Identical updates go out as one bulk write; jobs already queued or running keep their status
+        queued = set(queued)
+        for job in batch.jobs:
+            if job.job_id not in queued:
+                continue
+            status_cache.update(job.job_id, "pending", job_type=job.job_type, user_id=job.user_id)
+            services.progress_reporter.report(job.job_id, "pending", progress=0, progress_message=f"Queued in batch {batch_id}")
+
+        return {
+            "status": "accepted",
+            "batch_id": batch_id,
+            "jobs": [{"job_id": job_id, "queue_position": positions[job_id]} for job_id in job_ids]
+        }
+
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        logger.warning(f"Rejected batch {batch_id}: {str(e)}")
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": "5"}
+        )
+    except Exception as e:
+        logger.error(f"Error processing batch {batch_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/batch/{batch_id}")
+async def get_batch_status(batch_id: str):
+    """Progress of a bulk submission and the URL of its package once built"""
+    summary = batch_packager.summary(batch_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail=f"Batch {batch_id} not found")
+    return summary
+
 @app.get("/job/{job_id}/status")
 async def get_job_status(job_id: str):
-    """Get job status"""
+    """Get job status, from the status cache when it is known there"""
     try:
-        status = await supabase_client.get_job_status(job_id)
+        status = await status_cache.fetch(job_id, supabase_client.get_job_status)
         return status
     except Exception as e:
         logger.error(f"Error getting job status {job_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _status_events(job_id: str):
+    """Status subscription with its first event already read, so a lookup error can still be an HTTP error"""
+    events = status_cache.events(job_id, supabase_client.get_job_status, heartbeat=STATUS_HEARTBEAT_SECONDS)
+    try:
+        first = await events.__anext__()
+    except Exception as e:
+        await events.aclose()
+        logger.error(f"Error getting job status {job_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return first, events
+
+@app.get("/job/{job_id}/events")
+async def job_status_events(job_id: str, request: Request):
+    """Server-Sent Events: the job's status now, then every change until it finishes"""
+    first, events = await _status_events(job_id)
+
+    async def event_stream():
+        try:
+            yield f"event: status\ndata: {json.dumps(first, default=str)}\n\n"
+            async for status in events:
+                if await request.is_disconnected():
+                    break
+                if status is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield f"event: status\ndata: {json.dumps(status, default=str)}\n\n"
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/ws/job/{job_id}")
+async def job_status_websocket(websocket: WebSocket, job_id: str):
+    """Push the job's status as JSON messages until it finishes, then close"""
+    await websocket.accept()
+    events = status_cache.events(job_id, supabase_client.get_job_status, heartbeat=STATUS_HEARTBEAT_SECONDS)
+    try:
+        async for status in events:
+            await websocket.send_json({"event": "ping"} if status is None else {"event": "status", "job": status})
+        await websocket.close()
+
+    except WebSocketDisconnect:
+        logger.info(f"Status subscriber of job {job_id} disconnected")
+    except Exception as e:
+        logger.error(f"Job status subscription {job_id} failed: {str(e)}")
+        await websocket.close(code=1011)
+    finally:
+        await events.aclose()
+
+@app.delete("/job/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job"""
+    status = job_scheduler.cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} is not known to this service")
+    if status not in ("cancelled", "cancelling"):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} already finished ({status})")
+
+    logger.info(f"Cancel requested for job {job_id}: {status}")
+    return {"job_id": job_id, "status": status}
+
+def _stream_request_error(stream_request: StreamRequest) -> Optional[str]:
+    """Why a streaming request cannot be synthesized, None if it can"""
+    if not stream_request.text.strip():
+        return "No text provided for TTS"
+    try:
+        AudioEffects(speed=stream_request.speed, pitch=stream_request.pitch).validate()
+    except ValueError as e:
+        return str(e)
+    return None
+
+@app.post("/tts/stream")
+async def stream_tts(stream_request: StreamRequest, request: Request):
+    """Stream WAV audio, sending each sentence as soon as it is synthesized"""
+    error = _stream_request_error(stream_request)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+
+    async def audio_stream():
+        chunks = tts_engine.stream_speech(**stream_request.model_dump())
+        try:
+            yield wav_header(tts_engine.sample_rate)
+            async for chunk in chunks:
+                if await request.is_disconnected():
+                    logger.info("Client disconnected, stopping stream")
+                    break
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    return StreamingResponse(audio_stream(), media_type="audio/wav")
+
+@app.websocket("/ws/tts")
+async def stream_tts_websocket(websocket: WebSocket):
+    """Stream raw 16-bit PCM frames per sentence over a WebSocket
+
+    An invalid request gets an ``error`` event and the connection stays open
+    for the next one.
+    """
+    await websocket.accept()
+    try:
+        while True:
+            try:
+                stream_request = StreamRequest(**await websocket.receive_json())
+                error = _stream_request_error(stream_request)
+            except (ValidationError, TypeError, json.JSONDecodeError) as e:
+                error = str(e)
+            if error:
+                await websocket.send_json({"event": "error", "status_code": 400, "detail": error})
+                continue
+
+            await websocket.send_json({
+                "event": "start",
+                "sample_rate": tts_engine.sample_rate,
+                "encoding": "pcm_s16le"
+            })
+
+            chunks = tts_engine.stream_speech(**stream_request.model_dump())
+            try:
+                async for chunk in chunks:
+                    await websocket.send_bytes(chunk)
+            finally:
+                await chunks.aclose()
+
+            await websocket.send_json({"event": "end"})
+
+    except WebSocketDisconnect:
+        logger.info("WebSocket client disconnected")
+    except Exception as e:
+        logger.error(f"WebSocket streaming failed: {str(e)}")
+        await websocket.close(code=1011)
+
+@app.get("/queue/metrics")
+async def queue_metrics():
+    """Scheduler queue depth, wait times and worker usage"""
+    return {
+        "scheduler": job_scheduler.metrics(),
+        "inference_pool": services.inference_pool.stats(),
+        "batching": tts_engine.batcher.stats() if tts_engine.batcher else None,
+        "progress_updates": services.progress_reporter.stats(),
+        "model_workers": services.model_workers.stats() if services.model_workers else None
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Stage timings, job outcomes and service gauges in Prometheus text format"""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/cache/metrics")
+async def cache_metrics():
+    """Hit and miss counters of the service caches"""
+    return {
+        "speaker_latents": tts_engine.speaker_cache.stats(),
+        "job_status": status_cache.stats(),
+        "models": tts_engine.models.stats(),
+        "synthesis_results": services.result_cache.stats() if services.result_cache else None
+    }
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize services on startup"""
     logger.info("Starting Speecher AI Service...")
-    await tts_engine.initialize()
-    await supabase_client.initialize()
+    await services.initialize()
     logger.info("All services initialized successfully")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down Speecher AI Service...")
-    await tts_engine.cleanup()
+    await services.shutdown()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,148 @@
+"""Offline-first loading of the XTTS model
+
+Weights are read from TTS_MODEL_DIR (default ./models/xtts_v2), a directory
+holding the XTTS release files. The network is only used when that
+directory is incomplete and TTS_MODEL_DOWNLOAD allows it. The download then
+lands in the same directory, so a mounted volume makes the next start
+offline. Images can bake the weights in at build time:
+
+    COQUI_TOS_AGREED=1 python model_loader.py download
+    python model_loader.py load      # prints the load-phase timings
+
+torch and TTS are imported only when a model is actually loaded.
+"""
+import os
+import sys
+import time
+import logging
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+XTTS_MODEL_NAME = "tts_models/multilingual/multi-dataset/xtts_v2"
+
+# Files XTTS inference cannot start without
+REQUIRED_FILES = ("config.json", "model.pth", "vocab.json")
+
+
+def model_dir() -> Path:
+    return Path(os.getenv("TTS_MODEL_DIR", "./models/xtts_v2"))
+
+
+def is_complete(directory: Path) -> bool:
+    return all((directory / name).is_file() for name in REQUIRED_FILES)
+
+
+def default_device() -> str:
+    import torch
+
+    return os.getenv("TTS_DEVICE") or ("cuda" if torch.cuda.is_available() else "cpu")
+
+
+def download(directory: Optional[Path] = None) -> Path:
+    """Fetch the XTTS release into ``directory`` through the TTS model manager"""
+    from TTS.utils.manage import ModelManager
+
+    directory = Path(directory or model_dir())
+    directory.mkdir(parents=True, exist_ok=True)
+
+    # Stage next to the target so the final move is a rename, and a failed
+    # download never leaves a half-filled model directory behind
+    with tempfile.TemporaryDirectory(dir=directory.parent) as staging:
+        model_path, _, _ = ModelManager(output_prefix=staging, progress_bar=False).download_model(XTTS_MODEL_NAME)
+        source = Path(model_path)
+        if source.is_file():
+            source = source.parent
+        for item in source.iterdir():
+            os.replace(item, directory / item.name)
+
+    logger.info(f"Downloaded {XTTS_MODEL_NAME} to {directory}")
+    return directory
+
+
+@contextmanager
+def _mmap_checkpoints():
+    """Memory-map model.pth while XTTS loads it instead of reading it into memory first"""
+    import torch
+    from TTS.tts.models import xtts
+
+    original = getattr(xtts, "load_fsspec", None)
+    if original is None:
+        yield
+        return
+
+    def load(path, map_location=None, **kwargs):
+        try:
+            return torch.load(path, map_location=map_location, mmap=True, **kwargs)
+        except (RuntimeError, TypeError, ValueError) as e:
+            # Legacy (non-zip) checkpoints and remote paths cannot be mapped
+            logger.info(f"Loading {path} without mmap: {str(e)}")
+            return original(path, map_location=map_location, **kwargs)
+
+    xtts.load_fsspec = load
+    try:
+        yield
+    finally:
+        xtts.load_fsspec = original
+
+
+def load(device: str, directory: Optional[Path] = None) -> Tuple[Any, Dict[str, float]]:
+    """Load XTTS from the local model directory (blocking)
+
+    Returns the TTS API model and the time spent in each phase.
+    """
+    phases: Dict[str, float] = {}
+    directory = Path(directory or model_dir())
+
+    started = time.perf_counter()
+    from TTS.api import TTS
+    phases["import_ms"] = (time.perf_counter() - started) * 1000
+
+    if not is_complete(directory):
+        if os.getenv("TTS_MODEL_DOWNLOAD", "true").lower() != "true":
+            raise FileNotFoundError(
+                f"No XTTS weights in {directory}; run `python model_loader.py download` or set TTS_MODEL_DOWNLOAD=true"
+            )
+        logger.warning(f"No XTTS weights in {directory}, downloading {XTTS_MODEL_NAME}")
+        started = time.perf_counter()
+        download(directory)
+        phases["download_ms"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with _mmap_checkpoints():
+        model = TTS(model_path=str(directory), config_path=str(directory / "config.json"), progress_bar=False)
+    phases["weights_ms"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    model = model.to(device)
+    phases["to_device_ms"] = (time.perf_counter() - started) * 1000
+
+    logger.info(
+        f"XTTS loaded from {directory}: " + ", ".join(f"{name} {ms:.0f}ms" for name, ms in phases.items())
+    )
+    return model, phases
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    command = sys.argv[1] if len(sys.argv) > 1 else "load"
+    target = Path(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    if command == "download":
+        if is_complete(Path(target or model_dir())):
+            print(f"{target or model_dir()} already holds the model")
+        else:
+            download(target)
+    elif command == "load":
+        started = time.perf_counter()
+        device = default_device()
+        device_ms = (time.perf_counter() - started) * 1000
+        _, phases = load(device, target)
+        for name, ms in {"device_ms": device_ms, **phases}.items():
+            print(f"{name:<14} {ms:10.0f}")
+        print(f"{'total_ms':<14} {(time.perf_counter() - started) * 1000:10.0f}")
+    else:
+        sys.exit(f"unknown command {command}; use download or load")
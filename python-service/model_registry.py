@@ -0,0 +1,338 @@
+"""Lazily loaded TTS models under a memory budget
+
+Besides the default XTTS model, TTS_MODELS can name more checkpoints (for
+example language-specific fine-tunes or a lighter preview model) as JSON:
+
+    TTS_MODELS='{"de": {"dir": "/models/xtts_de", "languages": ["de"]},
+                 "preview": {"dir": "/models/preview", "size_mb": 900}}'
+
+Models are loaded on first use and kept while their resident size fits in
+TTS_MODEL_MEMORY_MB. Loading another one evicts the least recently used
+model that is neither pinned (TTS_PINNED_MODELS, default ``default``) nor
+running inference. Concurrent requests for a model that is not loaded wait
+for one shared load.
+"""
+import gc
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import model_loader
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "default"
+
+
+@dataclass
+class ModelSpec:
+    key: str
+    directory: Path
+    # Languages routed to this model when a request does not name one
+    languages: Tuple[str, ...] = ()
+    pinned: bool = False
+    # Expected resident size before the first load; the checkpoint size otherwise
+    size_bytes: Optional[int] = None
+
+
+@dataclass
+class _Resident:
+    model: Any
+    nbytes: int
+    load_ms: float
+    users: int = 0
+    last_used: float = field(default_factory=time.time)
+
+
+def model_specs() -> Dict[str, ModelSpec]:
+    """The default model plus the ones configured in TTS_MODELS"""
+    specs = {DEFAULT_MODEL: ModelSpec(DEFAULT_MODEL, model_loader.model_dir())}
+
+    for key, options in json.loads(os.getenv("TTS_MODELS") or "{}").items():
+        size_mb = options.get("size_mb")
+        specs[key] = ModelSpec(
+            key,
+            Path(options.get("dir", model_loader.model_dir())),
+            languages=tuple(language.lower() for language in options.get("languages", [])),
+            size_bytes=int(size_mb * 1024 * 1024) if size_mb else None
+        )
+
+    for key in os.getenv("TTS_PINNED_MODELS", DEFAULT_MODEL).split(","):
+        if key.strip() in specs:
+            specs[key.strip()].pinned = True
+    return specs
+
+
+def default_budget_bytes() -> int:
+    """TTS_MODEL_MEMORY_MB, else three quarters of physical memory"""
+    configured = os.getenv("TTS_MODEL_MEMORY_MB")
+    if configured:
+        return int(float(configured) * 1024 * 1024)
+    try:
+        return int(os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") * 0.75)
+    except (ValueError, OSError, AttributeError):
+        return 8 * 1024 ** 3
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def model_nbytes(model) -> int:
+    """Bytes held by a model's parameters and buffers, or 0 if it has none"""
+    tensors = {}
+    for method in ("parameters", "buffers"):
+        for tensor in getattr(model, method, lambda: [])():
+            tensors[id(tensor)] = tensor.element_size() * tensor.nelement()
+    return sum(tensors.values())
+
+
+class ModelRegistry:
+    """Models loaded by key on demand, evicted least recently used first
+
+    ``loader`` loads the model of a ModelSpec (blocking). All methods are
+    blocking and thread safe, meant to be called from inference workers.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[ModelSpec], Any],
+        specs: Optional[Dict[str, ModelSpec]] = None,
+        max_bytes: Optional[int] = None
+    ):
+        self.loader = loader
+        self.specs = specs if specs is not None else model_specs()
+        self.max_bytes = max_bytes or default_budget_bytes()
+
+        self._resident: "OrderedDict[str, _Resident]" = OrderedDict()
+        self._loading: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "loads": 0,
+            "shared_loads": 0,
+            "load_failures": 0,
+            "evictions": 0,
+            "over_budget_loads": 0
+        }
+
+    def resolve(self, model: Optional[str] = None, language: Optional[str] = None) -> str:
+        """Key of the model to use: the one requested, else the first one serving the language"""
+        if model:
+            if model not in self.specs:
+                raise ValueError(f"Unknown model {model}; available: {', '.join(self.specs)}")
+            return model
+
+        if language:
+            language = language.lower()
+            for key, spec in self.specs.items():
+                if language in spec.languages:
+                    return key
+        return DEFAULT_MODEL
+
+    @contextmanager
+    def lease(self, key: str = DEFAULT_MODEL) -> Iterator[Any]:
+        """Use a model, loading it first if needed; it is not evicted while leased"""
+        model = self._acquire(key)
+        try:
+            yield model
+        finally:
+            with self._lock:
+                resident = self._resident.get(key)
+                if resident is not None and resident.model is model:
+                    resident.users -= 1
+                    resident.last_used = time.time()
+                # A load that went over budget while this model was busy can now be undone
+                evicted = self._make_room(0) if self._resident_bytes() > self.max_bytes else []
+            self._release(evicted)
+
+    def get(self, key: str = DEFAULT_MODEL) -> Any:
+        """The loaded model, loading it first if needed"""
+        with self.lease(key) as model:
+            return model
+
+    def peek(self, key: str = DEFAULT_MODEL) -> Optional[Any]:
+        """The model if it is loaded, without loading or touching its recency"""
+        with self._lock:
+            resident = self._resident.get(key)
+            return resident.model if resident else None
+
+    def put(self, key: str, model: Any, load_ms: float = 0.0):
+        """Register a model that was loaded elsewhere"""
+        if key not in self.specs:
+            self.specs[key] = ModelSpec(key, model_loader.model_dir())
+        with self._lock:
+            self._resident.pop(key, None)
+            self._resident[key] = _Resident(model, model_nbytes(model), load_ms)
+            evicted = self._make_room(0)
+        self._release(evicted)
+
+    def preload(self):
+        """Load every pinned model"""
+        for key, spec in self.specs.items():
+            if spec.pinned:
+                self.get(key)
+
+    def pin(self, key: str):
+        self.specs[key].pinned = True
+
+    def unpin(self, key: str):
+        self.specs[key].pinned = False
+
+    def unload(self, key: str) -> bool:
+        """Drop a model that is not in use; returns whether it was unloaded"""
+        with self._lock:
+            resident = self._resident.get(key)
+            if resident is None or resident.users:
+                return False
+            evicted = [(key, self._resident.pop(key))]
+        self._release(evicted)
+        return True
+
+    def clear(self):
+        """Drop every model regardless of pins, e.g. on shutdown"""
+        with self._lock:
+            evicted = list(self._resident.items())
+            self._resident.clear()
+        self._release(evicted)
+
+    def _acquire(self, key: str) -> Any:
+        if key not in self.specs:
+            raise ValueError(f"Unknown model {key}")
+
+        while True:
+            with self._lock:
+                resident = self._resident.get(key)
+                if resident is not None:
+                    resident.users += 1
+                    self._resident.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return resident.model
+
+                pending = self._loading.get(key)
+                owner = pending is None
+                if owner:
+                    pending = self._loading[key] = Future()
+                else:
+                    self._counters["shared_loads"] += 1
+
+            if not owner:
+                # Another request is loading it; raises if that load failed
+                pending.result()
+                continue
+
+            try:
+                model = self._load(self.specs[key])
+            except BaseException as e:
+                with self._lock:
+                    self._loading.pop(key, None)
+                    self._counters["load_failures"] += 1
+                pending.set_exception(e)
+                raise
+
+            with self._lock:
+                self._loading.pop(key, None)
+            pending.set_result(None)
+            return model
+
+    def _load(self, spec: ModelSpec) -> Any:
+        """Make room, load and register a model, returned already leased"""
+        with self._lock:
+            evicted = self._make_room(self._estimate(spec))
+        self._release(evicted)
+
+        started = time.perf_counter()
+        rss_before = rss_bytes()
+        model = self.loader(spec)
+        load_ms = (time.perf_counter() - started) * 1000
+        # Weights outside torch (or memory-mapped ones) only show up in RSS
+        nbytes = model_nbytes(model) or max(0, rss_bytes() - rss_before)
+
+        with self._lock:
+            self._resident[spec.key] = _Resident(model, nbytes, load_ms, users=1)
+            self._counters["loads"] += 1
+            evicted = self._make_room(0)
+        self._release(evicted)
+
+        logger.info(f"Loaded model {spec.key} in {load_ms:.0f}ms ({nbytes / 1024 / 1024:.0f} MB)")
+        return model
+
+    def _estimate(self, spec: ModelSpec) -> int:
+        if spec.size_bytes:
+            return spec.size_bytes
+        checkpoint = spec.directory / "model.pth"
+        return checkpoint.stat().st_size if checkpoint.exists() else 0
+
+    def _make_room(self, incoming: int) -> List[Tuple[str, _Resident]]:
+        """Evict idle, unpinned models until ``incoming`` more bytes fit (caller holds the lock)"""
+        evicted = []
+        while self._resident_bytes() + incoming > self.max_bytes:
+            victim = next(
+                (
+                    key for key, resident in self._resident.items()
+                    if not resident.users and not self.specs[key].pinned
+                ),
+                None
+            )
+            if victim is None:
+                self._counters["over_budget_loads"] += 1
+                logger.warning(
+                    f"Model memory {self._resident_bytes() + incoming} bytes exceeds the budget of "
+                    f"{self.max_bytes}; the remaining models are pinned or in use"
+                )
+                break
+            evicted.append((victim, self._resident.pop(victim)))
+            self._counters["evictions"] += 1
+        return evicted
+
+    def _resident_bytes(self) -> int:
+        return sum(resident.nbytes for resident in self._resident.values())
+
+    @staticmethod
+    def _release(evicted: List[Tuple[str, _Resident]]):
+        """Free evicted models outside the lock"""
+        if not evicted:
+            return
+
+        for key, resident in evicted:
+            logger.info(f"Unloaded model {key} ({resident.nbytes / 1024 / 1024:.0f} MB)")
+        evicted.clear()
+        gc.collect()
+
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def stats(self) -> Dict[str, Any]:
+        """Resident models, memory use and load counters"""
+        with self._lock:
+            return {
+                "resident": {
+                    key: {
+                        "bytes": resident.nbytes,
+                        "load_ms": round(resident.load_ms, 1),
+                        "in_use": resident.users,
+                        "pinned": self.specs[key].pinned,
+                        "idle_seconds": round(time.time() - resident.last_used, 1)
+                    }
+                    for key, resident in self._resident.items()
+                },
+                "available": list(self.specs),
+                "loading": list(self._loading),
+                "bytes": self._resident_bytes(),
+                "max_bytes": self.max_bytes,
+                **self._counters
+            }
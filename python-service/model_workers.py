@@ -0,0 +1,344 @@
+import os
+import time
+import queue
+import shutil
+import asyncio
+import logging
+import itertools
+import tempfile
+import threading
+import multiprocessing as mp
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+import metrics
+from speaker_cache import DEFAULT_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+# How often the listener checks that worker processes are still alive
+LIVENESS_CHECK_SECONDS = 1.0
+
+
+def default_engine_factory(num_threads: int, speaker_cache_dir: str):
+    """Load a TTSEngine with its model inside a worker process"""
+    import torch
+    from speaker_cache import SpeakerLatentCache
+    from tts_engine import TTSEngine
+
+    torch.set_num_threads(num_threads)
+    torch.set_num_interop_threads(1)
+
+    engine = TTSEngine(speaker_cache=SpeakerLatentCache(cache_dir=speaker_cache_dir))
+    engine.model = engine._load_model()
+    return engine
+
+
+def cpu_sets(num_workers: int) -> List[List[int]]:
+    """Split the CPUs available to this process into one core set per worker"""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count() or 1))
+
+    per_worker = max(1, len(cpus) // num_workers)
+    return [
+        cpus[(index * per_worker) % len(cpus):][:per_worker]
+        for index in range(num_workers)
+    ]
+
+
+def _publish(wav: np.ndarray):
+    """Copy a waveform into a new shared memory block and hand it to the parent"""
+    wav = np.ascontiguousarray(wav, dtype=np.float32)
+    shm = SharedMemory(create=True, size=max(wav.nbytes, 1))
+    np.ndarray(wav.shape, dtype=np.float32, buffer=shm.buf)[:] = wav
+    name = shm.name
+    shm.close()
+    # The parent unlinks the block once it has copied the samples out
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return name, wav.shape[0]
+
+
+def _worker_main(
+    index: int,
+    cores: List[int],
+    num_threads: int,
+    engine_factory: Callable,
+    speaker_cache_dir: str,
+    requests,
+    responses
+):
+    """Entry point of a model worker process"""
+    try:
+        if cores and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cores)
+
+        # Size native thread pools before any numeric library starts them
+        for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+            os.environ[variable] = str(num_threads)
+
+        started = time.perf_counter()
+        engine = engine_factory(num_threads, speaker_cache_dir)
+        load_ms = (time.perf_counter() - started) * 1000
+
+        # Warm up this process's kernels before taking traffic
+        started = time.perf_counter()
+        engine._synthesize_waveform("Warming up.", "en", engine._get_voice_settings("default", "neutral", 1.0, 1.0))
+        warmup_ms = (time.perf_counter() - started) * 1000
+
+        responses.put(("ready", index, {"load_ms": load_ms, "warmup_ms": warmup_ms, "cores": cores}))
+
+    except Exception as e:
+        responses.put(("failed", index, str(e)))
+        return
+
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+
+        request_id, method, args = message
+        try:
+            if method == "synthesize":
+                responses.put(("result", request_id, _publish(engine._synthesize_waveform(*args))))
+            elif method == "condition":
+                engine._condition(*args)
+                responses.put(("result", request_id, None))
+            else:
+                raise ValueError(f"Unknown worker method: {method}")
+
+        except Exception as e:
+            responses.put(("error", request_id, str(e)))
+
+
+class ModelWorkerPool:
+    """Model-serving worker processes, each pinned to its own CPU core set
+
+    Every worker loads its own model and sets its own intra-op thread count, so
+    CPU inference is no longer limited by one process's GIL and thread pool.
+    Waveforms come back through shared memory instead of pickled bytes.
+
+    Requests go to the least busy worker, so every worker's speaker latent
+    cache is backed by one directory: a voice cloned on one worker is found,
+    or recomputed from its stored sample, on the others. When
+    SPEAKER_CACHE_DIR is disabled the workers share a temporary directory
+    that lives as long as the pool.
+    """
+
+    def __init__(
+        self,
+        num_workers: Optional[int] = None,
+        threads_per_worker: Optional[int] = None,
+        engine_factory: Callable = default_engine_factory,
+        speaker_cache_dir: Optional[str] = None
+    ):
+        self.num_workers = num_workers or int(os.getenv("MODEL_WORKERS", "2"))
+        self.core_sets = cpu_sets(self.num_workers)
+        self.threads_per_worker = threads_per_worker or int(
+            os.getenv("MODEL_WORKER_THREADS", str(len(self.core_sets[0])))
+        )
+        self.engine_factory = engine_factory
+        self._temporary_cache_dir = None
+        if speaker_cache_dir is None:
+            speaker_cache_dir = os.getenv("SPEAKER_CACHE_DIR", DEFAULT_CACHE_DIR)
+        if not speaker_cache_dir:
+            speaker_cache_dir = self._temporary_cache_dir = tempfile.mkdtemp(prefix="speaker-cache-")
+        # Absolute, so workers agree on it whatever their working directory
+        self.speaker_cache_dir = os.path.abspath(speaker_cache_dir)
+
+        self._context = mp.get_context("spawn")
+        self._responses = self._context.Queue()
+        self._workers: List[Dict[str, Any]] = []
+        self._futures: Dict[int, asyncio.Future] = {}
+        self._assigned: Dict[int, int] = {}
+        self._request_ids = itertools.count()
+        self._ready: Dict[int, asyncio.Future] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[threading.Thread] = None
+        self._stopping = False
+        self.ready = False
+
+    def _spawn(self, index: int) -> Dict[str, Any]:
+        requests = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(
+                index,
+                self.core_sets[index],
+                self.threads_per_worker,
+                self.engine_factory,
+                self.speaker_cache_dir,
+                requests,
+                self._responses
+            ),
+            name=f"model-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        return {"process": process, "requests": requests, "in_flight": 0, "info": None, "reported": False}
+
+    async def start(self):
+        """Start the workers and wait until each has loaded and warmed its model"""
+        self._loop = asyncio.get_running_loop()
+        self._ready = {index: self._loop.create_future() for index in range(self.num_workers)}
+        self._workers = [self._spawn(index) for index in range(self.num_workers)]
+
+        self._listener = threading.Thread(target=self._listen, name="model-worker-listener", daemon=True)
+        self._listener.start()
+
+        try:
+            await asyncio.gather(*self._ready.values())
+        except Exception:
+            await self.stop()
+            raise
+        self.ready = True
+        logger.info(
+            f"Started {self.num_workers} model workers with {self.threads_per_worker} threads each "
+            f"on cores {self.core_sets}"
+        )
+
+    def _listen(self):
+        """Route worker responses back to the event loop and watch for crashes"""
+        while not self._stopping:
+            try:
+                message = self._responses.get(timeout=LIVENESS_CHECK_SECONDS)
+            except queue.Empty:
+                self._check_workers()
+                continue
+
+            self._loop.call_soon_threadsafe(self._handle, message)
+
+    def _handle(self, message):
+        kind, key, payload = message
+
+        if kind == "ready":
+            self._workers[key]["info"] = payload
+            future = self._ready.get(key)
+            if future and not future.done():
+                future.set_result(payload)
+            return
+
+        if kind == "failed":
+            future = self._ready.get(key)
+            if future and not future.done():
+                future.set_exception(RuntimeError(f"Model worker {key} failed to start: {payload}"))
+            return
+
+        worker_index = self._assigned.pop(key, None)
+        if worker_index is not None:
+            self._workers[worker_index]["in_flight"] -= 1
+
+        future = self._futures.pop(key, None)
+        if kind == "result":
+            wav = self._collect(*payload) if payload is not None else None
+            if future and not future.done():
+                future.set_result(wav)
+        elif future and not future.done():
+            future.set_exception(RuntimeError(payload))
+
+    @staticmethod
+    def _collect(name: str, length: int) -> np.ndarray:
+        """Copy a waveform out of shared memory and free the block"""
+        shm = SharedMemory(name=name)
+        try:
+            return np.ndarray((length,), dtype=np.float32, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def _check_workers(self):
+        for index, worker in enumerate(self._workers):
+            if worker["process"].is_alive() or self._stopping:
+                continue
+
+            if worker["reported"]:
+                continue
+            worker["reported"] = True
+
+            if not self.ready:
+                # Died while starting up: fail start() instead of retrying forever
+                message = ("failed", index, f"exited with code {worker['process'].exitcode}")
+                self._loop.call_soon_threadsafe(self._handle, message)
+                continue
+
+            logger.error(f"Model worker {index} exited with code {worker['process'].exitcode}, restarting")
+            self._loop.call_soon_threadsafe(self._restart_worker, index)
+
+    def _restart_worker(self, index: int):
+        """Fail the requests a crashed worker held and start a replacement"""
+        for request_id, worker_index in list(self._assigned.items()):
+            if worker_index != index:
+                continue
+            del self._assigned[request_id]
+            future = self._futures.pop(request_id, None)
+            if future and not future.done():
+                future.set_exception(RuntimeError(f"Model worker {index} crashed"))
+
+        if not self._stopping:
+            self._workers[index] = self._spawn(index)
+
+    async def _call(self, method: str, *args) -> Optional[np.ndarray]:
+        if not self.ready:
+            raise RuntimeError("Model workers are not running")
+
+        # Least loaded worker first
+        index = min(range(len(self._workers)), key=lambda i: self._workers[i]["in_flight"])
+        request_id = next(self._request_ids)
+        future = self._loop.create_future()
+        self._futures[request_id] = future
+        self._assigned[request_id] = index
+        self._workers[index]["in_flight"] += 1
+
+        self._workers[index]["requests"].put((request_id, method, args))
+        return await future
+
+    @metrics.timed("inference")
+    async def synthesize(self, text: str, language: str, voice_settings: Dict[str, Any]) -> np.ndarray:
+        """Synthesize a waveform on the least busy worker"""
+        return await self._call("synthesize", text, language, voice_settings)
+
+    @metrics.timed("inference")
+    async def condition(self, audio_file: bytes, model: str = "default"):
+        """Compute the speaker latents of a reference sample on the least busy worker
+
+        They land in the shared speaker cache directory, where every worker
+        finds them when the cloned voice is synthesized.
+        """
+        await self._call("condition", audio_file, model)
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-worker state"""
+        return {
+            "workers": [
+                {
+                    "index": index,
+                    "alive": worker["process"].is_alive(),
+                    "in_flight": worker["in_flight"],
+                    **(worker["info"] or {})
+                }
+                for index, worker in enumerate(self._workers)
+            ],
+            "threads_per_worker": self.threads_per_worker,
+            "speaker_cache_dir": self.speaker_cache_dir
+        }
+
+    async def stop(self):
+        """Ask every worker to exit"""
+        self._stopping = True
+        self.ready = False
+        for worker in self._workers:
+            worker["requests"].put(None)
+        for worker in self._workers:
+            await asyncio.get_running_loop().run_in_executor(None, worker["process"].join, 5)
+            if worker["process"].is_alive():
+                worker["process"].terminate()
+        for future in self._futures.values():
+            if not future.done():
+                future.set_exception(RuntimeError("Model workers stopped"))
+        self._futures.clear()
+        if self._temporary_cache_dir:
+            shutil.rmtree(self._temporary_cache_dir, ignore_errors=True)
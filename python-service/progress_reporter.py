@@ -0,0 +1,141 @@
+import os
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from supabase_client import SupabaseClient
+from status_cache import JobStatusCache
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+# How many finished job IDs to remember for dropping late progress updates
+MAX_TRACKED_TERMINAL_JOBS = 10000
+
+
+class ProgressReporter:
+    """Queues job status updates and writes them to the database in batches
+
+    ``report`` never waits on the database. Updates for the same job are
+    collapsed so only the latest state is written, pending updates for all jobs
+    are flushed together every ``flush_interval`` seconds, and terminal states
+    trigger an early flush and are retried until they are delivered. With a
+    ``status_cache`` every update is also applied there right away, so status
+    reads and subscribers see it before the batch is written.
+    """
+
+    def __init__(
+        self,
+        supabase_client: SupabaseClient,
+        flush_interval: Optional[float] = None,
+        status_cache: Optional[JobStatusCache] = None
+    ):
+        self.supabase_client = supabase_client
+        self.status_cache = status_cache
+        self.flush_interval = flush_interval if flush_interval is not None else float(os.getenv("PROGRESS_FLUSH_INTERVAL", "0.5"))
+
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._terminal: "OrderedDict[str, None]" = OrderedDict()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._lock = asyncio.Lock()
+        self._counters = {
+            "reported": 0,
+            "coalesced": 0,
+            "written": 0,
+            "flushes": 0,
+            "failed_writes": 0
+        }
+
+    def report(self, job_id: str, status: str, **fields):
+        """Queue a status update for a job without waiting for the database"""
+        if job_id in self._terminal and status not in TERMINAL_STATUSES:
+            # The job already finished; a late progress update must not undo that
+            return
+
+        if self.status_cache:
+            self.status_cache.update(job_id, status, **fields)
+
+        self._counters["reported"] += 1
+        if job_id in self._pending:
+            self._counters["coalesced"] += 1
+
+        self._pending[job_id] = {"status": status, **fields}
+        if status in TERMINAL_STATUSES:
+            self._terminal[job_id] = None
+            while len(self._terminal) > MAX_TRACKED_TERMINAL_JOBS:
+                self._terminal.popitem(last=False)
+
+        self._ensure_started()
+        if status in TERMINAL_STATUSES:
+            self._wakeup.set()
+
+    def _ensure_started(self):
+        if self._flusher is None:
+            self._wakeup = asyncio.Event()
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Progress flush failed: {str(e)}")
+
+    async def flush(self):
+        """Write every pending update in one batch"""
+        async with self._lock:
+            if not self._pending:
+                return
+
+            batch, self._pending = self._pending, {}
+            updates = [{"job_id": job_id, **fields} for job_id, fields in batch.items()]
+
+            try:
+                failed = await self.supabase_client.bulk_update_job_status(updates)
+            except asyncio.CancelledError:
+                # Interrupted mid-write: keep the batch for the next flush
+                for job_id, fields in batch.items():
+                    self._pending.setdefault(job_id, fields)
+                raise
+            except Exception as e:
+                logger.error(f"Bulk status update failed: {str(e)}")
+                failed = list(batch)
+
+            self._counters["flushes"] += 1
+            self._counters["written"] += len(updates) - len(failed)
+            self._counters["failed_writes"] += len(failed)
+
+            for job_id in failed:
+                # Requeue unless a newer update arrived meanwhile
+                if job_id not in self._pending:
+                    self._pending[job_id] = batch[job_id]
+
+    async def stop(self):
+        """Stop the timer and deliver whatever is still pending"""
+        if self._flusher:
+            # Let an in-progress write finish rather than cutting it off
+            self._stopping = True
+            self._wakeup.set()
+            await self._flusher
+            self._flusher = None
+        await self.flush()
+        if self._pending:
+            logger.error(f"{len(self._pending)} job status updates could not be delivered on shutdown")
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters showing how many writes coalescing saved"""
+        return {
+            "pending": len(self._pending),
+            "flush_interval": self.flush_interval,
+            **self._counters
+        }
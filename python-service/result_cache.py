@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class SynthesisResultCache:
+    """Content-addressed cache of finished TTS results
+
+    Maps a hash of the prepared text and voice settings to the stored object URL
+    of an earlier identical request. Entries live in an in-memory LRU and, when a
+    cache directory is configured, as small JSON files on disk bounded by size.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        cache_dir: Optional[str] = None,
+        max_disk_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        scope: Optional[str] = None
+    ):
+        self.max_entries = max_entries or int(os.getenv("RESULT_CACHE_ENTRIES", "10000"))
+        cache_dir = cache_dir if cache_dir is not None else os.getenv("RESULT_CACHE_DIR")
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_disk_bytes = max_disk_bytes or int(float(os.getenv("RESULT_CACHE_DISK_MB", "64")) * 1024 * 1024)
+        self.ttl_seconds = ttl_seconds or float(os.getenv("RESULT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+        # "user" keeps results private to the requesting user, "global" shares them
+        self.scope = scope or os.getenv("RESULT_CACHE_SCOPE", "user")
+
+        self._disk_bytes = 0
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(p.stat().st_size for p in self.cache_dir.glob("*.json"))
+
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0
+        }
+
+    def key_for(
+        self,
+        text: str,
+        voice_id: str,
+        language: str,
+        emotion: str,
+        speed: float,
+        pitch: float,
+        user_id: Optional[str] = None,
+        output: Optional[Dict[str, Any]] = None,
+        model: Optional[str] = None,
+        effects: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Normalized hash of a prepared text, its voice settings and output encoding"""
+        payload = {
+            "text": text,
+            "voice_id": voice_id,
+            "language": language.lower(),
+            "emotion": emotion,
+            "speed": round(float(speed), 3),
+            "pitch": round(float(pitch), 3),
+            "output": output or {}
+        }
+        if self.scope == "user":
+            payload["user_id"] = user_id
+        if model:
+            payload["model"] = model
+        if effects:
+            payload["effects"] = effects
+
+        encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result for a key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_fresh(entry):
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return dict(entry["result"])
+            if entry is not None:
+                del self._entries[key]
+
+        entry = self._load(key)
+        with self._lock:
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["disk_hits"] += 1
+            self._insert(key, entry)
+            return dict(entry["result"])
+
+    def put(self, key: str, result: Dict[str, Any]):
+        """Remember the result of a finished synthesis"""
+        entry = {"created_at": time.time(), "result": result}
+        with self._lock:
+            self._insert(key, entry)
+            self._counters["stores"] += 1
+        self._persist(key, entry)
+
+    def _is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry["created_at"] < self.ttl_seconds
+
+    def _insert(self, key: str, entry: Dict[str, Any]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _path(self, key: str) -> Optional[Path]:
+        return self.cache_dir / f"{key}.json" if self.cache_dir else None
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        if path is None or not path.exists():
+            return None
+
+        try:
+            entry = json.loads(path.read_text())
+            if not self._is_fresh(entry):
+                path.unlink(missing_ok=True)
+                return None
+            # Refresh mtime so disk eviction stays least-recently-used
+            os.utime(path)
+            return entry
+        except Exception as e:
+            logger.warning(f"Discarding unreadable result cache entry {key}: {str(e)}")
+            path.unlink(missing_ok=True)
+            return None
+
+    def _persist(self, key: str, entry: Dict[str, Any]):
+        path = self._path(key)
+        if path is None:
+            return
+
+        try:
+            previous = path.stat().st_size if path.exists() else 0
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(entry))
+            os.replace(tmp_path, path)
+            self._disk_bytes += path.stat().st_size - previous
+
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+        except Exception as e:
+            logger.warning(f"Failed to persist result cache entry {key}: {str(e)}")
+
+    def _evict_disk(self):
+        """Drop the least recently used files until usage is back under 90% of the budget"""
+        files = [(p.stat(), p) for p in self.cache_dir.glob("*.json")]
+        total = sum(stat.st_size for stat, _ in files)
+        target = self.max_disk_bytes * 0.9
+
+        for stat, path in sorted(files, key=lambda item: item[0].st_mtime):
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= stat.st_size
+            with self._lock:
+                self._counters["evictions"] += 1
+
+        self._disk_bytes = total
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache size and hit counters"""
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["disk_hits"] + self._counters["misses"]
+            hits = self._counters["hits"] + self._counters["disk_hits"]
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "persistent": self.cache_dir is not None,
+                "disk_bytes": self._disk_bytes,
+                "scope": self.scope,
+                "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+                **self._counters
+            }
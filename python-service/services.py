@@ -0,0 +1,134 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, Any, Optional
+
+from inference_pool import InferencePool
+from model_workers import ModelWorkerPool
+from tts_engine import TTSEngine
+from supabase_client import SupabaseClient
+from job_processor import JobProcessor
+from job_scheduler import JobScheduler
+from job_store import JobStore
+from batch_packager import BatchPackager
+from result_cache import SynthesisResultCache
+from progress_reporter import ProgressReporter
+from status_cache import JobStatusCache
+from speech_translation import SpeechTranslator
+import metrics
+
+logger = logging.getLogger(__name__)
+
+class ServiceContainer:
+    """Owns the single set of service instances shared by the whole process"""
+
+    def __init__(self):
+        self.inference_pool = InferencePool()
+        # "process" serves the model from MODEL_WORKERS separate processes
+        self.model_workers = None
+        if os.getenv("SERVING_MODE", "thread") == "process":
+            self.model_workers = ModelWorkerPool()
+        self.tts_engine = TTSEngine(self.inference_pool, model_workers=self.model_workers)
+        self.supabase_client = SupabaseClient()
+        self.speech_translator = SpeechTranslator()
+        self.result_cache = None
+        if os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true":
+            self.result_cache = SynthesisResultCache()
+        # Job status as this process last reported it, for polling and subscriptions
+        self.status_cache = JobStatusCache()
+        self.progress_reporter = ProgressReporter(self.supabase_client, status_cache=self.status_cache)
+        self.job_processor = JobProcessor(
+            self.tts_engine,
+            self.supabase_client,
+            self.result_cache,
+            self.progress_reporter,
+            self.speech_translator
+        )
+        self.job_store = JobStore()
+        # Packages the outputs of a bulk submission once its last job finished
+        self.batch_packager = BatchPackager(self.job_store, self.supabase_client, self.status_cache)
+        self.job_scheduler = JobScheduler(
+            self.job_processor.process_job,
+            store=self.job_store,
+            on_dropped=self.job_processor.drop_job,
+            on_finished=self.batch_packager.job_finished
+        )
+        self.warm_up_enabled = os.getenv("TTS_WARMUP", "true").lower() == "true"
+        self.started_at: Optional[float] = None
+        # Milliseconds spent in each startup step, for /health
+        self.startup_phases: Dict[str, float] = {}
+        self._register_metrics()
+
+    def _register_metrics(self):
+        """Export the JSON stats of each service on /metrics"""
+        metrics.register_stats("scheduler", self.job_scheduler.metrics)
+        metrics.register_stats("batches", self.batch_packager.stats)
+        metrics.register_stats("inference_pool", self.inference_pool.stats)
+        metrics.register_stats("progress_updates", self.progress_reporter.stats)
+        metrics.register_stats("status_cache", self.status_cache.stats)
+        metrics.register_stats("speaker_cache", self.tts_engine.speaker_cache.stats)
+        metrics.register_stats("models", self.tts_engine.models.stats)
+        metrics.register_stats("speech_translation", self.speech_translator.stats)
+        if self.result_cache:
+            metrics.register_stats("result_cache", self.result_cache.stats)
+        if self.tts_engine.batcher:
+            metrics.register_stats("batching", self.tts_engine.batcher.stats)
+        if self.model_workers:
+            metrics.register_stats("model_workers", self.model_workers.stats)
+
+    async def initialize(self):
+        """Load the model once, warm it up and start accepting jobs"""
+        started = time.perf_counter()
+
+        async def timed(phase: str, awaitable):
+            phase_started = time.perf_counter()
+            await awaitable
+            self.startup_phases[phase] = round((time.perf_counter() - phase_started) * 1000, 1)
+
+        # Connecting to Supabase does not need the model, so it overlaps the load
+        await asyncio.gather(
+            timed("model_load_ms", self.tts_engine.initialize()),
+            timed("supabase_ms", self.supabase_client.initialize())
+        )
+        if self.warm_up_enabled:
+            await timed("warmup_ms", self.tts_engine.warm_up())
+        await timed("scheduler_ms", self.job_scheduler.start())
+        self.batch_packager.resume()
+        self.startup_phases["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        self.started_at = time.time()
+        logger.info(f"Service started: {self.startup_phases}")
+
+    async def shutdown(self):
+        """Stop the scheduler and release the model"""
+        await self.job_scheduler.stop()
+        await self.batch_packager.stop()
+        await self.progress_reporter.stop()
+        await self.tts_engine.cleanup()
+        await self.supabase_client.close()
+        self.speech_translator.shutdown()
+        self.inference_pool.shutdown()
+
+    def health(self) -> Dict[str, Any]:
+        """Readiness of each service"""
+        tts_status = self.tts_engine.status()
+        if not self.warm_up_enabled:
+            tts_status["ready"] = tts_status["model_loaded"]
+
+        services = {
+            "tts_engine": tts_status,
+            "job_processor": {
+                "ready": self.started_at is not None,
+                "queue_depth": self.job_scheduler.metrics()["queue_depth"]
+            },
+            "supabase": {
+                "ready": self.supabase_client.is_connected
+            }
+        }
+
+        return {
+            "ready": all(service["ready"] for service in services.values()),
+            "uptime_seconds": round(time.time() - self.started_at, 1) if self.started_at else 0.0,
+            "startup": self.startup_phases,
+            "services": services
+        }
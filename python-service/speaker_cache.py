@@ -0,0 +1,285 @@
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (gpt_cond_latent, speaker_embedding) torch tensors
+SpeakerLatents = Tuple[Any, Any]
+
+# Where latents and reference samples are kept unless SPEAKER_CACHE_DIR says otherwise
+DEFAULT_CACHE_DIR = "./models/speakers"
+
+
+def tensor_nbytes(tensor) -> int:
+    return tensor.element_size() * tensor.nelement()
+
+
+class SpeakerLatentCache:
+    """LRU cache of XTTS speaker latents keyed by reference audio hash and model
+
+    Entries are kept in memory up to a byte budget and written to the cache
+    directory so they survive restarts. The reference samples of cloned voices
+    are stored there too, so latents evicted or never computed here can be
+    computed again from the sample. Files unused for ``ttl_seconds`` are
+    deleted, and the least recently used go first once the directory exceeds
+    its byte budget. An empty SPEAKER_CACHE_DIR keeps everything in memory only.
+    """
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        cache_dir: Optional[str] = None,
+        max_disk_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None
+    ):
+        self.max_bytes = max_bytes or int(float(os.getenv("SPEAKER_CACHE_MB", "256")) * 1024 * 1024)
+        cache_dir = cache_dir if cache_dir is not None else os.getenv("SPEAKER_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_disk_bytes = max_disk_bytes or int(float(os.getenv("SPEAKER_CACHE_DISK_MB", "1024")) * 1024 * 1024)
+        self.ttl_seconds = ttl_seconds or float(os.getenv("SPEAKER_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+        self._entries: "OrderedDict[str, Tuple[SpeakerLatents, int]]" = OrderedDict()
+        self._size = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        # Held while a missing entry is computed, so concurrent misses compute it once
+        self._computing: Dict[str, threading.Lock] = {}
+        self._counters = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "shared_computes": 0,
+            "evictions": 0,
+            "disk_evictions": 0
+        }
+
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._sweep_disk()
+
+    @staticmethod
+    def key_for(audio_bytes: bytes) -> str:
+        """Content hash identifying a reference sample"""
+        return hashlib.sha256(audio_bytes).hexdigest()
+
+    @staticmethod
+    def latents_key(sample_key: str, model: str) -> str:
+        """Key of the latents of a reference sample under one model
+
+        Latents come from the model's conditioning encoder, so each model has
+        its own. Reference samples stay keyed by ``sample_key`` alone.
+        """
+        return f"{sample_key}.{re.sub(r'[^A-Za-z0-9_-]', '_', model)}"
+
+    def get(self, key: str, device: Optional[str] = None) -> Optional[SpeakerLatents]:
+        """Return cached latents, promoting disk entries into memory"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return entry[0]
+
+        latents = self._load(key, device)
+        with self._lock:
+            if latents is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["disk_hits"] += 1
+            self._insert(key, latents)
+            return latents
+
+    def put(self, key: str, latents: SpeakerLatents):
+        """Cache latents in memory and, if configured, on disk"""
+        with self._lock:
+            self._insert(key, latents)
+        self._persist(key, latents)
+
+    def put_reference(self, key: str, audio_bytes: bytes):
+        """Keep the reference sample behind ``key`` so its latents can be recomputed"""
+        path = self._reference_path(key)
+        if path is None:
+            return
+        if path.exists():
+            self._touch(path)
+            return
+
+        try:
+            self._write(path, lambda tmp_path: tmp_path.write_bytes(audio_bytes))
+            self._sweep_disk()
+        except Exception as e:
+            logger.warning(f"Failed to persist reference sample {key}: {str(e)}")
+
+    def reference(self, key: str) -> Optional[bytes]:
+        """The stored reference sample behind ``key``, if any"""
+        path = self._reference_path(key)
+        if path is None or not path.exists():
+            return None
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            # Swept away since the check
+            return None
+        self._touch(path)
+        return data
+
+    def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], SpeakerLatents],
+        device: Optional[str] = None
+    ) -> SpeakerLatents:
+        """Cached latents, else ``compute()`` them once however many threads miss together"""
+        latents = self.get(key, device)
+        if latents is not None:
+            return latents
+
+        with self._lock:
+            key_lock = self._computing.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._counters["shared_computes"] += 1
+                    return entry[0]
+            try:
+                latents = compute()
+                self.put(key, latents)
+            finally:
+                with self._lock:
+                    self._computing.pop(key, None)
+        return latents
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            if key in self._entries:
+                return True
+        return self._path(key) is not None and self._path(key).exists()
+
+    def _insert(self, key: str, latents: SpeakerLatents):
+        if key in self._entries:
+            self._size -= self._entries.pop(key)[1]
+
+        nbytes = sum(tensor_nbytes(t) for t in latents)
+        self._entries[key] = (latents, nbytes)
+        self._size += nbytes
+
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            _, (_, evicted_bytes) = self._entries.popitem(last=False)
+            self._size -= evicted_bytes
+            self._counters["evictions"] += 1
+
+    def _path(self, key: str) -> Optional[Path]:
+        return self.cache_dir / f"{key}.pt" if self.cache_dir else None
+
+    def _reference_path(self, key: str) -> Optional[Path]:
+        return self.cache_dir / f"{key}.ref" if self.cache_dir else None
+
+    @staticmethod
+    def _write(path: Path, write: Callable[[Path], Any]):
+        """Write through a temporary file, so readers never see a partial entry"""
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def _load(self, key: str, device: Optional[str]) -> Optional[SpeakerLatents]:
+        path = self._path(key)
+        if path is None or not path.exists():
+            return None
+
+        import torch
+
+        try:
+            data = torch.load(path, map_location=device or "cpu")
+            self._touch(path)
+            return data["gpt_cond_latent"], data["speaker_embedding"]
+        except Exception as e:
+            logger.warning(f"Discarding unreadable speaker cache entry {key}: {str(e)}")
+            path.unlink(missing_ok=True)
+            return None
+
+    def _persist(self, key: str, latents: SpeakerLatents):
+        path = self._path(key)
+        if path is None or path.exists():
+            return
+
+        import torch
+
+        try:
+            data = {
+                "gpt_cond_latent": latents[0].detach().cpu(),
+                "speaker_embedding": latents[1].detach().cpu()
+            }
+            self._write(path, lambda tmp_path: torch.save(data, tmp_path))
+            self._sweep_disk()
+        except Exception as e:
+            logger.warning(f"Failed to persist speaker latents {key}: {str(e)}")
+
+    @staticmethod
+    def _touch(path: Path):
+        """Refresh mtime so expiry and disk eviction follow last use"""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def _sweep_disk(self):
+        """Delete expired files, then the least recently used until under 90% of the budget
+
+        Files of voices held in memory are in use and stay, whatever their
+        mtime. Worker processes sharing the directory each sweep it, so the
+        budget is applied to what is on disk rather than to a running count.
+        """
+        with self._lock:
+            live = set(self._entries) | {key.split(".", 1)[0] for key in self._entries}
+
+        files = []
+        for path in self.cache_dir.iterdir():
+            if path.suffix not in (".pt", ".ref"):
+                continue
+            try:
+                files.append((path.stat(), path))
+            except FileNotFoundError:
+                continue
+
+        expires_before = time.time() - self.ttl_seconds
+        total = sum(stat.st_size for stat, _ in files)
+        target = self.max_disk_bytes * 0.9 if total > self.max_disk_bytes else total
+        evicted = 0
+
+        for stat, path in sorted(files, key=lambda item: item[0].st_mtime):
+            if path.stem in live:
+                continue
+            if stat.st_mtime >= expires_before and total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= stat.st_size
+            evicted += 1
+
+        with self._lock:
+            self._disk_bytes = total
+            self._counters["disk_evictions"] += evicted
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache size and hit counters"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "persistent": self.cache_dir is not None,
+                "disk_bytes": self._disk_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+                **self._counters
+            }
@@ -0,0 +1,359 @@
+"""Speech translation: transcription, translation and synthesis as overlapping stages
+
+The input audio is cut into speech segments by an energy-based voice
+activity detector. Segments are transcribed in batches by a local Whisper
+model (ASR_MODEL, default ``openai/whisper-base``) and translated by a local
+MarianMT model per language pair (TRANSLATION_MODEL, default
+``Helsinki-NLP/opus-mt-{source}-{target}``, pivoting through English when a
+pair has no model). Both run on CPU through transformers, which TTS already
+depends on; models are loaded on first use.
+
+Transcription, translation and synthesis each run on their own worker and
+hand segments on through small queues. While segment N is translated and
+spoken, segment N+1 is already being transcribed, so a job takes about as
+long as its slowest stage instead of the sum of all three. The first batch
+holds a single segment so audio starts coming out as early as possible.
+
+``benchmarks.fake_model.use_fake_translation`` swaps both models for
+stand-ins, so the pipeline runs offline without downloads.
+"""
+import os
+import re
+import time
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from audio_utils import decode_audio
+from cancellation import CancelToken
+from inference_pool import InferencePool
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Whisper expects 16 kHz input and at most 30 seconds per segment
+ASR_SAMPLE_RATE = 16000
+MAX_SEGMENT_SECONDS = 25.0
+
+# Pause placed between translated segments, taken from the source and clamped
+MIN_GAP_SECONDS = 0.2
+MAX_GAP_SECONDS = 1.0
+
+
+def base_language(code: str) -> str:
+    """Language code without region, as Whisper and Marian name languages ("zh-cn" -> "zh")"""
+    return code.lower().split("-")[0]
+
+
+def detect_speech(
+    wav: np.ndarray,
+    sample_rate: int = ASR_SAMPLE_RATE,
+    frame_ms: int = 30,
+    min_silence_seconds: float = 0.5,
+    min_speech_seconds: float = 0.25,
+    max_segment_seconds: float = MAX_SEGMENT_SECONDS,
+    pad_seconds: float = 0.15
+) -> List[Tuple[int, int]]:
+    """Sample ranges holding speech, split at pauses
+
+    A frame is speech when its energy is well above the recording's noise
+    floor. Pauses shorter than ``min_silence_seconds`` are bridged, and
+    segments longer than ``max_segment_seconds`` are split at their quietest
+    frame so each one fits a single Whisper window.
+    """
+    frame = int(sample_rate * frame_ms / 1000)
+    count = len(wav) // frame
+    if count == 0:
+        return []
+
+    energy = 10 * np.log10(np.mean(wav[:count * frame].reshape(count, frame) ** 2, axis=1) + 1e-10)
+    # Relative to the noise floor, but never so high that steady speech counts as noise
+    threshold = max(-50.0, min(np.percentile(energy, 10) + 12.0, energy.max() - 20.0))
+    voiced = energy > threshold
+
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+    runs = [[start, end] for start, end in zip(edges[::2], edges[1::2])]
+
+    merged: List[List[int]] = []
+    min_gap = int(min_silence_seconds * 1000 / frame_ms)
+    for run in runs:
+        if merged and run[0] - merged[-1][1] < min_gap:
+            merged[-1][1] = run[1]
+        else:
+            merged.append(run)
+
+    min_frames = int(min_speech_seconds * 1000 / frame_ms)
+    max_frames = int(max_segment_seconds * 1000 / frame_ms)
+    spans = []
+    for start, end in merged:
+        if end - start < min_frames:
+            continue
+        while end - start > max_frames:
+            cut = start + max_frames // 2 + int(np.argmin(energy[start + max_frames // 2:start + max_frames]))
+            spans.append((start, cut))
+            start = cut
+        spans.append((start, end))
+
+    pad = int(pad_seconds * sample_rate)
+    return [(max(0, start * frame - pad), min(len(wav), end * frame + pad)) for start, end in spans]
+
+
+@dataclass
+class SpeechSegment:
+    index: int
+    start: float
+    end: float
+    audio: np.ndarray = field(repr=False)
+    text: str = ""
+    translation: str = ""
+
+
+@dataclass
+class TranslationResult:
+    source_language: Optional[str]
+    segments: List[SpeechSegment]
+    waveform: np.ndarray = field(repr=False)
+    # Busy time of each stage and the wall time of the whole pipeline
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def original_text(self) -> str:
+        return " ".join(segment.text for segment in self.segments if segment.text)
+
+    @property
+    def translated_text(self) -> str:
+        return " ".join(segment.translation for segment in self.segments if segment.translation)
+
+
+class WhisperTranscriber:
+    """Batched Whisper transcription with transformers (blocking)"""
+
+    def __init__(self, model_name: Optional[str] = None):
+        self.model_name = model_name or os.getenv("ASR_MODEL", "openai/whisper-base")
+        self._model = None
+        self._processor = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                from transformers import WhisperForConditionalGeneration, WhisperProcessor
+
+                started = time.perf_counter()
+                self._processor = WhisperProcessor.from_pretrained(self.model_name)
+                self._model = WhisperForConditionalGeneration.from_pretrained(self.model_name).eval()
+                logger.info(f"Loaded {self.model_name} in {(time.perf_counter() - started) * 1000:.0f}ms")
+        return self._processor, self._model
+
+    def transcribe(self, audios: List[np.ndarray], language: Optional[str] = None) -> Tuple[List[str], Optional[str]]:
+        """Texts of 16 kHz segments decoded as one batch, and their language
+
+        Without ``language`` Whisper detects it; the language of the first
+        segment is returned.
+        """
+        import torch
+
+        processor, model = self._load()
+        features = processor(audios, sampling_rate=ASR_SAMPLE_RATE, return_tensors="pt").input_features
+        with torch.inference_mode():
+            ids = model.generate(features, language=language, task="transcribe")
+
+        texts = [text.strip() for text in processor.batch_decode(ids, skip_special_tokens=True)]
+        if language is None:
+            prefix = processor.batch_decode(ids[:1], skip_special_tokens=False)[0]
+            detected = re.search(r"<\|([a-z]{2,3})\|>", prefix)
+            language = detected.group(1) if detected else None
+        return texts, language
+
+
+class MarianTranslator:
+    """Local MarianMT translation, one model per language pair (blocking)"""
+
+    def __init__(self, model_template: Optional[str] = None):
+        self.model_template = model_template or os.getenv(
+            "TRANSLATION_MODEL", "Helsinki-NLP/opus-mt-{source}-{target}"
+        )
+        # Missing pairs are cached as None so they are only looked up once
+        self._pairs: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+
+    def _pair(self, source: str, target: str):
+        with self._lock:
+            if (source, target) not in self._pairs:
+                from transformers import MarianMTModel, MarianTokenizer
+
+                name = self.model_template.format(source=source, target=target)
+                try:
+                    self._pairs[(source, target)] = (
+                        MarianTokenizer.from_pretrained(name),
+                        MarianMTModel.from_pretrained(name).eval()
+                    )
+                    logger.info(f"Loaded translation model {name}")
+                except OSError:
+                    logger.info(f"No translation model {name}")
+                    self._pairs[(source, target)] = None
+            return self._pairs[(source, target)]
+
+    def _run(self, texts: List[str], pair) -> List[str]:
+        import torch
+
+        tokenizer, model = pair
+        batch = tokenizer(texts, return_tensors="pt", padding=True, truncation=True)
+        with torch.inference_mode():
+            ids = model.generate(**batch)
+        return [text.strip() for text in tokenizer.batch_decode(ids, skip_special_tokens=True)]
+
+    def translate(self, texts: List[str], source: str, target: str) -> List[str]:
+        """Translate a batch of texts, through English when there is no direct model"""
+        if source == target or not texts:
+            return list(texts)
+
+        pair = self._pair(source, target)
+        if pair is not None:
+            return self._run(texts, pair)
+
+        if "en" not in (source, target):
+            to_english, from_english = self._pair(source, "en"), self._pair("en", target)
+            if to_english is not None and from_english is not None:
+                return self._run(self._run(texts, to_english), from_english)
+
+        raise ValueError(f"No translation model from {source} to {target}")
+
+
+class SpeechTranslator:
+    """Transcribe, translate and re-synthesize speech with the stages overlapped"""
+
+    def __init__(self, transcriber=None, translator=None, batch_size: Optional[int] = None):
+        self.transcriber = transcriber or WhisperTranscriber()
+        self.translator = translator or MarianTranslator()
+        self.batch_size = batch_size or int(os.getenv("ASR_BATCH_SIZE", "8"))
+        # One worker per stage, so different segments are in different stages at once
+        self.asr_pool = InferencePool(max_workers=1)
+        self.translation_pool = InferencePool(max_workers=1)
+
+    def _batches(self, segments: List[SpeechSegment]) -> List[List[SpeechSegment]]:
+        batches = [segments[:1]]
+        for start in range(1, len(segments), self.batch_size):
+            batches.append(segments[start:start + self.batch_size])
+        return [batch for batch in batches if batch]
+
+    async def translate(
+        self,
+        audio_file: bytes,
+        target_language: str,
+        synthesize: Callable[[str], Awaitable[np.ndarray]],
+        sample_rate: int,
+        source_language: Optional[str] = None,
+        cancel_token: Optional[CancelToken] = None,
+        on_progress: Optional[Callable[[int, int], None]] = None
+    ) -> TranslationResult:
+        """Translate the speech in an audio file into speech in ``target_language``
+
+        ``synthesize`` turns a translated text into a waveform at
+        ``sample_rate``. ``on_progress`` is called with the number of
+        segments spoken so far and the total.
+        """
+        started = time.perf_counter()
+        wav = await self.asr_pool.run(decode_audio, audio_file, ASR_SAMPLE_RATE)
+        spans = await self.asr_pool.run(detect_speech, wav)
+        segments = [
+            SpeechSegment(index, start / ASR_SAMPLE_RATE, end / ASR_SAMPLE_RATE, wav[start:end])
+            for index, (start, end) in enumerate(spans)
+        ]
+        logger.info(f"Speech translation: {len(segments)} segments in {len(wav) / ASR_SAMPLE_RATE:.1f}s of audio")
+
+        busy = {"transcribe_ms": 0.0, "translate_ms": 0.0, "synthesize_ms": 0.0}
+        language = base_language(source_language) if source_language else None
+        target = base_language(target_language)
+        transcribed: asyncio.Queue = asyncio.Queue(maxsize=2)
+        translated: asyncio.Queue = asyncio.Queue(maxsize=2)
+        spoken: List[Tuple[SpeechSegment, np.ndarray]] = []
+
+        def check():
+            if cancel_token:
+                cancel_token.check()
+
+        async def transcribe_stage():
+            nonlocal language
+            for batch in self._batches(segments):
+                check()
+                stage_started = time.perf_counter()
+                with metrics.stage("transcribe"):
+                    texts, language = await self.asr_pool.run(
+                        self.transcriber.transcribe, [segment.audio for segment in batch], language
+                    )
+                busy["transcribe_ms"] += (time.perf_counter() - stage_started) * 1000
+                for segment, text in zip(batch, texts):
+                    segment.text = text
+                await transcribed.put(batch)
+            await transcribed.put(None)
+
+        async def translate_stage():
+            while (batch := await transcribed.get()) is not None:
+                check()
+                batch = [segment for segment in batch if segment.text]
+                stage_started = time.perf_counter()
+                with metrics.stage("translate"):
+                    translations = await self.translation_pool.run(
+                        self.translator.translate, [segment.text for segment in batch], language or target, target
+                    )
+                busy["translate_ms"] += (time.perf_counter() - stage_started) * 1000
+                for segment, translation in zip(batch, translations):
+                    segment.translation = translation
+                    await translated.put(segment)
+            await translated.put(None)
+
+        async def synthesize_stage():
+            while (segment := await translated.get()) is not None:
+                check()
+                if segment.translation:
+                    stage_started = time.perf_counter()
+                    spoken.append((segment, await synthesize(segment.translation)))
+                    busy["synthesize_ms"] += (time.perf_counter() - stage_started) * 1000
+                if on_progress:
+                    on_progress(segment.index + 1, len(segments))
+
+        stages = [asyncio.ensure_future(stage()) for stage in (transcribe_stage, translate_stage, synthesize_stage)]
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            for stage in stages:
+                stage.cancel()
+
+        timings = {name: round(ms, 1) for name, ms in busy.items()}
+        timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"Speech translation finished: {timings}")
+
+        return TranslationResult(
+            source_language=language,
+            segments=segments,
+            waveform=self._join(spoken, sample_rate),
+            timings=timings
+        )
+
+    @staticmethod
+    def _join(spoken: List[Tuple[SpeechSegment, np.ndarray]], sample_rate: int) -> np.ndarray:
+        """Concatenate spoken segments with pauses following the source's"""
+        parts = []
+        for position, (segment, wav) in enumerate(spoken):
+            if position:
+                gap = segment.start - spoken[position - 1][0].end
+                parts.append(np.zeros(int(min(max(gap, MIN_GAP_SECONDS), MAX_GAP_SECONDS) * sample_rate), np.float32))
+            parts.append(np.asarray(wav, dtype=np.float32))
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "asr_model": getattr(self.transcriber, "model_name", type(self.transcriber).__name__),
+            "batch_size": self.batch_size,
+            "asr_active": self.asr_pool.active,
+            "translation_active": self.translation_pool.active
+        }
+
+    def shutdown(self):
+        self.asr_pool.shutdown()
+        self.translation_pool.shutdown()
@@ -0,0 +1,181 @@
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+# Events a slow subscriber may fall behind by before the oldest are dropped
+SUBSCRIBER_QUEUE_SIZE = 16
+
+
+class JobStatusCache:
+    """Latest status of recent jobs, pushed to subscribers as it changes
+
+    Jobs run by this process are updated in place by the progress reporter,
+    so their cached row is always at least as new as the database. A job
+    first seen through an update holds only the updated fields until its
+    database row has been read once and merged underneath them. Rows of
+    other jobs are read from the database on a miss and reused for
+    ``remote_ttl`` seconds, or for good once the job has finished.
+    Concurrent misses for the same job share one query.
+    """
+
+    def __init__(self, max_jobs: Optional[int] = None, remote_ttl: Optional[float] = None):
+        self.max_jobs = max_jobs or int(os.getenv("STATUS_CACHE_MAX_JOBS", "10000"))
+        self.remote_ttl = remote_ttl if remote_ttl is not None else float(os.getenv("STATUS_CACHE_DB_TTL", "2"))
+
+        # job_id -> (row, owned by this process, monotonic time it was read, holds the full database row)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._fetching: Dict[str, asyncio.Future] = {}
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "shared_reads": 0,
+            "updates": 0,
+            "events": 0,
+            "dropped_events": 0
+        }
+
+    def update(self, job_id: str, status: str, **fields):
+        """Record a status change of a job run here and notify its subscribers"""
+        entry = self._entries.pop(job_id, None)
+        row = dict(entry[0]) if entry else {"id": job_id}
+        complete = entry[3] if entry else False
+
+        timestamp = datetime.utcnow().isoformat()
+        row.update({key: value for key, value in fields.items() if value is not None})
+        row["status"] = status
+        row["updated_at"] = timestamp
+        if status == "processing":
+            row.setdefault("started_at", timestamp)
+        if fields.get("result_data"):
+            row["completed_at"] = timestamp
+
+        self._store(job_id, row, owned=True, complete=complete)
+        self._counters["updates"] += 1
+        self._notify(job_id, row)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The cached row if it can be trusted without asking the database"""
+        entry = self._entries.get(job_id)
+        if entry is None:
+            return None
+
+        row, owned, read_at, complete = entry
+        if not complete:
+            return None
+        if owned or row.get("status") in TERMINAL_STATUSES or time.monotonic() - read_at < self.remote_ttl:
+            self._entries.move_to_end(job_id)
+            return dict(row)
+        return None
+
+    async def fetch(self, job_id: str, loader: Callable[[str], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Status of a job from the cache, else from ``loader`` (the database)"""
+        row = self.get(job_id)
+        if row is not None:
+            self._counters["hits"] += 1
+            return row
+
+        pending = self._fetching.get(job_id)
+        if pending is not None:
+            self._counters["shared_reads"] += 1
+            return dict(await asyncio.shield(pending))
+
+        self._counters["misses"] += 1
+        pending = self._fetching[job_id] = asyncio.get_running_loop().create_future()
+        try:
+            row = await loader(job_id)
+        except BaseException as e:
+            if self._owned(job_id) and isinstance(e, Exception):
+                # Better the fields we have than no status for a job running here
+                row = self._entries[job_id][0]
+                pending.set_result(row)
+                return dict(row)
+            pending.set_exception(e)
+            # Waiters re-raise it; this marks it retrieved if there were none
+            pending.exception()
+            raise
+        else:
+            # Updates made here, including any during the query, are newer than the database
+            if self._owned(job_id):
+                row = {**row, **self._entries[job_id][0]}
+                self._store(job_id, row, owned=True, complete=True)
+            else:
+                self._store(job_id, row, owned=False)
+            pending.set_result(row)
+            return dict(row)
+        finally:
+            del self._fetching[job_id]
+
+    async def events(
+        self,
+        job_id: str,
+        loader: Callable[[str], Awaitable[Dict[str, Any]]],
+        heartbeat: float = 15.0
+    ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """The current status of a job, then every change until it finishes
+
+        Yields None when nothing changed for ``heartbeat`` seconds, so the
+        caller can keep the connection alive. Jobs run by another process
+        are not pushed here and are re-read every ``remote_ttl`` seconds.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        try:
+            row = await self.fetch(job_id, loader)
+            yield row
+
+            while row.get("status") not in TERMINAL_STATUSES:
+                owned = self._owned(job_id)
+                try:
+                    row = await asyncio.wait_for(queue.get(), heartbeat if owned else min(heartbeat, self.remote_ttl))
+                except asyncio.TimeoutError:
+                    latest = row if owned else await self.fetch(job_id, loader)
+                    if latest == row:
+                        yield None
+                        continue
+                    row = latest
+                yield row
+
+        finally:
+            subscribers = self._subscribers.get(job_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[job_id]
+
+    def _owned(self, job_id: str) -> bool:
+        entry = self._entries.get(job_id)
+        return entry is not None and entry[1]
+
+    def _store(self, job_id: str, row: Dict[str, Any], owned: bool, complete: bool = True):
+        self._entries.pop(job_id, None)
+        self._entries[job_id] = (row, owned, time.monotonic(), complete)
+        while len(self._entries) > self.max_jobs:
+            self._entries.popitem(last=False)
+
+    def _notify(self, job_id: str, row: Dict[str, Any]):
+        for queue in self._subscribers.get(job_id, ()):
+            if queue.full():
+                # Only the latest state matters to a subscriber that fell behind
+                queue.get_nowait()
+                self._counters["dropped_events"] += 1
+            queue.put_nowait(dict(row))
+            self._counters["events"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache size, subscribers and hit counters"""
+        return {
+            "jobs": len(self._entries),
+            "owned_jobs": sum(1 for _, owned, _, _ in self._entries.values() if owned),
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+            "max_jobs": self.max_jobs,
+            **self._counters
+        }
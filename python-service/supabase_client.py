@@ -1,45 +1,180 @@
 import os
+import json
+import base64
+import random
+import asyncio
 import logging
-from typing import Dict, Any, Optional
-from supabase import create_client, Client
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
 from datetime import datetime
-import uuid
+from urllib.parse import quote
+
+import httpx
+
+import metrics
 
 logger = logging.getLogger(__name__)
 
+# Statuses worth retrying: rate limiting and server-side failures
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+TUS_VERSION = "1.0.0"
+# Supabase Storage accepts resumable uploads in parts of exactly 6 MB (except the last)
+TUS_PART_SIZE = 6 * 1024 * 1024
+
+
+class SupabaseError(Exception):
+    """Request to Supabase failed"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class TransientSupabaseError(SupabaseError):
+    """Request failed with a retryable error and retries were exhausted"""
+
+
 class SupabaseClient:
-    def __init__(self):
-        self.client: Optional[Client] = None
-        self.url = os.getenv("SUPABASE_URL")
-        self.service_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-        
+    """Async client for the Supabase REST (PostgREST) and Storage APIs
+
+    Uses one pooled keep-alive HTTP client per process, so database writes and
+    uploads never block the event loop.
+    """
+
+    def __init__(self, url: Optional[str] = None, service_key: Optional[str] = None):
+        self.client: Optional[httpx.AsyncClient] = None
+        self.url = (url or os.getenv("SUPABASE_URL") or "").rstrip("/")
+        self.service_key = service_key or os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+        self.timeout = float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "10"))
+        self.upload_timeout = float(os.getenv("SUPABASE_UPLOAD_TIMEOUT_SECONDS", "60"))
+        self.max_connections = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "20"))
+        self.max_retries = int(os.getenv("SUPABASE_MAX_RETRIES", "3"))
+        self.retry_base_delay = float(os.getenv("SUPABASE_RETRY_BASE_DELAY", "0.2"))
+        self.upload_part_size = int(os.getenv("SUPABASE_UPLOAD_PART_BYTES", str(TUS_PART_SIZE)))
+
+    @property
+    def is_connected(self) -> bool:
+        return self.client is not None
+
     async def initialize(self):
         """Initialize Supabase client"""
+        if self.client is not None:
+            return
+
         try:
             if not self.url or not self.service_key:
                 raise ValueError("Missing Supabase credentials")
-            
-            self.client = create_client(self.url, self.service_key)
+
+            self.client = httpx.AsyncClient(
+                base_url=self.url,
+                headers={
+                    "apikey": self.service_key,
+                    "Authorization": f"Bearer {self.service_key}"
+                },
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=30.0
+                )
+            )
             logger.info("Supabase client initialized successfully")
-            
+
         except Exception as e:
             logger.error(f"Failed to initialize Supabase client: {str(e)}")
             raise
-    
+
+    async def close(self):
+        """Close pooled connections"""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Send a request, retrying transient failures with jittered backoff"""
+        attempt = 0
+        while True:
+            try:
+                response = await self.client.request(method, path, **kwargs)
+                if response.status_code < 400:
+                    return response
+
+                error = f"{method} {path} returned {response.status_code}: {response.text}"
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    raise SupabaseError(error, response.status_code)
+                status_code = response.status_code
+
+            except httpx.TransportError as e:
+                error = f"{method} {path} failed: {str(e)}"
+                status_code = None
+
+            attempt += 1
+            if attempt > self.max_retries:
+                raise TransientSupabaseError(error, status_code)
+
+            # Exponential backoff with full jitter
+            delay = random.uniform(0, self.retry_base_delay * (2 ** (attempt - 1)))
+            logger.warning(f"Retrying Supabase request in {delay:.2f}s ({attempt}/{self.max_retries}): {error}")
+            await asyncio.sleep(delay)
+
     async def get_job_status(self, job_id: str) -> Dict[str, Any]:
         """Get job status from database"""
         try:
-            response = self.client.table("jobs").select("*").eq("id", job_id).single().execute()
-            return response.data
-            
+            response = await self._request(
+                "GET",
+                "/rest/v1/jobs",
+                params={"id": f"eq.{job_id}", "select": "*"},
+                headers={"Accept": "application/vnd.pgrst.object+json"}
+            )
+            return response.json()
+
         except Exception as e:
             logger.error(f"Failed to get job status {job_id}: {str(e)}")
             raise
-    
+
+    def _job_update_data(
+        self,
+        status: str,
+        progress: int = None,
+        progress_message: str = None,
+        result_data: Dict[str, Any] = None,
+        error_code: str = None,
+        error_message: str = None,
+        timestamp: str = None
+    ) -> Dict[str, Any]:
+        """Build the column values for a job status update"""
+        timestamp = timestamp or datetime.utcnow().isoformat()
+        update_data = {
+            "status": status,
+            "updated_at": timestamp
+        }
+
+        if progress is not None:
+            update_data["progress"] = progress
+
+        if progress_message:
+            update_data["progress_message"] = progress_message
+
+        if result_data:
+            update_data["result_data"] = result_data
+            update_data["completed_at"] = timestamp
+
+        if error_code:
+            update_data["error_code"] = error_code
+
+        if error_message:
+            update_data["error_message"] = error_message
+
+        if status == "processing" and "started_at" not in update_data:
+            update_data["started_at"] = timestamp
+
+        return update_data
+
+    @metrics.timed("db_update")
     async def update_job_status(
-        self, 
-        job_id: str, 
-        status: str, 
+        self,
+        job_id: str,
+        status: str,
         progress: int = None,
         progress_message: str = None,
         result_data: Dict[str, Any] = None,
@@ -48,88 +183,281 @@ class SupabaseClient:
     ):
         """Update job status in database"""
         try:
-            update_data = {
-                "status": status,
-                "updated_at": datetime.utcnow().isoformat()
-            }
-            
-            if progress is not None:
-                update_data["progress"] = progress
-            
-            if progress_message:
-                update_data["progress_message"] = progress_message
-            
-            if result_data:
-                update_data["result_data"] = result_data
-                update_data["completed_at"] = datetime.utcnow().isoformat()
-            
-            if error_code:
-                update_data["error_code"] = error_code
-            
-            if error_message:
-                update_data["error_message"] = error_message
-            
-            if status == "processing" and "started_at" not in update_data:
-                update_data["started_at"] = datetime.utcnow().isoformat()
-            
-            response = self.client.table("jobs").update(update_data).eq("id", job_id).execute()
-            
+            update_data = self._job_update_data(
+                status,
+                progress=progress,
+                progress_message=progress_message,
+                result_data=result_data,
+                error_code=error_code,
+                error_message=error_message
+            )
+
+            await self._request(
+                "PATCH",
+                "/rest/v1/jobs",
+                params={"id": f"eq.{job_id}"},
+                json=update_data,
+                headers={"Prefer": "return=minimal"}
+            )
+
             logger.info(f"Updated job {job_id} status to {status}")
-            
+
         except Exception as e:
             logger.error(f"Failed to update job status {job_id}: {str(e)}")
             raise
-    
-    async def upload_audio(self, audio_data: bytes, file_path: str) -> str:
+
+    @metrics.timed("db_update")
+    async def bulk_update_job_status(self, updates: List[Dict[str, Any]]) -> List[str]:
+        """Apply many job status updates at once, returning the IDs that failed
+
+        Each update holds ``job_id``, ``status`` and the optional fields of
+        update_job_status. Jobs receiving identical values share one request;
+        the remaining requests run concurrently over the connection pool.
+        """
+        timestamp = datetime.utcnow().isoformat()
+        groups: Dict[str, Tuple[Dict[str, Any], List[str]]] = {}
+        for update in updates:
+            fields = {key: value for key, value in update.items() if key != "job_id"}
+            update_data = self._job_update_data(timestamp=timestamp, **fields)
+            signature = json.dumps(update_data, sort_keys=True, default=str)
+            groups.setdefault(signature, (update_data, []))[1].append(update["job_id"])
+
+        async def send(update_data: Dict[str, Any], job_ids: List[str]):
+            await self._request(
+                "PATCH",
+                "/rest/v1/jobs",
+                params={"id": f"in.({','.join(job_ids)})"},
+                json=update_data,
+                headers={"Prefer": "return=minimal"}
+            )
+
+        batches = list(groups.values())
+        results = await asyncio.gather(
+            *(send(update_data, job_ids) for update_data, job_ids in batches),
+            return_exceptions=True
+        )
+
+        failed = []
+        for (_, job_ids), result in zip(batches, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to update {len(job_ids)} job statuses: {str(result)}")
+                failed.extend(job_ids)
+
+        logger.info(f"Bulk updated {len(updates) - len(failed)} job statuses in {len(batches)} requests")
+        return failed
+
+    @metrics.timed("upload")
+    async def upload_audio(self, audio_data: bytes, file_path: str, content_type: str = "audio/wav") -> str:
         """Upload audio file to Supabase storage"""
         try:
-            # Upload to audio-outputs bucket
-            response = self.client.storage.from_("audio-outputs").upload(
-                file_path, 
-                audio_data,
-                file_options={"content-type": "audio/wav"}
+            # Upload to audio-outputs bucket; upsert keeps retried uploads idempotent
+            await self._request(
+                "POST",
+                f"/storage/v1/object/audio-outputs/{quote(file_path)}",
+                content=audio_data,
+                headers={"Content-Type": content_type, "x-upsert": "true"},
+                timeout=self.upload_timeout
             )
-            
-            if response.error:
-                raise Exception(f"Upload failed: {response.error}")
-            
+
             # Get public URL
-            public_url = self.client.storage.from_("audio-outputs").get_public_url(file_path)
-            
+            public_url = self.get_public_url(file_path)
+
             logger.info(f"Audio uploaded successfully: {file_path}")
             return public_url
-            
+
         except Exception as e:
             logger.error(f"Failed to upload audio {file_path}: {str(e)}")
             raise
-    
+
+    async def upload_audio_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        file_path: str,
+        content_type: str,
+        bucket: str = "audio-outputs"
+    ) -> str:
+        """Upload audio while it is being produced, using a resumable (TUS) upload
+
+        Chunks are collected into parts of ``upload_part_size`` bytes and each
+        part is sent as soon as it is full, so at most one part is held in
+        memory. A failed part is resumed from the offset the server
+        acknowledged instead of restarting the whole file.
+        """
+        upload_url = None
+        try:
+            upload_url = await self._create_resumable_upload(file_path, content_type, bucket)
+
+            offset = 0
+            buffer = bytearray()
+            async for chunk in chunks:
+                buffer += chunk
+                while len(buffer) >= self.upload_part_size:
+                    offset = await self._upload_part(upload_url, offset, bytes(buffer[:self.upload_part_size]))
+                    del buffer[:self.upload_part_size]
+
+            # The last part also declares the total length, which completes the upload
+            offset = await self._upload_part(upload_url, offset, bytes(buffer), upload_length=offset + len(buffer))
+
+            logger.info(f"Audio streamed successfully: {file_path} ({offset} bytes)")
+            return self.get_public_url(file_path, bucket)
+
+        except Exception as e:
+            logger.error(f"Failed to stream audio {file_path}: {str(e)}")
+            if upload_url:
+                await self._abort_resumable_upload(upload_url)
+            raise
+
+        finally:
+            aclose = getattr(chunks, "aclose", None)
+            if aclose:
+                await aclose()
+
+    @staticmethod
+    def _tus_metadata(values: Dict[str, str]) -> str:
+        return ",".join(
+            f"{key} {base64.b64encode(value.encode('utf-8')).decode('ascii')}"
+            for key, value in values.items()
+        )
+
+    async def _create_resumable_upload(self, file_path: str, content_type: str, bucket: str) -> str:
+        """Start a resumable upload of unknown length and return its URL"""
+        response = await self._request(
+            "POST",
+            "/storage/v1/upload/resumable",
+            headers={
+                "Tus-Resumable": TUS_VERSION,
+                "Upload-Defer-Length": "1",
+                "Upload-Metadata": self._tus_metadata({
+                    "bucketName": bucket,
+                    "objectName": file_path,
+                    "contentType": content_type
+                }),
+                "x-upsert": "true"
+            }
+        )
+        return response.headers["Location"]
+
+    async def _upload_offset(self, upload_url: str) -> int:
+        """Bytes the server has stored for an upload"""
+        response = await self._request("HEAD", upload_url, headers={"Tus-Resumable": TUS_VERSION})
+        return int(response.headers["Upload-Offset"])
+
+    @metrics.timed("upload")
+    async def _upload_part(self, upload_url: str, offset: int, data: bytes, upload_length: Optional[int] = None) -> int:
+        """Send one part, resuming from the acknowledged offset after a failure"""
+        start = offset
+        attempt = 0
+        while True:
+            headers = {
+                "Tus-Resumable": TUS_VERSION,
+                "Upload-Offset": str(offset),
+                "Content-Type": "application/offset+octet-stream"
+            }
+            if upload_length is not None:
+                headers["Upload-Length"] = str(upload_length)
+
+            try:
+                response = await self.client.patch(
+                    upload_url,
+                    content=data[offset - start:],
+                    headers=headers,
+                    timeout=self.upload_timeout
+                )
+                if response.status_code < 400:
+                    return int(response.headers["Upload-Offset"])
+
+                error = f"PATCH {upload_url} returned {response.status_code}: {response.text}"
+                # 409: our offset disagrees with the server's, which a resync fixes
+                if response.status_code not in RETRYABLE_STATUS_CODES and response.status_code != 409:
+                    raise SupabaseError(error, response.status_code)
+                status_code = response.status_code
+
+            except httpx.TransportError as e:
+                error = f"PATCH {upload_url} failed: {str(e)}"
+                status_code = None
+
+            attempt += 1
+            if attempt > self.max_retries:
+                raise TransientSupabaseError(error, status_code)
+
+            delay = random.uniform(0, self.retry_base_delay * (2 ** (attempt - 1)))
+            logger.warning(f"Resuming upload part in {delay:.2f}s ({attempt}/{self.max_retries}): {error}")
+            await asyncio.sleep(delay)
+
+            # Whatever reached the server before the failure is not sent again
+            offset = await self._upload_offset(upload_url)
+            if not start <= offset <= start + len(data):
+                raise SupabaseError(f"Upload offset {offset} is outside the part at {start}")
+            if offset == start + len(data) and data:
+                # The part arrived; only the acknowledgement was lost
+                return offset
+
+    async def _abort_resumable_upload(self, upload_url: str):
+        try:
+            await self.client.delete(upload_url, headers={"Tus-Resumable": TUS_VERSION})
+        except Exception as e:
+            logger.warning(f"Failed to abort resumable upload: {str(e)}")
+
+    def get_public_url(self, file_path: str, bucket: str = "audio-outputs") -> str:
+        """Public URL of an object in storage"""
+        return f"{self.url}/storage/v1/object/public/{bucket}/{quote(file_path)}"
+
+    async def download_object(self, public_url: str) -> bytes:
+        """Download an object by its public URL, authenticated so private buckets work too"""
+        prefix = f"{self.url}/storage/v1/object/public/"
+        if not public_url.startswith(prefix):
+            raise SupabaseError(f"Not a storage URL of this project: {public_url}")
+
+        try:
+            response = await self._request(
+                "GET",
+                f"/storage/v1/object/{public_url[len(prefix):]}",
+                timeout=self.upload_timeout
+            )
+            return response.content
+
+        except Exception as e:
+            logger.error(f"Failed to download {public_url}: {str(e)}")
+            raise
+
     async def get_user_profile(self, user_id: str) -> Dict[str, Any]:
         """Get user profile information"""
         try:
-            response = self.client.table("profiles").select("*").eq("id", user_id).single().execute()
-            return response.data
-            
+            response = await self._request(
+                "GET",
+                "/rest/v1/profiles",
+                params={"id": f"eq.{user_id}", "select": "*"},
+                headers={"Accept": "application/vnd.pgrst.object+json"}
+            )
+            return response.json()
+
         except Exception as e:
             logger.error(f"Failed to get user profile {user_id}: {str(e)}")
             raise
-    
+
     async def update_user_usage(self, user_id: str, minutes_used: float):
         """Update user's monthly usage"""
         try:
             # Get current usage
             profile = await self.get_user_profile(user_id)
             current_usage = profile.get("usage_this_month", 0)
-            
+
             # Update usage
             new_usage = current_usage + minutes_used
-            
-            response = self.client.table("profiles").update({
-                "usage_this_month": new_usage,
-                "updated_at": datetime.utcnow().isoformat()
-            }).eq("id", user_id).execute()
-            
+
+            await self._request(
+                "PATCH",
+                "/rest/v1/profiles",
+                params={"id": f"eq.{user_id}"},
+                json={
+                    "usage_this_month": new_usage,
+                    "updated_at": datetime.utcnow().isoformat()
+                },
+                headers={"Prefer": "return=minimal"}
+            )
+
             logger.info(f"Updated user {user_id} usage: +{minutes_used} minutes")
-            
+
         except Exception as e:
             logger.error(f"Failed to update user usage {user_id}: {str(e)}")
-            raise
\ No newline at end of file
+            raise
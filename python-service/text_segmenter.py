@@ -0,0 +1,136 @@
+import re
+from dataclasses import dataclass
+from typing import List
+
+# Per-language character limits of the XTTS v2 tokenizer
+XTTS_CHAR_LIMITS = {
+    "en": 250, "de": 253, "fr": 273, "es": 239, "it": 213, "pt": 203,
+    "pl": 224, "zh": 82, "zh-cn": 82, "ar": 166, "cs": 186, "ru": 182,
+    "nl": 251, "tr": 226, "ja": 71, "hu": 224, "ko": 95, "hi": 150
+}
+DEFAULT_CHAR_LIMIT = 200
+
+# Languages written without spaces between words
+UNSPACED_LANGUAGES = {"zh", "zh-cn", "ja"}
+
+SENTENCE_TERMINATORS = {
+    "default": ".!?",
+    "zh": "。！？!?",
+    "zh-cn": "。！？!?",
+    "ja": "。！？!?",
+    "hi": "।.!?",
+    "ar": ".!?؟",
+}
+
+CLAUSE_SEPARATORS = {
+    "default": ",;:",
+    "zh": "，；：、,;:",
+    "zh-cn": "，；：、,;:",
+    "ja": "、，；：,;:",
+    "ar": "،؛,;:",
+}
+
+# Abbreviations that end in a period without ending the sentence
+ABBREVIATIONS = {
+    "en": {"mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e", "no", "inc", "ltd"},
+    "de": {"z.b", "bzw", "usw", "dr", "prof", "nr", "str", "ca"},
+    "fr": {"m", "mme", "mlle", "dr", "p.ex", "etc", "env"},
+    "es": {"sr", "sra", "srta", "dr", "dra", "etc", "ud", "uds"},
+}
+
+
+@dataclass
+class TextSegment:
+    text: str
+    # Kind of break that follows this segment: "sentence", "clause" or "word"
+    boundary: str = "sentence"
+
+
+def char_limit(language: str) -> int:
+    return XTTS_CHAR_LIMITS.get(language.lower(), DEFAULT_CHAR_LIMIT)
+
+
+def _lookup(table: dict, language: str):
+    return table.get(language.lower(), table["default"])
+
+
+def split_sentences(text: str, language: str = "en") -> List[str]:
+    """Split text into sentences using the language's terminators"""
+    language = language.lower()
+    terminators = re.escape(_lookup(SENTENCE_TERMINATORS, language))
+    abbreviations = ABBREVIATIONS.get(language, set())
+
+    if language in UNSPACED_LANGUAGES:
+        pattern = re.compile(rf"[^{terminators}]*[{terminators}]+|[^{terminators}]+$")
+        return [s.strip() for s in pattern.findall(text) if s.strip()]
+
+    sentences = []
+    current = ""
+    for piece in re.split(rf"(?<=[{terminators}])\s+", text):
+        current = f"{current} {piece}" if current else piece
+        last_word = current.rsplit(" ", 1)[-1].rstrip(".").lower()
+        if current.endswith(".") and last_word in abbreviations:
+            continue
+        sentences.append(current.strip())
+        current = ""
+
+    if current.strip():
+        sentences.append(current.strip())
+    return [s for s in sentences if s]
+
+
+def _split_long(sentence: str, language: str, limit: int) -> List[TextSegment]:
+    """Break an over-long sentence at clause boundaries, then at words"""
+    separators = re.escape(_lookup(CLAUSE_SEPARATORS, language))
+    clauses = [c.strip() for c in re.split(rf"(?<=[{separators}])\s*", sentence) if c.strip()]
+
+    joiner = "" if language in UNSPACED_LANGUAGES else " "
+
+    segments = []
+    for clause in clauses:
+        while len(clause) > limit:
+            if language in UNSPACED_LANGUAGES:
+                cut = limit
+            else:
+                cut = clause.rfind(" ", 0, limit)
+                cut = cut if cut > 0 else limit
+            segments.append(TextSegment(clause[:cut].strip(), "word"))
+            clause = clause[cut:].strip()
+        if not clause:
+            continue
+
+        # Pack short clauses together while they fit
+        previous = segments[-1] if segments else None
+        if previous and previous.boundary == "clause" and len(previous.text) + len(joiner) + len(clause) <= limit:
+            previous.text = f"{previous.text}{joiner}{clause}"
+        else:
+            segments.append(TextSegment(clause, "clause"))
+
+    if segments:
+        segments[-1].boundary = "sentence"
+    return segments
+
+
+def segment_text(text: str, language: str = "en", max_chars: int = None, pack: bool = True) -> List[TextSegment]:
+    """Split prepared text into chunks that fit the model's character limit
+
+    With ``pack`` sentences are joined while they fit; sentences longer than the
+    limit are broken at clause separators and, as a last resort, between words.
+    """
+    language = language.lower()
+    limit = max_chars or char_limit(language)
+    joiner = "" if language in UNSPACED_LANGUAGES else " "
+
+    segments: List[TextSegment] = []
+    for sentence in split_sentences(text, language):
+        if len(sentence) > limit:
+            segments.extend(_split_long(sentence, language, limit))
+            continue
+
+        previous = segments[-1] if segments else None
+        if pack and previous and previous.boundary == "sentence" and len(previous.text) + len(joiner) + len(sentence) <= limit:
+            previous.text = f"{previous.text}{joiner}{sentence}"
+        else:
+            segments.append(TextSegment(sentence, "sentence"))
+
+    return segments
@@ -1,38 +1,170 @@
 import os
-import torch
+import time
+import asyncio
 import numpy as np
-from TTS.api import TTS
-from TTS.tts.configs.xtts_config import XttsConfig
-from TTS.tts.models.xtts import Xtts
-import soundfile as sf
 import logging
-from typing import Optional, Dict, Any
-import tempfile
+from typing import Optional, Dict, Any, AsyncIterator, List
+from collections import deque
 from pathlib import Path
 
+from inference_pool import InferencePool
+from audio_utils import (
+    float_to_pcm16, decode_audio, encode_audio, encode_wav, AudioFormat, AudioStitcher, EncodedAudio, StreamingEncoder
+)
+from audio_effects import AudioEffects, EffectChain
+from cancellation import CancelToken, JobCancelled
+from text_segmenter import TextSegment, segment_text
+from speaker_cache import SpeakerLatentCache
+from batcher import InferenceBatcher
+from model_workers import ModelWorkerPool
+from model_registry import DEFAULT_MODEL, ModelRegistry, ModelSpec
+import model_loader
+import inference_backends
+import metrics
+
 logger = logging.getLogger(__name__)
 
+# XTTS computes conditioning latents from 22.05 kHz reference audio
+XTTS_REFERENCE_SAMPLE_RATE = 22050
+
+# Voice IDs of cloned voices are this prefix plus the reference audio hash
+CLONED_VOICE_PREFIX = "clone-"
+
 class TTSEngine:
-    def __init__(self):
-        self.model = None
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+    def __init__(
+        self,
+        inference_pool: Optional[InferencePool] = None,
+        speaker_cache: Optional[SpeakerLatentCache] = None,
+        model_workers: Optional[ModelWorkerPool] = None
+    ):
+        self.inference_pool = inference_pool or InferencePool()
+        # When set, inference runs in separate model worker processes instead of here
+        self.model_workers = model_workers
+        self.speaker_cache = speaker_cache or SpeakerLatentCache()
+        self._speaker_file_keys: Dict[str, str] = {}
+        self.batcher: Optional[InferenceBatcher] = None
+        if os.getenv("TTS_BATCHING", "false").lower() == "true":
+            self.batcher = InferenceBatcher(self._run_batch)
+        # Resolved when the model loads, so importing this module does not import torch
+        self.device: Optional[str] = None
         self.sample_rate = 24000
-        self.models_cache = {}
+        # Every loaded model by key; "default" is the XTTS model in TTS_MODEL_DIR
+        self.models = ModelRegistry(lambda spec: self._load_model(spec))
+        self.load_ms: Optional[float] = None
+        self.load_phases: Dict[str, float] = {}
+        # TTS_BACKEND: reference, int8, compile or onnx (see inference_backends)
+        self.backend = os.getenv("TTS_BACKEND", "reference")
+        self.backend_info: Dict[str, Any] = {"requested": self.backend, "active": "reference"}
+        self.warmup_ms: Optional[float] = None
+        self.warmup_error: Optional[str] = None
         
     async def initialize(self):
         """Initialize TTS models"""
+        if self.model_loaded:
+            return
+
         try:
-            logger.info(f"Initializing TTS engine on {self.device}")
+            logger.info("Initializing TTS engine")
             
             # Initialize default XTTS model
-            self.model = TTS("tts_models/multilingual/multi-dataset/xtts_v2").to(self.device)
+            started = time.perf_counter()
+            if self.model_workers:
+                self.device = await self.inference_pool.run(model_loader.default_device)
+                await self.model_workers.start()
+            else:
+                await self.inference_pool.run(self.models.preload)
+            self.load_ms = (time.perf_counter() - started) * 1000
             
-            logger.info("TTS engine initialized successfully")
+            logger.info(f"TTS engine initialized successfully on {self.device} in {self.load_ms:.0f}ms")
             
         except Exception as e:
             logger.error(f"Failed to initialize TTS engine: {str(e)}")
             raise
     
+    async def warm_up(self, text: str = "Warming up the speech engine."):
+        """Run one short synthesis so lazy kernel setup happens before real traffic"""
+        try:
+            started = time.perf_counter()
+            await self.synthesize_speech(text)
+            self.warmup_ms = (time.perf_counter() - started) * 1000
+            self.warmup_error = None
+            logger.info(f"TTS engine warm-up completed in {self.warmup_ms:.0f}ms")
+
+        except Exception as e:
+            self.warmup_error = str(e)
+            logger.warning(f"TTS engine warm-up failed: {str(e)}")
+
+    @property
+    def model(self):
+        """The default model, if it is loaded"""
+        return self.models.peek(DEFAULT_MODEL)
+
+    @model.setter
+    def model(self, model):
+        if model is None:
+            self.models.unload(DEFAULT_MODEL)
+        else:
+            self.models.put(DEFAULT_MODEL, model)
+
+    @property
+    def model_loaded(self) -> bool:
+        if self.model_workers:
+            return self.model_workers.ready
+        return self.model is not None
+
+    @property
+    def is_ready(self) -> bool:
+        return self.model_loaded and self.warmup_ms is not None
+
+    def status(self) -> Dict[str, Any]:
+        """Readiness details for the health endpoint"""
+        return {
+            "ready": self.is_ready,
+            "model_loaded": self.model_loaded,
+            "device": self.device,
+            "serving_mode": "process" if self.model_workers else "thread",
+            "load_ms": round(self.load_ms, 1) if self.load_ms is not None else None,
+            "load_phases": {name: round(ms, 1) for name, ms in self.load_phases.items()},
+            "backend": self.backend_info,
+            "models": sorted(self.models.stats()["resident"]),
+            "warmup_ms": round(self.warmup_ms, 1) if self.warmup_ms is not None else None,
+            "warmup_error": self.warmup_error
+        }
+
+    def _load_model(self, spec: Optional[ModelSpec] = None):
+        """Load an XTTS model from its model directory, the default one if no spec is given (blocking)"""
+        spec = spec or self.models.specs[DEFAULT_MODEL]
+        self.device = self.device or model_loader.default_device()
+        model, phases = model_loader.load(self.device, spec.directory)
+
+        backend_info = {"requested": self.backend, "active": "reference"}
+        if self.backend != "reference":
+            started = time.perf_counter()
+            xtts = self._unwrap(model)
+            backend_info = inference_backends.apply_backend(
+                xtts,
+                self.backend,
+                self.device,
+                self._parity_latents(xtts),
+                cache_dir=spec.directory
+            )
+            phases["backend_ms"] = (time.perf_counter() - started) * 1000
+
+        if spec.key == DEFAULT_MODEL:
+            self.load_phases, self.backend_info = phases, backend_info
+        return model
+
+    def _parity_latents(self, xtts):
+        """Speaker latents for the backend parity check: a built-in speaker, else a synthetic reference"""
+        speakers = getattr(getattr(xtts, "speaker_manager", None), "speakers", None)
+        if speakers:
+            speaker = next(iter(speakers.values()))
+            return speaker["gpt_cond_latent"], speaker["speaker_embedding"]
+
+        t = np.arange(3 * XTTS_REFERENCE_SAMPLE_RATE, dtype=np.float32) / XTTS_REFERENCE_SAMPLE_RATE
+        tone = 0.3 * np.sin(2 * np.pi * 140 * t) * (1 + 0.5 * np.sin(2 * np.pi * 3 * t))
+        return self._compute_speaker_latents(encode_wav(tone, XTTS_REFERENCE_SAMPLE_RATE), xtts)
+
     async def synthesize_speech(
         self, 
         text: str, 
@@ -40,47 +172,407 @@ class TTSEngine:
         language: str = "en",
         emotion: str = "neutral",
         speed: float = 1.0,
-        pitch: float = 1.0
-    ) -> bytes:
-        """Synthesize speech from text"""
+        pitch: float = 1.0,
+        cancel_token: Optional[CancelToken] = None,
+        audio_format: Optional[AudioFormat] = None,
+        model: Optional[str] = None,
+        effects: Optional[AudioEffects] = None
+    ) -> EncodedAudio:
+        """Synthesize speech from text, encoded as ``audio_format`` (WAV by default)
+
+        Encoding runs in the inference pool after synthesis. With a ``cancel_token`` the token is checked before every segment and
+        waits are abandoned as soon as the job is cancelled or expires, so no
+        further model time is spent on it. ``model`` names a registered model;
+        by default the model serving ``language`` is used. ``effects``
+        overrides ``speed`` and ``pitch`` with the full post-processing settings.
+        """
         try:
             logger.info(f"Synthesizing speech: {len(text)} chars, voice={voice_id}, lang={language}")
             
-            # Clean and prepare text
-            text = self._prepare_text(text)
-            
-            # Get voice settings
-            voice_settings = self._get_voice_settings(voice_id, emotion, speed, pitch)
+            with metrics.stage("text_prep"):
+                # Clean and prepare text
+                text = self._prepare_text(text)
+
+                # Get voice settings
+                voice_settings = self._get_voice_settings(voice_id, emotion, speed, pitch, language, model)
+                effects = effects or AudioEffects.from_input({"speed": speed, "pitch": pitch})
+
+                # Long texts are split to fit the model and synthesized in parallel
+                segments = segment_text(text, language)
             
-            # Generate audio
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
-                if hasattr(self.model, 'tts_to_file'):
-                    # XTTS model
-                    self.model.tts_to_file(
-                        text=text,
-                        file_path=tmp_file.name,
-                        speaker_wav=voice_settings.get("speaker_wav"),
-                        language=language
-                    )
-                else:
-                    # Fallback for other models
-                    wav = self.model.tts(text=text, language=language)
-                    sf.write(tmp_file.name, wav, self.sample_rate)
-                
-                # Read generated audio
-                with open(tmp_file.name, 'rb') as f:
-                    audio_data = f.read()
-                
-                # Cleanup
-                os.unlink(tmp_file.name)
-                
-                logger.info(f"Speech synthesis completed: {len(audio_data)} bytes")
-                return audio_data
-                
+            # Generate audio off the event loop
+            if len(segments) > 1:
+                pcm = await self._synthesize_segments(segments, language, voice_settings, cancel_token, effects)
+                audio = await self.inference_pool.run(encode_audio, pcm, self.sample_rate, audio_format)
+            elif self.batcher:
+                wav = await self._guard(
+                    self.batcher.submit(
+                        (language, voice_settings["speaker_key"], voice_settings["model"]),
+                        (text, language, voice_settings)
+                    ),
+                    cancel_token
+                )
+                audio = await self.inference_pool.run(self.encode_output, wav, effects, audio_format)
+            elif self.model_workers:
+                wav = await self._guard(self.model_workers.synthesize(text, language, voice_settings), cancel_token)
+                audio = await self.inference_pool.run(self.encode_output, wav, effects, audio_format)
+            else:
+                audio = await self._guard(
+                    self.inference_pool.run(
+                        self._synthesize_encoded, text, language, voice_settings, audio_format, effects
+                    ),
+                    cancel_token
+                )
+
+            logger.info(
+                f"Speech synthesis completed: {audio.duration_ms}ms as {audio.content_type}, {audio.size_bytes} bytes"
+            )
+            return audio
+
+        except JobCancelled as e:
+            logger.info(f"Speech synthesis stopped: {e.reason}")
+            raise
+
         except Exception as e:
             logger.error(f"Speech synthesis failed: {str(e)}")
             raise
-    
+
+    def _synthesize_encoded(
+        self,
+        text: str,
+        language: str,
+        voice_settings: Dict[str, Any],
+        audio_format: Optional[AudioFormat] = None,
+        effects: Optional[AudioEffects] = None
+    ) -> EncodedAudio:
+        """Run the model and encode the result in memory (blocking, runs in the inference pool)"""
+        wav = self._synthesize_waveform(text, language, voice_settings)
+        return self.encode_output(wav, effects, audio_format)
+
+    def encode_output(
+        self,
+        wav: np.ndarray,
+        effects: Optional[AudioEffects] = None,
+        audio_format: Optional[AudioFormat] = None
+    ) -> EncodedAudio:
+        """Post-process a whole waveform and encode it (blocking, runs in the inference pool)"""
+        if effects is not None:
+            wav = effects.apply(wav, self.sample_rate)
+        return encode_audio(wav, self.sample_rate, audio_format)
+
+    async def _synthesize_segments(
+        self,
+        segments: List[TextSegment],
+        language: str,
+        voice_settings: Dict[str, Any],
+        cancel_token: Optional[CancelToken] = None,
+        effects: Optional[AudioEffects] = None
+    ) -> np.ndarray:
+        """Synthesize segments across the worker pool and stitch them into 16-bit PCM
+
+        Finished audio is kept as 16-bit PCM, so working memory is half that of
+        float samples and the model side only ever holds a window of segments.
+        """
+        pcm = bytearray()
+        async for wav in self._stitched_segments(segments, language, voice_settings, cancel_token, effects):
+            pcm += float_to_pcm16(wav)
+
+        logger.info(f"Stitched {len(segments)} segments into {len(pcm) // 2} samples")
+        return np.frombuffer(pcm, dtype=np.int16)
+
+    async def _stitched_segments(
+        self,
+        segments: List[TextSegment],
+        language: str,
+        voice_settings: Dict[str, Any],
+        cancel_token: Optional[CancelToken] = None,
+        effects: Optional[AudioEffects] = None
+    ) -> AsyncIterator[np.ndarray]:
+        """Yield stitched audio in order while later segments are synthesized
+
+        Only a window of segments is in flight at a time, so memory follows the
+        chunk size rather than the document length. ``effects`` are applied to
+        the stitched audio as it comes, in the inference pool.
+        """
+        window = (self.model_workers.num_workers if self.model_workers else self.inference_pool.max_workers) + 1
+        remaining = iter(segments)
+        pending = deque()
+        stitcher = AudioStitcher(self.sample_rate)
+        chain = effects.chain(self.sample_rate) if effects else None
+
+        def schedule_next():
+            if cancel_token:
+                cancel_token.check()
+            segment = next(remaining, None)
+            if segment is not None:
+                future = asyncio.ensure_future(self._generate(segment.text, language, voice_settings))
+                pending.append((segment, future))
+
+        try:
+            for _ in range(window):
+                schedule_next()
+
+            while pending:
+                segment, future = pending.popleft()
+                wav = await self._guard(future, cancel_token)
+                schedule_next()
+                yield await self._post_process(chain, stitcher.add(wav, segment.boundary))
+            yield await self._post_process(chain, stitcher.finish(), last=True)
+
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    async def _post_process(self, chain: Optional[EffectChain], wav: np.ndarray, last: bool = False) -> np.ndarray:
+        """Run stitched audio through an effect chain in the inference pool"""
+        if chain is None:
+            return wav
+        return await self.inference_pool.run(chain.finish if last else chain.process, wav)
+
+    async def synthesize_encoded_stream(
+        self,
+        text: str,
+        encoder: StreamingEncoder,
+        voice_id: str = "default",
+        language: str = "en",
+        emotion: str = "neutral",
+        speed: float = 1.0,
+        pitch: float = 1.0,
+        cancel_token: Optional[CancelToken] = None,
+        model: Optional[str] = None,
+        effects: Optional[AudioEffects] = None
+    ) -> AsyncIterator[bytes]:
+        """Synthesize text and yield encoded bytes as each segment is finished
+
+        Encoding runs in the inference pool. Nothing but the current segment
+        and the encoder's own buffer is held, so the output can be uploaded
+        while the rest of a long text is still being synthesized.
+        """
+        with metrics.stage("text_prep"):
+            text = self._prepare_text(text)
+            voice_settings = self._get_voice_settings(voice_id, emotion, speed, pitch, language, model)
+            effects = effects or AudioEffects.from_input({"speed": speed, "pitch": pitch})
+            segments = segment_text(text, language)
+
+        logger.info(f"Streaming encoded speech: {len(segments)} segments as {encoder.content_type}")
+
+        async for wav in self._stitched_segments(segments, language, voice_settings, cancel_token, effects):
+            data = await self.inference_pool.run(encoder.write, wav)
+            if data:
+                yield data
+
+        data = await self.inference_pool.run(encoder.finish)
+        if data:
+            yield data
+
+    async def synthesize_waveform(
+        self,
+        text: str,
+        language: str = "en",
+        voice_id: str = "default",
+        cancel_token: Optional[CancelToken] = None,
+        model: Optional[str] = None,
+        effects: Optional[AudioEffects] = None
+    ) -> np.ndarray:
+        """Float waveform of ``text``, segmented and stitched like synthesize_speech but not encoded"""
+        with metrics.stage("text_prep"):
+            text = self._prepare_text(text)
+            voice_settings = self._get_voice_settings(voice_id, "neutral", 1.0, 1.0, language, model)
+            segments = segment_text(text, language)
+
+        parts = [
+            wav async for wav in self._stitched_segments(segments, language, voice_settings, cancel_token, effects)
+        ]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+
+    @staticmethod
+    async def _guard(awaitable, cancel_token: Optional[CancelToken]):
+        """Await, giving up early if the job's token is cancelled or expired"""
+        if cancel_token is None:
+            return await awaitable
+        return await cancel_token.run(awaitable)
+
+    async def _generate(self, text: str, language: str, voice_settings: Dict[str, Any]) -> np.ndarray:
+        """Synthesize one waveform on a model worker process or the inference pool"""
+        if self.model_workers:
+            return await self.model_workers.synthesize(text, language, voice_settings)
+        return await self.inference_pool.run(self._synthesize_waveform, text, language, voice_settings)
+
+    async def _run_batch(self, key, items: List[tuple]) -> List[np.ndarray]:
+        """Run one micro-batch of compatible requests as a single pool task"""
+        if self.model_workers:
+            return await asyncio.gather(*(self._generate(*item) for item in items))
+        return await self.inference_pool.run(self._synthesize_batch, items)
+
+    @metrics.timed("inference")
+    def _synthesize_batch(self, items: List[tuple]) -> List[np.ndarray]:
+        """Synthesize requests sharing language, speaker and model (blocking)
+
+        Speaker latents are resolved once for the whole group. XTTS decodes
+        autoregressively per text, so the group then runs back to back on this
+        worker while it holds the model.
+        """
+        _, language, voice_settings = items[0]
+        with self.models.lease(voice_settings["model"]) as model:
+            xtts = self._unwrap(model)
+            latents = self._resolve_speaker_latents(voice_settings, xtts)
+
+            results = []
+            for text, _, _ in items:
+                if latents is None:
+                    wav = model.tts(text=text, language=language)
+                else:
+                    wav = self._synthesize_with_latents(text, language, *latents, xtts=xtts)
+                results.append(np.asarray(wav, dtype=np.float32))
+            return results
+
+    async def stream_speech(
+        self,
+        text: str,
+        voice_id: str = "default",
+        language: str = "en",
+        emotion: str = "neutral",
+        speed: float = 1.0,
+        pitch: float = 1.0,
+        model: Optional[str] = None
+    ) -> AsyncIterator[bytes]:
+        """Synthesize sentence by sentence, yielding 16-bit PCM as each one finishes
+
+        At most one sentence is synthesized ahead of the consumer, so a slow or
+        disconnected client stops synthesis instead of letting audio pile up.
+        """
+        sentences = segment_text(self._prepare_text(text), language, pack=False)
+        voice_settings = self._get_voice_settings(voice_id, emotion, speed, pitch, language, model)
+        chain = AudioEffects.from_input({"speed": speed, "pitch": pitch}).chain(self.sample_rate)
+        stitcher = AudioStitcher(self.sample_rate)
+
+        logger.info(f"Streaming speech: {len(sentences)} sentences, voice={voice_id}, lang={language}")
+
+        def schedule(sentence: TextSegment) -> asyncio.Future:
+            return asyncio.ensure_future(self._generate(sentence.text, language, voice_settings))
+
+        pending: Optional[asyncio.Future] = None
+        try:
+            for index, sentence in enumerate(sentences):
+                current = pending or schedule(sentence)
+                pending = None
+                wav = await current
+
+                # Start the next sentence while this one is being sent
+                if index + 1 < len(sentences):
+                    pending = schedule(sentences[index + 1])
+
+                yield float_to_pcm16(await self._post_process(chain, stitcher.add(wav, sentence.boundary)))
+
+            yield float_to_pcm16(await self._post_process(chain, stitcher.finish(), last=True))
+
+        finally:
+            if pending is not None and not pending.done():
+                pending.cancel()
+                logger.info("Streaming synthesis cancelled by consumer")
+
+    @metrics.timed("inference")
+    def _synthesize_waveform(self, text: str, language: str, voice_settings: Dict[str, Any]) -> np.ndarray:
+        """Run the model and return a float32 waveform (blocking, runs in the inference pool)"""
+        with self.models.lease(voice_settings.get("model", DEFAULT_MODEL)) as model:
+            xtts = self._unwrap(model)
+            latents = self._resolve_speaker_latents(voice_settings, xtts)
+            if latents is None:
+                wav = model.tts(text=text, language=language)
+            else:
+                wav = self._synthesize_with_latents(text, language, *latents, xtts=xtts)
+        return np.asarray(wav, dtype=np.float32)
+
+    def _resolve_speaker_latents(self, voice_settings: Dict[str, Any], xtts=None):
+        """Look up speaker latents for a voice, computing them once on a miss (blocking)"""
+        speaker_key = voice_settings.get("speaker_key")
+        if speaker_key is None:
+            return None
+
+        speaker_wav = voice_settings.get("speaker_wav")
+
+        def compute():
+            if speaker_wav:
+                with open(speaker_wav, "rb") as f:
+                    reference = f.read()
+            else:
+                # Cloned voices are recomputed from the sample stored when they were cloned
+                reference = self.speaker_cache.reference(speaker_key)
+            if reference is None:
+                raise ValueError(f"Voice {voice_settings.get('voice_id')} is not available, clone it again")
+            return self._compute_speaker_latents(reference, xtts)
+
+        return self.speaker_cache.get_or_compute(
+            SpeakerLatentCache.latents_key(speaker_key, voice_settings.get("model", DEFAULT_MODEL)),
+            compute,
+            self.device
+        )
+
+    def _get_speaker_latents(self, audio_file: bytes, xtts=None, model: str = DEFAULT_MODEL):
+        """Speaker latents for a reference sample, skipping conditioning on a cache hit (blocking)
+
+        The sample is stored alongside, so the voice ID returned for it keeps
+        working after its latents are evicted or the service restarts.
+        """
+        key = SpeakerLatentCache.key_for(audio_file)
+        self.speaker_cache.put_reference(key, audio_file)
+        return self.speaker_cache.get_or_compute(
+            SpeakerLatentCache.latents_key(key, model),
+            lambda: self._compute_speaker_latents(audio_file, xtts),
+            self.device
+        )
+
+    def voice_id_for(self, audio_file: bytes) -> str:
+        """Voice ID that reuses the cached latents of a cloned sample"""
+        return CLONED_VOICE_PREFIX + SpeakerLatentCache.key_for(audio_file)
+
+    @staticmethod
+    def _unwrap(model):
+        synthesizer = getattr(model, "synthesizer", None)
+        return getattr(synthesizer, "tts_model", model)
+
+    @property
+    def xtts(self):
+        """Underlying XTTS model behind the TTS API wrapper"""
+        return self._unwrap(self.model)
+
+    def _compute_speaker_latents(self, audio_file: bytes, xtts=None):
+        """Compute XTTS conditioning latents from an in-memory reference sample"""
+        import torch
+
+        xtts = xtts or self.xtts
+        config = xtts.config
+
+        reference = decode_audio(audio_file, XTTS_REFERENCE_SAMPLE_RATE)
+        reference = reference[: XTTS_REFERENCE_SAMPLE_RATE * getattr(config, "max_ref_len", 30)]
+        audio = torch.from_numpy(reference).unsqueeze(0).to(self.device)
+
+        with torch.inference_mode():
+            gpt_cond_latent = xtts.get_gpt_cond_latents(
+                audio,
+                XTTS_REFERENCE_SAMPLE_RATE,
+                length=getattr(config, "gpt_cond_len", 30),
+                chunk_length=getattr(config, "gpt_cond_chunk_len", 4)
+            )
+            speaker_embedding = xtts.get_speaker_embedding(audio, XTTS_REFERENCE_SAMPLE_RATE)
+
+        return gpt_cond_latent, speaker_embedding
+
+    def _synthesize_with_latents(
+        self, text: str, language: str, gpt_cond_latent, speaker_embedding, xtts=None
+    ) -> np.ndarray:
+        """Run XTTS inference with precomputed speaker latents (blocking)"""
+        import torch
+
+        xtts = xtts or self.xtts
+        with torch.inference_mode():
+            output = xtts.inference(text, language, gpt_cond_latent, speaker_embedding)
+
+        wav = output["wav"]
+        if isinstance(wav, torch.Tensor):
+            wav = wav.cpu().numpy()
+        return np.asarray(wav, dtype=np.float32).reshape(-1)
+
     def _prepare_text(self, text: str) -> str:
         """Clean and prepare text for TTS"""
         # Remove excessive whitespace
@@ -92,10 +584,21 @@ class TTSEngine:
         
         return text
     
-    def _get_voice_settings(self, voice_id: str, emotion: str, speed: float, pitch: float) -> Dict[str, Any]:
+    def _get_voice_settings(
+        self,
+        voice_id: str,
+        emotion: str,
+        speed: float,
+        pitch: float,
+        language: Optional[str] = None,
+        model: Optional[str] = None
+    ) -> Dict[str, Any]:
         """Get voice configuration settings"""
         settings = {
+            "voice_id": voice_id,
+            "model": self.models.resolve(model, language),
             "speaker_wav": None,  # Default voice
+            "speaker_key": None,
             "emotion": emotion,
             "speed": speed,
             "pitch": pitch
@@ -109,45 +612,81 @@ class TTSEngine:
         }
         
         settings["speaker_wav"] = voice_mapping.get(voice_id)
+
+        # Resolve speaker latents through the cache
+        if voice_id.startswith(CLONED_VOICE_PREFIX):
+            settings["speaker_key"] = voice_id[len(CLONED_VOICE_PREFIX):]
+        elif settings["speaker_wav"]:
+            settings["speaker_key"] = self._speaker_file_key(settings["speaker_wav"])
+
         return settings
+
+    def _speaker_file_key(self, path: str) -> str:
+        """Content hash of a preset speaker file, read once per path"""
+        if path not in self._speaker_file_keys:
+            with open(path, "rb") as f:
+                self._speaker_file_keys[path] = SpeakerLatentCache.key_for(f.read())
+        return self._speaker_file_keys[path]
     
-    async def clone_voice(self, audio_file: bytes, text: str) -> bytes:
-        """Clone voice from audio sample"""
+    async def clone_voice(
+        self,
+        audio_file: bytes,
+        text: str,
+        language: str = "en",
+        cancel_token: Optional[CancelToken] = None,
+        audio_format: Optional[AudioFormat] = None,
+        model: Optional[str] = None,
+        effects: Optional[AudioEffects] = None
+    ) -> EncodedAudio:
+        """Clone voice from audio sample, encoded as ``audio_format`` (WAV by default)
+
+        The sample is conditioned once, then the text is synthesized in the
+        cloned voice like any other: long texts are segmented and stitched.
+        """
         try:
             logger.info("Starting voice cloning process")
+            model = self.models.resolve(model, language)
             
-            # Save audio sample temporarily
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as sample_file:
-                sample_file.write(audio_file)
-                sample_path = sample_file.name
-            
-            # Generate speech with cloned voice
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as output_file:
-                self.model.tts_to_file(
-                    text=text,
-                    file_path=output_file.name,
-                    speaker_wav=sample_path,
-                    language="en"
-                )
-                
-                # Read result
-                with open(output_file.name, 'rb') as f:
-                    cloned_audio = f.read()
-            
-            # Cleanup
-            os.unlink(sample_path)
-            os.unlink(output_file.name)
-            
+            if self.model_workers:
+                await self._guard(self.model_workers.condition(audio_file, model), cancel_token)
+            else:
+                await self._guard(self.inference_pool.run(self._condition, audio_file, model), cancel_token)
+
+            cloned_audio = await self.synthesize_speech(
+                text,
+                voice_id=self.voice_id_for(audio_file),
+                language=language,
+                cancel_token=cancel_token,
+                audio_format=audio_format,
+                model=model,
+                effects=effects
+            )
+
             logger.info("Voice cloning completed successfully")
             return cloned_audio
-            
+
+        except JobCancelled as e:
+            logger.info(f"Voice cloning stopped: {e.reason}")
+            raise
+
         except Exception as e:
             logger.error(f"Voice cloning failed: {str(e)}")
             raise
-    
+
+    @metrics.timed("inference")
+    def _condition(self, audio_file: bytes, model: str = DEFAULT_MODEL):
+        """Store a reference sample and cache its speaker latents under ``model`` (blocking)"""
+        with self.models.lease(model) as loaded:
+            self._get_speaker_latents(audio_file, self._unwrap(loaded), model)
+
     async def cleanup(self):
         """Cleanup resources"""
         logger.info("Cleaning up TTS engine resources")
-        if self.model:
-            del self.model
-        torch.cuda.empty_cache() if torch.cuda.is_available() else None
\ No newline at end of file
+        if self.batcher:
+            await self.batcher.stop()
+        if self.model_workers:
+            await self.model_workers.stop()
+        self.models.clear()
+        if self.device == "cuda":
+            import torch
+            torch.cuda.empty_cache()
\ No newline at end of file